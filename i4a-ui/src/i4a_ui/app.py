@@ -1,16 +1,143 @@
 import os
+from contextlib import asynccontextmanager
+
+import httpx
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
 from pathlib import Path
 
+from i4a_ui.middleware import JsonETagMiddleware
+from i4a_ui.services.events.cache import DEFAULT_CACHE_SIZE, FormattedEventsCache
+from i4a_ui.services.events.fetcher import DEFAULT_MAX_AGE, EventsFetcher
 from i4a_ui.services.events.service import NodeEventsService
+from i4a_ui.services.events.store import (
+    DEFAULT_INGEST_INTERVAL,
+    DEFAULT_RETENTION,
+    DEFAULT_STORE_PATH,
+    EventIngestor,
+    EventStore,
+)
+from i4a_ui.services.events.streaming import DEFAULT_POLL_INTERVAL, EventBroadcaster
+from i4a_ui.services.metrics.service import DEFAULT_REFRESH_INTERVAL, MetricsService
+from i4a_ui.services.network.service import (
+    DEFAULT_MAX_PARALLEL,
+    DEFAULT_STATUS_TTL,
+    NetworkService,
+)
+from i4a_ui.services.pysim import (
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_TIMEOUT,
+    PysimClient,
+)
+from i4a_ui.services.static import AssetStore
+
+# JSON responses smaller than this aren't worth compressing
+DEFAULT_COMPRESSION_MIN_SIZE = 1024
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The pysim client and the services, with their connection pools and
+    # locks, belong to the event loop serving the app: they are created on
+    # startup and closed on shutdown, so the app can be started again
+    app.state.pysim = PysimClient(
+        app.state.pysim_url,
+        timeout=float(os.environ.get("PYSIM_TIMEOUT", DEFAULT_TIMEOUT)),
+        max_concurrency=int(
+            os.environ.get("PYSIM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)
+        ),
+        transport=app.state.pysim_transport,
+    )
+    # Event pages, streams, metrics and the event store share the downloads
+    app.state.events_fetcher = EventsFetcher(
+        app.state.pysim,
+        max_age=float(os.environ.get("EVENTS_FETCH_MAX_AGE", DEFAULT_MAX_AGE)),
+    )
+    app.state.events_service = NodeEventsService(
+        app.state.pysim,
+        FormattedEventsCache(
+            int(os.environ.get("EVENTS_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+        ),
+        app.state.events_fetcher,
+    )
+    app.state.network_service = NetworkService(
+        app.state.pysim,
+        max_parallel=int(os.environ.get("NETWORK_MAX_PARALLEL", DEFAULT_MAX_PARALLEL)),
+        status_ttl=float(os.environ.get("NETWORK_STATUS_TTL", DEFAULT_STATUS_TTL)),
+    )
+    app.state.event_broadcaster = EventBroadcaster(
+        app.state.events_service,
+        poll_interval=float(
+            os.environ.get("EVENTS_POLL_INTERVAL", DEFAULT_POLL_INTERVAL)
+        ),
+    )
+    app.state.metrics_service = MetricsService(
+        app.state.pysim,
+        app.state.network_service,
+        max_parallel=int(os.environ.get("NETWORK_MAX_PARALLEL", DEFAULT_MAX_PARALLEL)),
+        refresh_interval=float(
+            os.environ.get("METRICS_REFRESH_INTERVAL", DEFAULT_REFRESH_INTERVAL)
+        ),
+        fetcher=app.state.events_fetcher,
+    )
+
+    if os.environ.get("EVENT_STORE") == "1":
+        app.state.event_store = EventStore(
+            os.environ.get("EVENT_STORE_PATH", DEFAULT_STORE_PATH),
+            retention=float(os.environ.get("EVENT_STORE_RETENTION", DEFAULT_RETENTION)),
+        )
+        app.state.event_ingestor = EventIngestor(
+            app.state.pysim,
+            app.state.event_store,
+            interval=float(
+                os.environ.get("EVENT_STORE_INTERVAL", DEFAULT_INGEST_INTERVAL)
+            ),
+            fetcher=app.state.events_fetcher,
+        )
+        app.state.event_ingestor.start()
+
+    yield
+
+    if app.state.event_ingestor is not None:
+        await app.state.event_ingestor.stop()
+        app.state.event_store = app.state.event_ingestor = None
+    await app.state.pysim.close()
 
 
 def create_app():
     basedir = Path(__file__).resolve().parent
-    new_app = FastAPI()
+    new_app = FastAPI(lifespan=lifespan)
     new_app.state.assets_dir = os.environ.get("ASSETS_DIR", basedir / "assets")
+    new_app.state.assets = AssetStore(
+        new_app.state.assets_dir,
+        # Never changes, unlike `index.html`
+        cache_control={"cytoscape.min.js": "public, max-age=86400"},
+    )
     new_app.state.pysim_url = os.environ.get("PYSIM_URL", "http://pysim:8080")
-    new_app.state.events_service = NodeEventsService(new_app.state.pysim_url)
+    # `httpx` transport to reach pysim through, the default one if `None`
+    new_app.state.pysim_transport = None
+    # Created on startup, the event store only if enabled
+    new_app.state.pysim = None
+    new_app.state.event_store = None
+    new_app.state.event_ingestor = None
+
+    # Inside the compression, so the ETag is the hash of the JSON content
+    new_app.add_middleware(JsonETagMiddleware)
+    new_app.add_middleware(
+        GZipMiddleware,
+        minimum_size=int(
+            os.environ.get("COMPRESSION_MIN_SIZE", DEFAULT_COMPRESSION_MIN_SIZE)
+        ),
+        compresslevel=5,
+    )
+
+    @new_app.exception_handler(httpx.HTTPError)
+    async def pysim_error(request, exc):
+        return JSONResponse(
+            status_code=502, content={"detail": f"pysim request failed: {exc}"}
+        )
+
     return new_app
 
 
@@ -1,2 +1,5 @@
+from .metrics import *
+from .network import *
 from .node import *
 from .static import *
+from .store import *
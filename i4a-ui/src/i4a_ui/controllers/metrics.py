@@ -0,0 +1,70 @@
+from typing import Annotated
+from fastapi import HTTPException, Path, Query, Response
+
+from i4a_ui.app import app
+from i4a_ui.services.metrics.openmetrics import CONTENT_TYPE
+from i4a_ui.services.metrics.series import RESOLUTION_PATTERN
+from i4a_ui.services.metrics.service import METRICS
+
+Metrics = Annotated[
+    list[str] | None, Query(title=f"Metrics ({', '.join(METRICS)}), all by default")
+]
+Resolution = Annotated[
+    str, Query(pattern=RESOLUTION_PATTERN, title="Width of the buckets")
+]
+
+
+def check_metrics(metric):
+    if metric is None:
+        return METRICS
+    if unknown := set(metric) - set(METRICS):
+        raise HTTPException(
+            status_code=400, detail=f"Unknown metrics: {', '.join(sorted(unknown))}"
+        )
+    return metric
+
+
+@app.get("/nodes/{node_id}/metrics")
+async def get_node_metrics(
+    node_id: Annotated[str, Path(title="Unique ID of node")],
+    device: str | None = None,
+    metric: Metrics = None,
+    resolution: Resolution = "auto",
+    start: Annotated[int | None, Query(title="From timestamp (ns)")] = None,
+    end: Annotated[int | None, Query(title="Until timestamp (ns), excluded")] = None,
+):
+    """
+    Time series of the metrics of each device of a node, as one array per
+    statistic, aligned with `timestamps` (the start of each bucket).
+    """
+    try:
+        return await app.state.metrics_service.get_node_metrics(
+            node_id, device, check_metrics(metric), resolution, start, end
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/network/metrics")
+async def get_network_metrics(
+    metric: Metrics = None,
+    resolution: Resolution = "auto",
+    start: Annotated[int | None, Query(title="From timestamp (ns)")] = None,
+    end: Annotated[int | None, Query(title="Until timestamp (ns), excluded")] = None,
+):
+    try:
+        return await app.state.metrics_service.get_network_metrics(
+            check_metrics(metric), resolution, start, end
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/metrics")
+async def get_openmetrics():
+    """
+    Metrics of every device in the OpenMetrics text format, to be scraped.
+    """
+    return Response(
+        await app.state.metrics_service.get_openmetrics(), media_type=CONTENT_TYPE
+    )
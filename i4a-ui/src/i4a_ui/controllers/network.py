@@ -0,0 +1,11 @@
+from i4a_ui.app import app
+
+
+@app.get("/network/propagation")
+async def get_network_propagation():
+    return await app.state.network_service.get_propagation()
+
+
+@app.get("/network/status")
+async def get_network_status():
+    return await app.state.network_service.get_status()
@@ -1,49 +1,145 @@
-import requests
-
 from typing import Annotated
-from fastapi import Path
+from fastapi import Depends, Header, HTTPException, Path, Query, Response
+from fastapi.responses import StreamingResponse
 
 
 from i4a_ui.app import app
+from i4a_ui.services.events.filters import EventFilter
+from i4a_ui.services.events.service import CURSOR_PATTERN, Cursor
+
+
+def set_cursor_headers(response: Response, page):
+    response.headers["X-Next-Cursor"] = str(page.next_cursor)
+    if page.reset:
+        response.headers["X-Cursor-Reset"] = "1"
+
+
+def get_cursor(
+    since: Annotated[str | None, Query(pattern=CURSOR_PATTERN, title="Cursor")] = None,
+):
+    return None if since is None else Cursor.parse(since)
+
+
+def get_event_filter(
+    event: Annotated[list[str] | None, Query(title="Event names to include")] = None,
+    exclude: Annotated[list[str] | None, Query(title="Event names to exclude")] = None,
+    cs: Annotated[bool | None, Query(title="Inside the critical section")] = None,
+    search: Annotated[str | None, Query(title="Text of the event")] = None,
+    after: Annotated[int | None, Query(title="Timestamp (ns)")] = None,
+    before: Annotated[int | None, Query(title="Timestamp (ns)")] = None,
+):
+    return EventFilter(event, exclude, cs, search, after, before)
 
 
 @app.get("/nodes")
-def get_nodes():
-    return requests.get(f"{app.state.pysim_url}/nodes").json()
+async def get_nodes():
+    return await app.state.network_service.get_nodes()
 
 
 @app.get("/nodes/{node_id}/events")
-def get_node_events(
+async def get_node_events(
     node_id: Annotated[str, Path(title="Unique ID of node")],
     stream: str,
+    response: Response,
+    event_filter: Annotated[EventFilter, Depends(get_event_filter)],
+    since: Annotated[Cursor | None, Depends(get_cursor)],
+    limit: Annotated[int | None, Query(ge=1)] = None,
+    tail: Annotated[int | None, Query(ge=0)] = None,
+    page: Annotated[int | None, Query(ge=1)] = None,
 ):
-    return app.state.events_service.get_events(node_id, stream=stream)
+    events_page = await app.state.events_service.get_events(
+        node_id,
+        stream=stream,
+        since=since,
+        limit=limit,
+        tail=tail,
+        event_filter=event_filter,
+        page=page,
+    )
+    set_cursor_headers(response, events_page)
+    return events_page.events
 
 
 @app.get("/nodes/{node_id}/events/{device}")
-def get_events(
+async def get_events(
+    node_id: Annotated[str, Path(title="Unique ID of node")],
+    stream: str,
+    device: Annotated[str, Path(title="Device (north, east, south, west, center)")],
+    response: Response,
+    event_filter: Annotated[EventFilter, Depends(get_event_filter)],
+    since: Annotated[Cursor | None, Depends(get_cursor)],
+    limit: Annotated[int | None, Query(ge=1)] = None,
+    tail: Annotated[int | None, Query(ge=0)] = None,
+    page: Annotated[int | None, Query(ge=1)] = None,
+):
+    events_page = await app.state.events_service.get_events(
+        node_id,
+        device=device,
+        stream=stream,
+        since=since,
+        limit=limit,
+        tail=tail,
+        event_filter=event_filter,
+        page=page,
+    )
+    set_cursor_headers(response, events_page)
+    return events_page.events
+
+
+@app.get("/nodes/{node_id}/events/{device}/stream")
+async def stream_events(
+    node_id: Annotated[str, Path(title="Unique ID of node")],
+    stream: str,
+    device: Annotated[str, Path(title="Device (north, east, south, west, center)")],
+    since: Annotated[Cursor | None, Depends(get_cursor)],
+    last_event_id: Annotated[str | None, Header(pattern=CURSOR_PATTERN)] = None,
+):
+    """
+    Server-Sent Events with the new events of a device. Clients of the same
+    device and stream share a single poll of pysim.
+    """
+    events = app.state.event_broadcaster.stream(node_id, device, stream)
+    return StreamingResponse(
+        # Reconnecting clients resume from the last batch they got
+        events.listen(Cursor.parse(last_event_id) if last_event_id else since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.get("/nodes/{node_id}/events/{device}/{seq}")
+async def get_event(
     node_id: Annotated[str, Path(title="Unique ID of node")],
     stream: str,
     device: Annotated[str, Path(title="Device (north, east, south, west, center)")],
+    seq: Annotated[int, Path(ge=0, title="Sequence number")],
 ):
-    return app.state.events_service.get_events(node_id, device=device, stream=stream)
+    """
+    A single event, with its payloads not truncated.
+    """
+    event = await app.state.events_service.get_event(
+        node_id, seq, device=device, stream=stream
+    )
+    if event is None:
+        raise HTTPException(status_code=404, detail=f"No event {seq}")
+    return event
 
 
 @app.get("/nodes/{node_id}/status")
-def get_node_status(
+async def get_node_status(
     node_id: Annotated[str, Path(title="Unique ID of node")],
 ):
-    return app.state.events_service.get_status(node_id)
+    return await app.state.events_service.get_status(node_id)
 
 
 @app.get("/nodes/{node_id}/status/{device}")
-def get_status(
+async def get_status(
     node_id: Annotated[str, Path(title="Unique ID of node")],
     device: Annotated[str, Path(title="Device (north, east, south, west, center)")],
 ):
-    return app.state.events_service.get_status(node_id, device)
+    return await app.state.events_service.get_status(node_id, device)
 
 
 @app.post("/clear")
-def clear_events():
-    return requests.post(f"{app.state.pysim_url}/clear", json=[]).json()
+async def clear_events():
+    return await app.state.events_service.clear()
@@ -1,18 +1,19 @@
+from fastapi import Request
 from fastapi.responses import HTMLResponse
 
 from i4a_ui.app import app
 
+STATIC_FILES = ("cytoscape.min.js",)
+
 
 @app.get("/", response_class=HTMLResponse)
-def index():
-    with open(f"{app.state.assets_dir}/index.html") as f:
-        return f.read()
+def index(request: Request):
+    return app.state.assets.response("index.html", request)
 
 
-@app.get("/ui/static/{file}", response_class=HTMLResponse)
-def index(file: str):
-    if file not in ("cytoscape.min.js",):
+@app.get("/ui/static/{file}")
+def static_file(file: str, request: Request):
+    if file not in STATIC_FILES:
         return HTMLResponse(status_code=404)
 
-    with open(f"{app.state.assets_dir}/{file}") as f:
-        return f.read()
+    return app.state.assets.response(file, request)
@@ -0,0 +1,47 @@
+import asyncio
+
+from typing import Annotated
+from fastapi import HTTPException, Query, Response
+
+from i4a_ui.app import app
+from i4a_ui.services.events.store import DEFAULT_QUERY_LIMIT, MAX_QUERY_LIMIT
+
+
+def get_event_store():
+    if app.state.event_store is None:
+        raise HTTPException(status_code=404, detail="The event store is disabled")
+    return app.state.event_store
+
+
+@app.get("/store/events")
+async def query_stored_events(
+    response: Response,
+    node: Annotated[str | None, Query(title="Unique ID of node")] = None,
+    device: str | None = None,
+    stream: str | None = None,
+    event: Annotated[list[str] | None, Query(title="Event names")] = None,
+    start: Annotated[int | None, Query(title="From timestamp (ns)")] = None,
+    end: Annotated[int | None, Query(title="Until timestamp (ns), excluded")] = None,
+    after_id: Annotated[int | None, Query(title="Cursor")] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_QUERY_LIMIT)] = DEFAULT_QUERY_LIMIT,
+):
+    events, next_id = await asyncio.to_thread(
+        get_event_store().query,
+        node_id=node,
+        device=device,
+        stream=stream,
+        names=event,
+        start=start,
+        end=end,
+        after_id=after_id,
+        limit=limit,
+    )
+    if next_id is not None:
+        response.headers["X-Next-Cursor"] = str(next_id)
+    return events
+
+
+@app.get("/store/status")
+async def get_store_status():
+    status = await asyncio.to_thread(get_event_store().status)
+    return {**status, "ingested": app.state.event_ingestor.ingested}
@@ -0,0 +1,74 @@
+import hashlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+
+def make_etag(content: bytes):
+    return '"' + hashlib.blake2b(content, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag.removeprefix("W/"):
+            return True
+    return False
+
+
+class JsonETagMiddleware:
+    """
+    Adds an ETag (hash of the content) to the JSON responses of GET requests,
+    and answers 304 without a body when it matches `If-None-Match`. Clients
+    polling a status that didn't change only pay for the headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start = None
+        body = []
+
+        async def send_with_etag(message):
+            nonlocal start
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if message["status"] == 200 and headers.get(
+                    "content-type", ""
+                ).startswith("application/json"):
+                    start = message
+                    return
+                await send(message)
+            elif start is None:
+                await send(message)
+            else:
+                body.append(message.get("body", b""))
+                if message.get("more_body", False):
+                    return
+
+                content = b"".join(body)
+                # Weak, as the compressed and plain responses share it
+                etag = "W/" + make_etag(content)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["ETag"] = etag
+
+                if etag_matches(if_none_match, etag):
+                    del headers["Content-Length"]
+                    del headers["Content-Type"]
+                    await send({**start, "status": 304})
+                    await send({"type": "http.response.body", "body": b""})
+                    return
+
+                await send(start)
+                await send({"type": "http.response.body", "body": content})
+
+        await self.app(scope, receive, send_with_etag)
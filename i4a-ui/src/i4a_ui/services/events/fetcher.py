@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+# Seconds a download of the events is reused for
+DEFAULT_MAX_AGE = 1.0
+
+
+class EventsFetcher:
+    """
+    Downloads the events of nodes and devices from pysim for every consumer:
+    event pages, streams, metrics and the event store.
+
+    pysim has no cursor API, so every request returns the whole history.
+    Concurrent requests for the same events share a single download, and its
+    result is reused by the requests of the next `max_age` seconds. The
+    returned lists are shared and must not be modified.
+    """
+
+    def __init__(self, pysim, max_age=DEFAULT_MAX_AGE):
+        self.pysim = pysim
+        self.max_age = max_age
+        # (node, device, stream) -> (monotonic time, events)
+        self.fetched = {}
+        self.pending = {}
+        # Bumped on `clear`, downloads started before it aren't kept
+        self.generation = 0
+
+    async def _fetch(self, key, generation):
+        node_id, device, stream = key
+        path = f"/nodes/{node_id}/events"
+        if device:
+            path += f"/{device}"
+        params = {"stream": stream} if stream else None
+
+        try:
+            events = await self.pysim.get(path, params)
+        finally:
+            if self.pending.get(key) is asyncio.current_task():
+                del self.pending[key]
+
+        if generation == self.generation:
+            now = time.monotonic()
+            # Only recent downloads are kept, histories can be large
+            self.fetched = {
+                k: entry
+                for k, entry in self.fetched.items()
+                if now - entry[0] < self.max_age
+            }
+            self.fetched[key] = (now, events)
+        return events
+
+    async def get(self, node_id, device=None, stream=None):
+        key = (node_id, device or None, stream or None)
+        if (entry := self.fetched.get(key)) is not None:
+            fetched_at, events = entry
+            if time.monotonic() - fetched_at < self.max_age:
+                return events
+
+        if key not in self.pending:
+            self.pending[key] = asyncio.ensure_future(self._fetch(key, self.generation))
+        # A client going away must not cancel the download of the others
+        return await asyncio.shield(self.pending[key])
+
+    def clear(self):
+        """
+        Forgets every download, for when pysim is cleared.
+        """
+        self.generation += 1
+        self.fetched.clear()
+        self.pending.clear()
@@ -0,0 +1,50 @@
+import dataclasses
+
+
+@dataclasses.dataclass
+class EventFilter:
+    """
+    Conditions an event must meet to be returned. Everything but `search` is
+    checked on the event as received from pysim, so events are only
+    formatted once they passed those checks.
+    """
+
+    # Event names to keep / to discard
+    include: list[str] | None = None
+    exclude: list[str] | None = None
+    # Whether the event happened inside the critical section
+    cs: bool | None = None
+    # Case-insensitive substring of the formatted event
+    search: str | None = None
+    # Timestamps (ns), both excluded
+    after: int | None = None
+    before: int | None = None
+
+    def __post_init__(self):
+        self.include = set(self.include) if self.include else None
+        self.exclude = set(self.exclude) if self.exclude else None
+        self.search = self.search.lower() if self.search else None
+
+    def matches(self, event):
+        """
+        Whether a raw event from pysim meets every condition but `search`.
+        """
+        timestamp = event["timestamp"]
+        if self.after is not None and timestamp <= self.after:
+            return False
+        if self.before is not None and timestamp >= self.before:
+            return False
+
+        data = event["data"]
+        name = data.get("event")
+        if self.include is not None and name not in self.include:
+            return False
+        if self.exclude is not None and name in self.exclude:
+            return False
+        if self.cs is not None and bool(data.get("cs")) != self.cs:
+            return False
+
+        return True
+
+    def matches_formatted(self, formatted):
+        return self.search is None or self.search in formatted["formatted"].lower()
@@ -14,12 +14,15 @@ VALUE_PARSERS = {
 }
 
 
-def parse_values(data):
+def parse_values(data, max_bytes=MAX_DISPLAY_BYTES):
     parsed = {}
 
     for attribute, value in data.items():
         value_parser = VALUE_PARSERS.get(attribute, UnknownValue)
-        parsed[attribute] = value_parser(value)
+        if value_parser is BytesValue:
+            parsed[attribute] = BytesValue(value, max_bytes)
+        else:
+            parsed[attribute] = value_parser(value)
 
     return parsed
 
@@ -32,14 +35,21 @@ class Event:
     stream: str
     data: dict
 
-    def __init__(self, timestamp: int, source: str, stream: str, data: dict):
+    def __init__(
+        self,
+        timestamp: int,
+        source: str,
+        stream: str,
+        data: dict,
+        max_bytes=MAX_DISPLAY_BYTES,
+    ):
         self.timestamp = timestamp
         self.source = source
         self.stream = stream
-        self.data = parse_values(data)
+        self.data = parse_values(data, max_bytes)
 
     def json(self):
-        return {
+        result = {
             "formatted": pretty_print(self),
             "source": self.source,
             "timestamp": self.timestamp,
@@ -47,6 +57,16 @@ class Event:
                 attribute: value.json() for attribute, value in self.data.items()
             },
         }
+
+        truncated = [
+            attribute
+            for attribute, value in self.data.items()
+            if getattr(value, "truncated", False)
+        ]
+        if truncated:
+            result["truncated"] = truncated
+
+        return result
         
 
 
@@ -1,5 +1,8 @@
 import base64
 
+# Longer payloads are truncated, the full event can be requested on demand
+MAX_DISPLAY_BYTES = 128
+
 
 def ip2str(ip: int):
     return f"{(ip >> 24) & 0xFF}.{(ip >> 16) & 0xFF}.{(ip >> 8) & 0xFF}.{ip & 0xFF}"
@@ -34,19 +37,32 @@ class MaskValue(Value):
         return f"{self.value.bit_count()}"
 
 
+def hex_dump(value: bytes):
+    """
+    Hex dump in groups of 4 bytes, e.g. `00 01 02 03  04 05 `.
+    """
+    if not value:
+        return ""
+
+    groups = (value[i : i + 4].hex(" ").upper() for i in range(0, len(value), 4))
+    return "  ".join(groups) + " "
+
+
 class BytesValue(Value):
-    def __init__(self, b64_bytes: str):
+    def __init__(self, b64_bytes: str, max_bytes=MAX_DISPLAY_BYTES):
         self.value = base64.b64decode(b64_bytes)
+        self.max_bytes = max_bytes
 
-    def __str__(self):
-        result = ""
+    @property
+    def truncated(self):
+        return self.max_bytes is not None and len(self.value) > self.max_bytes
 
-        for i, byte in enumerate(self.value):
-            if i != 0 and i % 4 == 0:
-                result += " "
-            result += f"{byte:02X} "
+    def __str__(self):
+        if self.truncated:
+            shown = hex_dump(self.value[: self.max_bytes])
+            return f"{shown}... ({len(self.value)} bytes)"
 
-        return result
+        return hex_dump(self.value)
 
     def json(self):
         return str(self)
@@ -1,31 +1,169 @@
-import requests
+import dataclasses
+from typing import NamedTuple
 
+from .cache import FormattedEventsCache
+from .fetcher import EventsFetcher
+from .filters import EventFilter
 from .model.event import Event, Status
 
+# Events per page when a page is requested without a limit
+DEFAULT_PAGE_SIZE = 100
+
+# `seq` or `seq:timestamp`, see `Cursor`
+CURSOR_PATTERN = r"^\d+(:\d+)?$"
+
+
+class Cursor(NamedTuple):
+    """
+    Sequence number of the next event, and the timestamp of the event before
+    it: if pysim is cleared, that event changes or disappears.
+    """
+
+    seq: int
+    timestamp: int | None = None
+
+    @classmethod
+    def parse(cls, value: str):
+        seq, _, timestamp = value.partition(":")
+        return cls(int(seq), int(timestamp) if timestamp else None)
+
+    def __str__(self):
+        if self.timestamp is None:
+            return str(self.seq)
+        return f"{self.seq}:{self.timestamp}"
+
+
+@dataclasses.dataclass
+class EventsPage:
+    events: list
+    # Cursor of the next event, to be passed as `since`
+    next_cursor: Cursor
+    # Whether pysim was cleared since the given cursor
+    reset: bool = False
+
 
 class NodeEventsService:
-    def __init__(self, pysim_url):
-        self.pysim_url = pysim_url
+    def __init__(self, pysim, cache=None, fetcher=None):
+        self.pysim = pysim
+        self.cache = cache or FormattedEventsCache()
+        self.fetcher = fetcher or EventsFetcher(pysim)
 
-    def clear(self):
-        requests.post(f"{self.pysim_url}/clear", json=[])
+    async def clear(self):
+        self.cache.clear()
+        self.fetcher.clear()
+        return await self.pysim.post("/clear", json=[])
+
+    async def _fetch_events(self, node_id, device=None, stream=None):
+        return await self.fetcher.get(node_id, device, stream)
+
+    @staticmethod
+    def _cursor(events, seq):
+        return Cursor(seq, events[seq - 1]["timestamp"] if seq else None)
+
+    @staticmethod
+    def _is_reset(events, since: Cursor):
+        if since.seq > len(events):
+            return True
+        # A cursor without a timestamp can't tell if fewer events were
+        # cleared than were received again
+        return (
+            since.seq > 0
+            and since.timestamp is not None
+            and events[since.seq - 1]["timestamp"] != since.timestamp
+        )
+
+    def _format(self, node_id, device, stream, events, seq):
+        # The timestamp tells apart events with the same position before and
+        # after pysim is cleared
+        key = (node_id, device, stream, seq, events[seq]["timestamp"])
+        if (formatted := self.cache.get(key)) is None:
+            formatted = {**Event(**events[seq]).json(), "seq": seq}
+            self.cache.put(key, formatted)
+        return formatted
+
+    async def get_events(
+        self,
+        node_id,
+        device=None,
+        stream=None,
+        since: Cursor | None = None,
+        limit=None,
+        tail=None,
+        event_filter: EventFilter | None = None,
+        page=None,
+    ):
+        """
+        Returns the events of a node or device, formatting only the selected
+        ones. pysim keeps events in arrival order, so the position of an event
+        (`seq`) is a stable cursor until the events are cleared, which is
+        detected by the timestamp in the cursor:
+
+         - `since`: events from cursor `since` on, or all of them (`reset`)
+           if pysim was cleared since
+         - `tail`: only the last `tail` events
+         - `event_filter`: only the events meeting its conditions
+         - `limit`: at most `limit` events, continuing from `next_cursor`
+         - `page`: skips the `page - 1` previous pages of `limit` events
+        """
+        events = await self._fetch_events(node_id, device, stream)
+
+        start, reset = 0, False
+        if since is not None:
+            if self._is_reset(events, since):
+                reset = True
+            else:
+                start = since.seq
+
+        if tail is not None:
+            start = max(start, len(events) - tail)
+
+        event_filter = event_filter or EventFilter()
+        if page is not None:
+            limit = limit or DEFAULT_PAGE_SIZE
+        skip = (page - 1) * limit if page is not None else 0
+
+        # Scanning stops as soon as the page is full, so the events after it
+        # are neither checked nor formatted
+        selected, next_cursor = [], len(events)
+        for i in range(start, len(events)):
+            if not event_filter.matches(events[i]):
+                continue
+            # Only a search needs the skipped events formatted
+            if event_filter.search is not None and not event_filter.matches_formatted(
+                self._format(node_id, device, stream, events, i)
+            ):
+                continue
+            if skip:
+                skip -= 1
+                continue
+
+            selected.append(self._format(node_id, device, stream, events, i))
+            if limit is not None and len(selected) == limit:
+                next_cursor = i + 1
+                break
+
+        return EventsPage(
+            events=selected,
+            next_cursor=self._cursor(events, next_cursor),
+            reset=reset,
+        )
+
+    async def get_event(self, node_id, seq, device=None, stream=None):
+        """
+        Returns a single event without truncating its payloads, or `None` if
+        there is no event `seq`.
+        """
+        events = await self._fetch_events(node_id, device, stream)
+        if seq >= len(events):
+            return None
+
+        return {**Event(**events[seq], max_bytes=None).json(), "seq": seq}
+
+    async def get_status(self, node_id, device=None):
+        path = f"/nodes/{node_id}/status"
 
-    def get_events(self, node_id, device=None, stream=None):
-        url = f"{self.pysim_url}/nodes/{node_id}/events"
-        
-        if device:
-            url += f"/{device}"
-        
-        if stream:
-            url += f"?stream={stream}"
-        
-        return [Event(**ev).json() for ev in requests.get(url).json()]
-
-    def get_status(self, node_id, device=None):
-        url = f"{self.pysim_url}/nodes/{node_id}/status"
-        
         if device:
-            url += f"/{device}"
-            return Status(requests.get(url).json()).json()
-        
-        return {k: Status(v).json() for k, v in requests.get(url).json().items()}
+            path += f"/{device}"
+            return Status(await self.pysim.get(path)).json()
+
+        return {k: Status(v).json() for k, v in (await self.pysim.get(path)).items()}
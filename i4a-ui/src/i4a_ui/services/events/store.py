@@ -0,0 +1,288 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import httpx
+
+from .fetcher import EventsFetcher
+from .model.event import Event
+
+DEFAULT_STORE_PATH = "/tmp/pysim/ui/events.sqlite3"
+DEFAULT_INGEST_INTERVAL = 2.0
+# Seconds of events kept, 0 keeps everything
+DEFAULT_RETENTION = 24 * 3600
+EXPIRE_INTERVAL = 60.0
+DEFAULT_QUERY_LIMIT = 500
+MAX_QUERY_LIMIT = 10000
+
+STREAMS = ("events", "logs")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    node_id TEXT NOT NULL,
+    node_name TEXT NOT NULL,
+    device TEXT NOT NULL,
+    stream TEXT NOT NULL,
+    name TEXT,
+    timestamp INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_by_device
+    ON events (node_id, device, stream, timestamp);
+CREATE INDEX IF NOT EXISTS events_by_name ON events (name, timestamp);
+CREATE INDEX IF NOT EXISTS events_by_time ON events (timestamp);
+
+CREATE TABLE IF NOT EXISTS cursors (
+    node_id TEXT NOT NULL,
+    stream TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    PRIMARY KEY (node_id, stream)
+);
+"""
+
+log = logging.getLogger(__name__)
+
+
+class EventStore:
+    """
+    Append-only SQLite store of the events received by pysim, so they can
+    be queried after pysim is cleared and without downloading every event
+    again. Blocking: the async callers run it in a worker thread.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, retention=DEFAULT_RETENTION):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.retention = retention
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def cursors(self):
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT node_id, stream, seq, timestamp FROM cursors"
+            )
+            return {(node_id, stream): (seq, ts) for node_id, stream, seq, ts in rows}
+
+    def append(self, rows, cursors):
+        """
+        Stores a batch of events and the cursors they were read up to, in a
+        single transaction.
+        """
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT INTO events"
+                " (node_id, node_name, device, stream, name, timestamp, data)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.db.executemany(
+                "INSERT OR REPLACE INTO cursors (node_id, stream, seq, timestamp)"
+                " VALUES (?, ?, ?, ?)",
+                [
+                    (node_id, stream, seq, ts)
+                    for (node_id, stream), (seq, ts) in cursors.items()
+                ],
+            )
+
+    def expire(self, now_ns=None):
+        if not self.retention:
+            return 0
+
+        now_ns = now_ns or time.time_ns()
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "DELETE FROM events WHERE timestamp < ?",
+                (now_ns - int(self.retention * 1e9),),
+            )
+            return cursor.rowcount
+
+    def query(
+        self,
+        node_id=None,
+        device=None,
+        stream=None,
+        names=None,
+        start=None,
+        end=None,
+        after_id=None,
+        limit=DEFAULT_QUERY_LIMIT,
+    ):
+        """
+        Events matching every given filter, oldest first, and the id to pass
+        as `after_id` for the next page (`None` if there are no more).
+        """
+        conditions, params = [], []
+        for column, value in (
+            ("node_id", node_id),
+            ("device", device),
+            ("stream", stream),
+        ):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if names:
+            conditions.append(f"name IN ({', '.join('?' * len(names))})")
+            params.extend(names)
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(end)
+        if after_id is not None:
+            conditions.append("id > ?")
+            params.append(after_id)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, node_id, node_name, device, stream, timestamp, data"
+                f" FROM events {where} ORDER BY id LIMIT ?",
+                (*params, limit + 1),
+            ).fetchall()
+
+        events = []
+        for row in rows[:limit]:
+            row_id, row_node_id, node_name, device, stream, timestamp, data = row
+            event = Event(timestamp, device, stream, json.loads(data))
+            events.append(
+                {**event.json(), "id": row_id, "nodeId": row_node_id, "node": node_name}
+            )
+
+        next_id = events[-1]["id"] if len(rows) > limit else None
+        return events, next_id
+
+    def status(self):
+        with self.lock:
+            count, oldest, newest = self.db.execute(
+                "SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM events"
+            ).fetchone()
+        return {
+            "path": self.path,
+            "events": count,
+            "oldest": oldest,
+            "newest": newest,
+            "retentionSeconds": self.retention,
+            "sizeBytes": sum(
+                os.path.getsize(path)
+                for path in (self.path, f"{self.path}-wal")
+                if os.path.exists(path)
+            ),
+        }
+
+
+class EventIngestor:
+    """
+    Periodically copies the new events of every node into the store. pysim
+    keeps events in arrival order, so the position of the last stored event
+    of each node and stream is enough to find the new ones; the timestamp of
+    that event tells whether pysim was cleared meanwhile.
+    """
+
+    def __init__(
+        self,
+        pysim,
+        store: EventStore,
+        interval=DEFAULT_INGEST_INTERVAL,
+        fetcher=None,
+    ):
+        self.pysim = pysim
+        self.store = store
+        self.fetcher = fetcher or EventsFetcher(pysim)
+        self.interval = interval
+        self.cursors = None
+        self.task = None
+        self.ingested = 0
+        self.last_expire = 0.0
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await asyncio.to_thread(self.store.close)
+
+    def _new_events(self, node_id, node_name, stream, events):
+        seq, timestamp = self.cursors.get((node_id, stream), (0, None))
+        if seq > len(events) or (seq and events[seq - 1]["timestamp"] != timestamp):
+            # pysim was cleared, everything it has is new
+            seq = 0
+
+        return [
+            (
+                node_id,
+                node_name,
+                ev["source"],
+                stream,
+                ev["data"].get("event"),
+                ev["timestamp"],
+                json.dumps(ev["data"]),
+            )
+            for ev in events[seq:]
+        ]
+
+    async def ingest(self):
+        if self.cursors is None:
+            self.cursors = await asyncio.to_thread(self.store.cursors)
+
+        nodes = (await self.pysim.get("/nodes")).get("nodes", {})
+        targets = [
+            (node["containerId"], node_name, stream)
+            for node_name, node in nodes.items()
+            if node.get("containerId")
+            for stream in STREAMS
+        ]
+        results = await asyncio.gather(
+            *(
+                self.fetcher.get(node_id, stream=stream)
+                for node_id, _, stream in targets
+            ),
+            return_exceptions=True,
+        )
+
+        rows, cursors = [], {}
+        for (node_id, node_name, stream), events in zip(targets, results):
+            if isinstance(events, Exception):
+                log.warning(f"Fetching {stream} of {node_name} failed: {events}")
+                continue
+            if new_rows := self._new_events(node_id, node_name, stream, events):
+                rows.extend(new_rows)
+                cursors[(node_id, stream)] = (len(events), events[-1]["timestamp"])
+
+        # Cursors only move once their events are stored
+        if rows:
+            await asyncio.to_thread(self.store.append, rows, cursors)
+            self.cursors.update(cursors)
+            self.ingested += len(rows)
+
+        if time.monotonic() - self.last_expire > EXPIRE_INTERVAL:
+            self.last_expire = time.monotonic()
+            await asyncio.to_thread(self.store.expire)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.ingest()
+            except (httpx.HTTPError, sqlite3.Error) as e:
+                log.warning(f"Storing events failed: {e}")
+            except Exception:
+                # Ingestion runs for the whole life of the app, an unexpected
+                # event must not stop it
+                log.exception("Storing events failed")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,202 @@
+import asyncio
+import dataclasses
+import json
+import logging
+
+import httpx
+
+from .service import Cursor, EventsPage
+
+DEFAULT_POLL_INTERVAL = 1.0
+# Batches of events a client may have pending before it's dropped
+DEFAULT_MAX_PENDING = 64
+KEEPALIVE_INTERVAL = 15.0
+
+log = logging.getLogger(__name__)
+
+
+def sse_message(page: EventsPage, events=None):
+    """
+    Server-Sent Event with a batch of events. Its id is the cursor of the
+    next event, so a reconnecting `EventSource` resumes where it stopped.
+    """
+    events = page.events if events is None else events
+    event = "event: reset\n" if page.reset else ""
+    return f"id: {page.next_cursor}\n{event}data: {json.dumps(events)}\n\n"
+
+
+@dataclasses.dataclass
+class Batch:
+    page: EventsPage
+    message: str
+
+
+class Subscription:
+    def __init__(self, max_pending, skip_before=None):
+        self.queue = asyncio.Queue(max_pending)
+        self.skip_before = skip_before
+        self.dropped = False
+
+    def push(self, batch: Batch):
+        if self.dropped:
+            return
+
+        try:
+            self.queue.put_nowait(batch)
+        except asyncio.QueueFull:
+            # Too far behind: discard what's pending and end the stream
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    def message(self, batch: Batch):
+        """
+        The message of `batch` for this client, without the events it got
+        before subscribing.
+        """
+        if batch.page.reset:
+            self.skip_before = None
+
+        events = batch.page.events
+        if self.skip_before is None or not events:
+            return batch.message
+        if events[-1]["seq"] < self.skip_before:
+            return None
+        if events[0]["seq"] >= self.skip_before:
+            self.skip_before = None
+            return batch.message
+
+        return sse_message(
+            batch.page, [ev for ev in events if ev["seq"] >= self.skip_before]
+        )
+
+
+class EventStream:
+    """
+    Polls pysim for the events of a (node, device, stream) while it has
+    subscribers, and fans out each batch of new events, formatted and
+    encoded once, to all of them.
+    """
+
+    def __init__(self, events_service, key, poll_interval, max_pending):
+        self.events_service = events_service
+        self.key = key
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+
+        self.lock = asyncio.Lock()
+        self.subscriptions = set()
+        self.cursor = None
+        self.task = None
+
+    async def _fetch(self, **kwargs):
+        node_id, device, stream = self.key
+        return await self.events_service.get_events(
+            node_id, device=device, stream=stream, **kwargs
+        )
+
+    async def subscribe(self, since: Cursor | None = None):
+        """
+        Returns the subscription and, if the client asked for events the
+        stream already fanned out (or has a cursor from before pysim was
+        cleared), the range of them it must fetch itself.
+        """
+        async with self.lock:
+            if self.task is None:
+                if since is None:
+                    since = (await self._fetch(tail=0)).next_cursor
+                self.cursor = since
+                self.task = asyncio.create_task(self._run())
+
+            backlog = None
+            if since is not None and since != self.cursor:
+                backlog = (since, self.cursor)
+                since = None
+
+            subscription = Subscription(
+                self.max_pending, skip_before=None if since is None else since.seq
+            )
+            self.subscriptions.add(subscription)
+            return subscription, backlog
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+        if not self.subscriptions and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _run(self):
+        while True:
+            try:
+                page = await self._fetch(since=self.cursor)
+                # No awaits until the batch is fanned out, so subscribers
+                # always see a cursor matching what they will receive
+                self.cursor = page.next_cursor
+                if page.events or page.reset:
+                    batch = Batch(page, sse_message(page))
+                    for subscription in list(self.subscriptions):
+                        subscription.push(batch)
+            except httpx.HTTPError as e:
+                log.warning(f"Polling events of {self.key} failed: {e}")
+            except Exception:
+                # The task is shared by every client of the stream, it must
+                # keep polling whatever the error
+                log.exception(f"Polling events of {self.key} failed")
+
+            await asyncio.sleep(self.poll_interval)
+
+    async def listen(self, since: Cursor | None = None):
+        """
+        Yields the Server-Sent Events for a client until it disconnects or
+        falls too far behind.
+        """
+        subscription, backlog = await self.subscribe(since)
+        try:
+            if backlog is not None:
+                start, end = backlog
+                page = await self._fetch(since=start)
+                # The subscription gets the events from `end` on
+                yield sse_message(
+                    dataclasses.replace(page, next_cursor=end),
+                    [ev for ev in page.events if ev["seq"] < end.seq],
+                )
+
+            while True:
+                try:
+                    batch = await asyncio.wait_for(
+                        subscription.queue.get(), KEEPALIVE_INTERVAL
+                    )
+                except TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if batch is None:
+                    yield "event: dropped\ndata: {}\n\n"
+                    return
+
+                if message := subscription.message(batch):
+                    yield message
+        finally:
+            self.unsubscribe(subscription)
+
+
+class EventBroadcaster:
+    def __init__(
+        self,
+        events_service,
+        poll_interval=DEFAULT_POLL_INTERVAL,
+        max_pending=DEFAULT_MAX_PENDING,
+    ):
+        self.events_service = events_service
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+        self.streams = {}
+
+    def stream(self, node_id, device, stream):
+        key = (node_id, device, stream)
+        if key not in self.streams:
+            self.streams[key] = EventStream(
+                self.events_service, key, self.poll_interval, self.max_pending
+            )
+        return self.streams[key]
@@ -0,0 +1,172 @@
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# name: (type, unit, help)
+FAMILIES = {
+    "nodo_up": ("gauge", None, "Whether the status of the node could be read"),
+    "nodo_queue_pending_events": (
+        "gauge",
+        None,
+        "Events waiting in the input queue of the device",
+    ),
+    "nodo_queue_high_water_mark": (
+        "gauge",
+        None,
+        "Largest number of events the input queue ever held",
+    ),
+    "nodo_queue_capacity": ("gauge", None, "Capacity of the input queue"),
+    "nodo_queue_processed_events": (
+        "counter",
+        None,
+        "Events handled by the device",
+    ),
+    "nodo_queue_dropped_events": (
+        "counter",
+        None,
+        "Data packets dropped because the input queue was full",
+    ),
+    "nodo_spi_queue_pending_packets": (
+        "gauge",
+        None,
+        "Packets waiting to be read by the next device of the SPI ring",
+    ),
+    "nodo_spi_queue_dropped_packets": (
+        "counter",
+        None,
+        "Packets dropped because the SPI link was full",
+    ),
+    "nodo_routing_table_routes": ("gauge", None, "Routes in the routing table"),
+    "nodo_interface_packets": ("counter", None, "Packets through an interface"),
+    "nodo_interface_bytes": ("counter", None, "Bytes through an interface"),
+    "nodo_interface_dropped_packets": (
+        "counter",
+        None,
+        "Packets dropped by an interface",
+    ),
+    "nodo_forwarded_packets": ("counter", None, "Packets forwarded by the device"),
+    "nodo_forward_dropped_packets": (
+        "counter",
+        None,
+        "Packets the device could not forward",
+    ),
+    "nodo_cs_enter_latency_seconds": (
+        "summary",
+        "seconds",
+        "Time from requesting the critical section to entering it",
+    ),
+    "nodo_cs_duration_seconds": (
+        "summary",
+        "seconds",
+        "Time spent inside the critical section",
+    ),
+    "nodo_messages": ("counter", None, "Control-plane messages sent and received"),
+}
+
+# Suffix of the samples of each type
+SAMPLE_SUFFIX = {"gauge": "", "counter": "_total"}
+
+INTERFACE_COUNTERS = {
+    "nodo_interface_packets": ("packetsIn", "packetsOut"),
+    "nodo_interface_bytes": ("bytesIn", "bytesOut"),
+}
+FORWARD_DROPS = {"ttlExpired": "ttl_expired", "noRoute": "no_route"}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class Exposition:
+    """
+    Samples grouped by metric family, rendered in the OpenMetrics text
+    format. Families without samples are left out.
+    """
+
+    def __init__(self):
+        self.samples = {name: [] for name in FAMILIES}
+
+    def add(self, name, labels, value, suffix=None):
+        if not _is_number(value):
+            return
+
+        if suffix is None:
+            suffix = SAMPLE_SUFFIX[FAMILIES[name][0]]
+        self.samples[name].append((suffix, labels, value))
+
+    def render(self):
+        lines = []
+        for name, samples in self.samples.items():
+            if not samples:
+                continue
+
+            kind, unit, description = FAMILIES[name]
+            lines.append(f"# TYPE {name} {kind}")
+            if unit:
+                lines.append(f"# UNIT {name} {unit}")
+            lines.append(f"# HELP {name} {description}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{suffix}{{{label_text}}} {value}")
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def add_device_status(exposition: Exposition, labels, status):
+    """
+    Samples of a device status as reported to pysim (see `Device.status`).
+    """
+    events = status.get("events") or {}
+    for traffic_class in ("control", "data"):
+        exposition.add(
+            "nodo_queue_pending_events",
+            {**labels, "class": traffic_class},
+            events.get(f"pending{traffic_class.capitalize()}"),
+        )
+    exposition.add("nodo_queue_high_water_mark", labels, events.get("highWaterMark"))
+    exposition.add("nodo_queue_capacity", labels, events.get("capacity"))
+    exposition.add("nodo_queue_processed_events", labels, events.get("totalEvents"))
+    exposition.add("nodo_queue_dropped_events", labels, events.get("dropped"))
+
+    spi_queue = status.get("spi_queue") or {}
+    exposition.add(
+        "nodo_spi_queue_pending_packets", labels, spi_queue.get("pendingPackets")
+    )
+    exposition.add("nodo_spi_queue_dropped_packets", labels, spi_queue.get("dropped"))
+
+    if isinstance(status.get("routing_table"), list):
+        exposition.add(
+            "nodo_routing_table_routes", labels, len(status["routing_table"])
+        )
+
+    for interface, counters in (status.get("interfaces") or {}).items():
+        interface_labels = {**labels, "interface": interface}
+        for name, (received, sent) in INTERFACE_COUNTERS.items():
+            for direction, key in (("in", received), ("out", sent)):
+                exposition.add(
+                    name,
+                    {**interface_labels, "direction": direction},
+                    counters.get(key),
+                )
+        exposition.add(
+            "nodo_interface_dropped_packets",
+            interface_labels,
+            counters.get("dropped"),
+        )
+
+    forwarding = status.get("forwarding") or {}
+    exposition.add("nodo_forwarded_packets", labels, forwarding.get("forwarded"))
+    for key, reason in FORWARD_DROPS.items():
+        exposition.add(
+            "nodo_forward_dropped_packets",
+            {**labels, "reason": reason},
+            forwarding.get(key),
+        )
+
+
+def add_summary(exposition: Exposition, name, labels, values_ms):
+    exposition.add(name, labels, len(values_ms), "_count")
+    exposition.add(name, labels, round(float(values_ms.sum()) / 1000, 6), "_sum")
@@ -0,0 +1,160 @@
+import numpy as np
+
+# Bucket widths (seconds) served by the metrics endpoints
+RESOLUTIONS = {"1s": 1, "10s": 10, "1m": 60, "10m": 600, "1h": 3600}
+RESOLUTION_PATTERN = f"^(auto|{'|'.join(RESOLUTIONS)})$"
+# `auto` picks the finest resolution with at most this many buckets
+AUTO_BUCKETS = 500
+MAX_BUCKETS = 10000
+
+NS = 1_000_000_000
+
+
+class Column:
+    """
+    Growing series of (timestamp, value) samples. Appends are buffered and
+    joined into NumPy arrays only when the column is read.
+    """
+
+    def __init__(self):
+        self._timestamps = np.empty(0, dtype=np.int64)
+        self._values = np.empty(0, dtype=np.float64)
+        self._pending_timestamps = []
+        self._pending_values = []
+
+    def __len__(self):
+        return len(self._timestamps) + len(self._pending_timestamps)
+
+    def append(self, timestamp, value=1.0):
+        self._pending_timestamps.append(timestamp)
+        self._pending_values.append(value)
+
+    def arrays(self):
+        if self._pending_timestamps:
+            self._timestamps = np.concatenate(
+                (self._timestamps, np.array(self._pending_timestamps, dtype=np.int64))
+            )
+            self._values = np.concatenate(
+                (self._values, np.array(self._pending_values, dtype=np.float64))
+            )
+            self._pending_timestamps = []
+            self._pending_values = []
+        return self._timestamps, self._values
+
+
+def choose_resolution(resolution, start, end):
+    """
+    Bucket width in seconds for `resolution` (a key of `RESOLUTIONS` or
+    `auto`) over the range [start, end) in ns. Raises `ValueError` if that
+    is too many buckets.
+    """
+    if resolution != "auto":
+        width = RESOLUTIONS[resolution]
+        if (end - start) / (width * NS) > MAX_BUCKETS:
+            raise ValueError(
+                f"More than {MAX_BUCKETS} buckets of {resolution}, use a coarser"
+                " resolution or a shorter range"
+            )
+        return width
+
+    for width in sorted(RESOLUTIONS.values()):
+        if (end - start) / (width * NS) <= AUTO_BUCKETS:
+            return width
+    return max(RESOLUTIONS.values())
+
+
+def bucket_starts(start, end, width):
+    """
+    Start timestamps (ns) of the buckets of `width` seconds covering
+    [start, end), aligned to multiples of the width.
+    """
+    width_ns = width * NS
+    first = start // width_ns * width_ns
+    return np.arange(first, end, width_ns, dtype=np.int64)
+
+
+def _bucket_indexes(timestamps, buckets, width):
+    if not len(buckets):
+        return np.zeros(len(timestamps), dtype=np.int64), np.zeros(
+            len(timestamps), dtype=bool
+        )
+
+    indexes = (timestamps - buckets[0]) // (width * NS)
+    return indexes, (indexes >= 0) & (indexes < len(buckets))
+
+
+def _column(values):
+    # NaN marks empty buckets, `null` in JSON
+    return [None if value != value else round(value, 3) for value in values.tolist()]
+
+
+def rate(column: Column, buckets, width):
+    """
+    Samples per second in each bucket.
+    """
+    timestamps, _ = column.arrays()
+    indexes, selected = _bucket_indexes(timestamps, buckets, width)
+    counts = np.bincount(indexes[selected], minlength=len(buckets))
+    return _column(counts / width)
+
+
+def summarize(column: Column, buckets, width, last=False):
+    """
+    count/min/mean/p95/max of the samples of each bucket, as columns. With
+    `last`, also the value the series had at the end of each bucket, carried
+    over empty buckets (for gauges, like the route count).
+    """
+    timestamps, values = column.arrays()
+    indexes, selected = _bucket_indexes(timestamps, buckets, width)
+    in_range, in_range_values = indexes[selected], values[selected]
+
+    counts = np.bincount(in_range, minlength=len(buckets))
+    empty = np.full(len(buckets), np.nan)
+    result = {"count": counts.tolist()}
+    if not len(in_range):
+        result.update({stat: _column(empty) for stat in ("min", "mean", "p95", "max")})
+    else:
+        # Sorted by bucket and then by value, every statistic is a position
+        # within the run of its bucket
+        order = np.lexsort((in_range_values, in_range))
+        ordered = in_range_values[order]
+        firsts = np.cumsum(counts) - counts
+        filled = counts > 0
+        sums = np.bincount(in_range, weights=in_range_values, minlength=len(buckets))
+
+        def at(offsets):
+            stat = empty.copy()
+            stat[filled] = ordered[(firsts + offsets)[filled]]
+            return stat
+
+        mean = empty.copy()
+        mean[filled] = sums[filled] / counts[filled]
+        result.update(
+            {
+                "min": _column(at(0)),
+                "mean": _column(mean),
+                "p95": _column(at(np.ceil(counts * 0.95).astype(np.int64) - 1)),
+                "max": _column(at(counts - 1)),
+            }
+        )
+
+    if last:
+        result["last"] = _column(_last_values(timestamps, values, buckets, width))
+
+    return result
+
+
+def _last_values(timestamps, values, buckets, width):
+    if not len(timestamps) or not len(buckets):
+        return np.full(len(buckets), np.nan)
+
+    # Index of the last sample before the end of each bucket; samples are in
+    # arrival order, which may differ slightly from timestamp order
+    order = np.argsort(timestamps, kind="stable")
+    ends = buckets + width * NS
+    positions = np.searchsorted(timestamps[order], ends, side="left") - 1
+
+    last = np.full(len(buckets), np.nan)
+    seen = positions >= 0
+    last[seen] = values[order][positions[seen]]
+    return last
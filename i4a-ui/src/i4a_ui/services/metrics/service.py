@@ -0,0 +1,341 @@
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+from i4a_ui.services.events.fetcher import EventsFetcher
+from i4a_ui.services.network.service import DEFAULT_MAX_PARALLEL
+
+from .openmetrics import Exposition, add_device_status, add_summary
+from .series import Column, bucket_starts, choose_resolution, rate, summarize
+
+DEFAULT_REFRESH_INTERVAL = 1.0
+
+# Events with a latency, and the attribute holding it ("12.3 ms")
+CS_LATENCIES = {
+    "enter_critical_section": "time_to_enter_cs",
+    "exit_critical_section": "time_in_cs",
+}
+# Events changing the routing table
+ROUTE_EVENTS = (
+    "add_route",
+    "remove_route",
+    "remove_routes_for_interface",
+    "reset_routing_table",
+)
+# Messages a device sends carry its own DTR
+DTR_EVENTS = ("send_peer_message", "broadcast_to_siblings")
+# Events of control-plane messages: (kind, direction)
+MESSAGE_EVENTS = {
+    "send_peer_message": ("peer", "sent"),
+    "on_peer_message": ("peer", "received"),
+    "broadcast_to_siblings": ("sibling", "sent"),
+    "on_sibling_message": ("sibling", "received"),
+}
+# OpenMetrics summaries of the critical section latencies
+CS_SUMMARIES = {
+    "time_to_enter_cs": "nodo_cs_enter_latency_seconds",
+    "time_in_cs": "nodo_cs_duration_seconds",
+}
+
+METRICS = ("events_per_sec", "time_to_enter_cs", "time_in_cs", "routes", "dtr")
+
+
+def parse_ms(value):
+    try:
+        return float(str(value).split()[0])
+    except (ValueError, IndexError):
+        return None
+
+
+class DeviceMetrics:
+    """
+    Samples of every metric of a device, taken from its events.
+    """
+
+    def __init__(self):
+        self.columns = {metric: Column() for metric in METRICS}
+        # Routes added by the routing core, replayed from its events like
+        # `RoutingTable` applies them: (network, mask) -> interface of
+        # each route, as adding a route twice keeps both
+        self.routes = {}
+        # Messages by (kind, direction, message id)
+        self.messages = Counter()
+
+    def add(self, event):
+        timestamp, data = event["timestamp"], event["data"]
+        name = data.get("event")
+
+        self.columns["events_per_sec"].append(timestamp)
+        if (attribute := CS_LATENCIES.get(name)) and attribute in data:
+            if (latency := parse_ms(data[attribute])) is not None:
+                self.columns[attribute].append(timestamp, latency)
+        if name in ROUTE_EVENTS:
+            self._update_routes(name, data)
+            self.columns["routes"].append(
+                timestamp, sum(len(ifaces) for ifaces in self.routes.values())
+            )
+        if name in DTR_EVENTS and isinstance(data.get("dtr"), int):
+            self.columns["dtr"].append(timestamp, data["dtr"])
+        if name in MESSAGE_EVENTS:
+            self.messages[(*MESSAGE_EVENTS[name], data.get("id"))] += 1
+
+    def _update_routes(self, name, data):
+        if name == "add_route":
+            key = (data.get("network"), data.get("mask"))
+            self.routes.setdefault(key, []).append(data.get("iface"))
+        elif name == "remove_route":
+            self.routes.pop((data.get("network"), data.get("mask")), None)
+        elif name == "remove_routes_for_interface":
+            iface = data.get("iface")
+            for key, ifaces in list(self.routes.items()):
+                if remaining := [i for i in ifaces if i != iface]:
+                    self.routes[key] = remaining
+                else:
+                    del self.routes[key]
+        else:
+            self.routes.clear()
+
+    def time_range(self):
+        timestamps, _ = self.columns["events_per_sec"].arrays()
+        if not len(timestamps):
+            return None
+        return int(timestamps.min()), int(timestamps.max())
+
+    def expose(self, exposition: Exposition, labels):
+        for metric, name in CS_SUMMARIES.items():
+            _, latencies_ms = self.columns[metric].arrays()
+            add_summary(exposition, name, labels, latencies_ms)
+
+        for (kind, direction, message_id), count in self.messages.items():
+            exposition.add(
+                "nodo_messages",
+                {**labels, "kind": kind, "direction": direction, "type": message_id},
+                count,
+            )
+
+    def series(self, buckets, width, metrics=METRICS):
+        result = {}
+        for metric in metrics:
+            column = self.columns[metric]
+            if metric == "events_per_sec":
+                result[metric] = rate(column, buckets, width)
+            else:
+                # Route count and DTR are gauges: they keep their value
+                # between the events that change it
+                gauge = metric in ("routes", "dtr")
+                result[metric] = summarize(column, buckets, width, last=gauge)
+        return result
+
+
+class NodeMetrics:
+    def __init__(self):
+        self.devices = {}
+        # Position and timestamp of the last event read, to only read the
+        # new ones and tell when pysim was cleared
+        self.seq = 0
+        self.timestamp = None
+        self.refreshed_at = 0.0
+        self.pending = None
+
+    def update(self, events):
+        if self.seq > len(events) or (
+            self.seq and events[self.seq - 1]["timestamp"] != self.timestamp
+        ):
+            self.devices.clear()
+            self.seq = 0
+
+        for event in events[self.seq :]:
+            self.devices.setdefault(event["source"], DeviceMetrics()).add(event)
+
+        self.seq = len(events)
+        self.timestamp = events[-1]["timestamp"] if events else None
+
+
+class MetricsService:
+    """
+    Time series of the events of each device, aggregated in fixed buckets.
+    Only the events received since the previous refresh are read, and each
+    node is refreshed at most once every `refresh_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        pysim,
+        network_service,
+        max_parallel=DEFAULT_MAX_PARALLEL,
+        refresh_interval=DEFAULT_REFRESH_INTERVAL,
+        fetcher=None,
+    ):
+        self.pysim = pysim
+        self.network_service = network_service
+        self.fetcher = fetcher or EventsFetcher(pysim)
+        self.fanout = asyncio.Semaphore(max_parallel)
+        self.refresh_interval = refresh_interval
+        self.nodes = {}
+
+        self.exposition = None
+        self.exposition_at = 0.0
+        self.pending_exposition = None
+
+    async def _refresh(self, node: NodeMetrics, node_id):
+        try:
+            async with self.fanout:
+                events = await self.fetcher.get(node_id, stream="events")
+            node.update(events)
+            node.refreshed_at = time.monotonic()
+            return node
+        finally:
+            node.pending = None
+
+    async def refresh_node(self, node_id):
+        node = self.nodes.setdefault(node_id, NodeMetrics())
+        if time.monotonic() - node.refreshed_at < self.refresh_interval:
+            return node
+
+        if node.pending is None:
+            node.pending = asyncio.ensure_future(self._refresh(node, node_id))
+        # A client going away must not cancel the refresh of the others
+        return await asyncio.shield(node.pending)
+
+    async def _try_refresh_node(self, node_id):
+        try:
+            return await self.refresh_node(node_id)
+        except httpx.HTTPError as e:
+            return e
+
+    @staticmethod
+    def _buckets(devices, resolution, start, end):
+        ranges = [r for device in devices if (r := device.time_range())]
+        if start is None:
+            start = min((first for first, _ in ranges), default=0)
+        if end is None:
+            end = max((last for _, last in ranges), default=start) + 1
+
+        width = choose_resolution(resolution, start, end)
+        return width, bucket_starts(start, end, width)
+
+    async def get_node_metrics(
+        self,
+        node_id,
+        device=None,
+        metrics=METRICS,
+        resolution="auto",
+        start=None,
+        end=None,
+    ):
+        node = await self.refresh_node(node_id)
+        devices = {
+            name: device_metrics
+            for name, device_metrics in node.devices.items()
+            if device is None or name == device
+        }
+
+        width, buckets = self._buckets(devices.values(), resolution, start, end)
+        return {
+            "resolution": width,
+            "timestamps": buckets.tolist(),
+            "devices": {
+                name: device_metrics.series(buckets, width, metrics)
+                for name, device_metrics in devices.items()
+            },
+        }
+
+    async def _refresh_nodes(self):
+        """
+        Node name -> (container ID, its `NodeMetrics` or the error refreshing
+        it) for every node of the network.
+        """
+        nodes = {
+            name: node["containerId"]
+            for name, node in (await self.network_service.get_nodes())
+            .get("nodes", {})
+            .items()
+            if node.get("containerId")
+        }
+        results = await asyncio.gather(
+            *(self._try_refresh_node(node_id) for node_id in nodes.values())
+        )
+        return {
+            name: (node_id, result)
+            for (name, node_id), result in zip(nodes.items(), results)
+        }
+
+    async def get_network_metrics(
+        self, metrics=METRICS, resolution="auto", start=None, end=None
+    ):
+        """
+        Series of every device of every node, over the same buckets so they
+        can be charted together.
+        """
+        nodes = await self._refresh_nodes()
+        width, buckets = self._buckets(
+            [
+                device
+                for _, result in nodes.values()
+                if isinstance(result, NodeMetrics)
+                for device in result.devices.values()
+            ],
+            resolution,
+            start,
+            end,
+        )
+
+        series = {}
+        for name, (node_id, result) in nodes.items():
+            if isinstance(result, Exception):
+                series[name] = {"containerId": node_id, "error": str(result)}
+            else:
+                series[name] = {
+                    "containerId": node_id,
+                    "devices": {
+                        device: device_metrics.series(buckets, width, metrics)
+                        for device, device_metrics in result.devices.items()
+                    },
+                }
+
+        return {"resolution": width, "timestamps": buckets.tolist(), "nodes": series}
+
+    async def _render_exposition(self):
+        try:
+            statuses, nodes = await asyncio.gather(
+                self.network_service.get_statuses(), self._refresh_nodes()
+            )
+
+            exposition = Exposition()
+            for name, (_, result) in statuses.items():
+                up = not isinstance(result, Exception)
+                exposition.add("nodo_up", {"node": name}, int(up))
+                if up:
+                    for device, status in result.items():
+                        labels = {"node": name, "device": device}
+                        add_device_status(exposition, labels, status or {})
+
+            for name, (_, result) in nodes.items():
+                if isinstance(result, NodeMetrics):
+                    for device, device_metrics in result.devices.items():
+                        labels = {"node": name, "device": device}
+                        device_metrics.expose(exposition, labels)
+
+            self.exposition = exposition.render()
+            self.exposition_at = time.monotonic()
+            return self.exposition
+        finally:
+            self.pending_exposition = None
+
+    async def get_openmetrics(self):
+        """
+        Metrics of every device in the OpenMetrics text format, from the
+        cached node statuses and the events read so far. Scrapes less than
+        `refresh_interval` seconds apart get the same exposition.
+        """
+        if (
+            self.exposition is not None
+            and time.monotonic() - self.exposition_at < self.refresh_interval
+        ):
+            return self.exposition
+
+        if self.pending_exposition is None:
+            self.pending_exposition = asyncio.ensure_future(self._render_exposition())
+        return await asyncio.shield(self.pending_exposition)
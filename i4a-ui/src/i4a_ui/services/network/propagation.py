@@ -0,0 +1,45 @@
+from .histogram import LatencyHistogram
+
+
+def merge_histograms(histograms):
+    """
+    Merges latency histograms reported by the devices into a single summary.
+    Histograms with other bounds than the first one are left out.
+    """
+    histograms = [LatencyHistogram.from_json(h) for h in histograms if h and h["count"]]
+    if not histograms:
+        return None
+
+    merged = LatencyHistogram(histograms[0].bounds_ms)
+    for histogram in histograms:
+        if histogram.bounds_ms == merged.bounds_ms:
+            merged.merge(histogram)
+    return merged.json()
+
+
+def aggregate_propagation(device_statuses):
+    """
+    Aggregates the `propagation` section of the given device statuses into
+    per message type distributions for the whole network.
+    """
+    per_message = {}
+
+    for status in device_statuses:
+        for key, stats in (status.get("propagation") or {}).items():
+            entry = per_message.setdefault(
+                key, {"end_to_end": [], "per_hop": [], "max_hops": 0, "devices": 0}
+            )
+            entry["end_to_end"].append(stats["end_to_end"])
+            entry["per_hop"].append(stats["per_hop"])
+            entry["max_hops"] = max(entry["max_hops"], stats["max_hops"])
+            entry["devices"] += 1
+
+    return {
+        key: {
+            "end_to_end": merge_histograms(entry["end_to_end"]),
+            "per_hop": merge_histograms(entry["per_hop"]),
+            "max_hops": entry["max_hops"],
+            "devices": entry["devices"],
+        }
+        for key, entry in sorted(per_message.items())
+    }
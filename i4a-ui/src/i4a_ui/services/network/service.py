@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import httpx
+
+from i4a_ui.services.events.model.event import Status
+
+from .propagation import aggregate_propagation
+
+DEFAULT_MAX_PARALLEL = 8
+DEFAULT_STATUS_TTL = 1.0
+
+
+class NetworkService:
+    def __init__(
+        self, pysim, max_parallel=DEFAULT_MAX_PARALLEL, status_ttl=DEFAULT_STATUS_TTL
+    ):
+        self.pysim = pysim
+        self.fanout = asyncio.Semaphore(max_parallel)
+        self.status_ttl = status_ttl
+
+        self.statuses = None
+        self.statuses_at = 0.0
+        self.pending = None
+
+    async def get_nodes(self):
+        return await self.pysim.get("/nodes")
+
+    async def _fetch_node_status(self, container_id):
+        async with self.fanout:
+            try:
+                return await self.pysim.get(f"/nodes/{container_id}/status")
+            except httpx.HTTPError as e:
+                return e
+
+    async def _fetch_statuses(self):
+        nodes = {
+            node_id: node["containerId"]
+            for node_id, node in (await self.get_nodes()).get("nodes", {}).items()
+            if node.get("containerId")
+        }
+        results = await asyncio.gather(
+            *(self._fetch_node_status(container_id) for container_id in nodes.values())
+        )
+        return {
+            node_id: (container_id, result)
+            for (node_id, container_id), result in zip(nodes.items(), results)
+        }
+
+    async def _refresh_statuses(self):
+        try:
+            self.statuses = await self._fetch_statuses()
+            self.statuses_at = time.monotonic()
+            return self.statuses
+        finally:
+            self.pending = None
+
+    async def get_statuses(self):
+        """
+        Statuses of every node, fetched concurrently. Results are reused for
+        `status_ttl` seconds, and concurrent callers share a single fetch.
+        """
+        if self.statuses is not None and (
+            time.monotonic() - self.statuses_at < self.status_ttl
+        ):
+            return self.statuses
+
+        if self.pending is None:
+            self.pending = asyncio.ensure_future(self._refresh_statuses())
+        # A client going away must not cancel the fetch of the others
+        return await asyncio.shield(self.pending)
+
+    async def get_device_statuses(self):
+        statuses = []
+
+        for _, result in (await self.get_statuses()).values():
+            if not isinstance(result, Exception):
+                statuses.extend(result.values())
+
+        return statuses
+
+    async def get_status(self):
+        nodes = {}
+
+        for node_id, (container_id, result) in (await self.get_statuses()).items():
+            if isinstance(result, Exception):
+                nodes[node_id] = {"containerId": container_id, "error": str(result)}
+            else:
+                nodes[node_id] = {
+                    "containerId": container_id,
+                    "devices": {k: Status(v).json() for k, v in result.items()},
+                }
+
+        return {"nodes": nodes}
+
+    async def get_propagation(self):
+        return aggregate_propagation(await self.get_device_statuses())
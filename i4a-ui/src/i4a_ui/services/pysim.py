@@ -0,0 +1,53 @@
+import asyncio
+
+import httpx
+
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_CONNECT_TIMEOUT = 2.0
+DEFAULT_MAX_CONCURRENCY = 16
+
+
+class PysimClient:
+    """
+    Async client for the pysim API, shared by every request of the UI.
+
+    Connections to pysim are pooled and kept alive, and at most
+    `max_concurrency` requests are in flight at once: the rest wait for a
+    free slot, so many browser tabs polling at the same time don't multiply
+    the load on pysim.
+    """
+
+    def __init__(
+        self,
+        base_url,
+        timeout=DEFAULT_TIMEOUT,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        transport=None,
+    ):
+        self.base_url = base_url
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+            transport=transport,
+        )
+
+    async def request(self, method, path, **kwargs):
+        async with self.semaphore:
+            response = await self.client.request(method, path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def get(self, path, params=None):
+        return await self.request("GET", path, params=params)
+
+    async def post(self, path, json=None):
+        return await self.request("POST", path, json=json)
+
+    async def close(self):
+        await self.client.aclose()
@@ -0,0 +1,111 @@
+import gzip
+import mimetypes
+import os
+
+from fastapi import Response
+
+from i4a_ui.middleware import etag_matches, make_etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def accepted_encodings(accept_encoding: str) -> dict:
+    """
+    Returns the quality (`q`) of each encoding listed in an `Accept-Encoding`
+    header. A quality of 0 means the encoding is not acceptable.
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        encoding, *params = [part.strip() for part in item.split(";")]
+        if not encoding:
+            continue
+
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[encoding.lower()] = quality
+    return qualities
+
+
+class Asset:
+    """
+    An asset loaded in memory, with its compressed variants computed once.
+    """
+
+    def __init__(self, content: bytes, media_type: str, cache_control: str):
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.variants = {"identity": content, "gzip": gzip.compress(content, 9)}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(content)
+
+        # Each variant is a different representation, with its own ETag
+        etag = make_etag(content)
+        self.etags = {
+            encoding: etag if encoding == "identity" else f'{etag[:-1]}-{encoding}"'
+            for encoding in self.variants
+        }
+
+    def choose_encoding(self, accept_encoding=""):
+        """
+        Returns the compressed variant the client accepts with the highest
+        quality, preferring brotli, or `identity` if it accepts none.
+        """
+        qualities = accepted_encodings(accept_encoding)
+        chosen, chosen_quality = "identity", 0.0
+        for encoding in ("br", "gzip"):
+            quality = qualities.get(encoding, qualities.get("*", 0.0))
+            if encoding in self.variants and quality > chosen_quality:
+                chosen, chosen_quality = encoding, quality
+        return chosen
+
+    def response(self, if_none_match=None, accept_encoding=""):
+        encoding = self.choose_encoding(accept_encoding)
+
+        headers = {
+            "ETag": self.etags[encoding],
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+
+        if etag_matches(if_none_match, self.etags[encoding]):
+            return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        return Response(
+            self.variants[encoding], media_type=self.media_type, headers=headers
+        )
+
+
+class AssetStore:
+    def __init__(self, assets_dir, cache_control=None):
+        self.assets_dir = assets_dir
+        # Assets that may be cached without revalidation, by name
+        self.cache_control = cache_control or {}
+        self.assets = {}
+
+    def get(self, name):
+        if (asset := self.assets.get(name)) is None:
+            with open(os.path.join(self.assets_dir, name), "rb") as f:
+                content = f.read()
+
+            media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            asset = Asset(content, media_type, self.cache_control.get(name, "no-cache"))
+            self.assets[name] = asset
+        return asset
+
+    def response(self, name, request):
+        return self.get(name).response(
+            request.headers.get("if-none-match"),
+            request.headers.get("accept-encoding", ""),
+        )
@@ -0,0 +1,66 @@
+import asyncio
+
+from i4a_ui.services.events.fetcher import EventsFetcher
+
+
+class SlowPysim:
+    def __init__(self):
+        self.requests = []
+
+    async def get(self, path, params=None):
+        self.requests.append((path, params))
+        await asyncio.sleep(0.01)
+        return [{"request": len(self.requests)}]
+
+
+def test_concurrent_requests_share_a_download():
+    pysim = SlowPysim()
+    fetcher = EventsFetcher(pysim)
+
+    async def fetch():
+        return await asyncio.gather(
+            fetcher.get("node", stream="events"),
+            fetcher.get("node", stream="events"),
+            fetcher.get("node", stream="logs"),
+            fetcher.get("node", "wlan0", "events"),
+        )
+
+    events, same, logs, device = asyncio.run(fetch())
+
+    assert events is same
+    assert logs is not events and device is not events
+    assert pysim.requests == [
+        ("/nodes/node/events", {"stream": "events"}),
+        ("/nodes/node/events", {"stream": "logs"}),
+        ("/nodes/node/events/wlan0", {"stream": "events"}),
+    ]
+
+
+def test_downloads_are_reused_until_they_age():
+    pysim = SlowPysim()
+    fetcher = EventsFetcher(pysim, max_age=0.05)
+
+    async def fetch():
+        first = await fetcher.get("node", stream="events")
+        reused = await fetcher.get("node", stream="events")
+        await asyncio.sleep(0.05)
+        return first, reused, await fetcher.get("node", stream="events")
+
+    first, reused, aged = asyncio.run(fetch())
+
+    assert first is reused
+    assert aged == [{"request": 2}]
+
+
+def test_clear_drops_downloads_in_progress():
+    pysim = SlowPysim()
+    fetcher = EventsFetcher(pysim)
+
+    async def fetch():
+        started = asyncio.ensure_future(fetcher.get("node"))
+        await asyncio.sleep(0)
+        fetcher.clear()
+        await started
+        return await fetcher.get("node")
+
+    assert asyncio.run(fetch()) == [{"request": 2}]
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from i4a_ui.services.events.filters import EventFilter
+from i4a_ui.services.events.service import Cursor, NodeEventsService
+
+
+class FakePysim:
+    def __init__(self, events):
+        self.events = events
+        self.requests = []
+
+    async def get(self, path, params=None):
+        self.requests.append((path, params))
+        return self.events
+
+
+def make_events(count, start=1000):
+    return [
+        {
+            "timestamp": start + i,
+            "source": "n",
+            "stream": "events",
+            "data": {"event": "tick" if i % 2 else "on_start"},
+        }
+        for i in range(count)
+    ]
+
+
+def get_events(events, **kwargs):
+    service = NodeEventsService(FakePysim(events))
+    return asyncio.run(service.get_events("node", **kwargs))
+
+
+def seqs(page):
+    return [event["seq"] for event in page.events]
+
+
+@pytest.mark.parametrize(
+    "value, cursor", [("0", Cursor(0)), ("12", Cursor(12)), ("3:999", Cursor(3, 999))]
+)
+def test_cursor_round_trip(value, cursor):
+    assert Cursor.parse(value) == cursor
+    assert str(cursor) == value
+
+
+def test_all_events():
+    page = get_events(make_events(3))
+
+    assert seqs(page) == [0, 1, 2]
+    assert page.next_cursor == Cursor(3, 1002)
+    assert not page.reset
+
+
+def test_events_since_cursor():
+    events = make_events(5)
+    cursor = get_events(events[:3]).next_cursor
+    page = get_events(events, since=cursor)
+
+    assert seqs(page) == [3, 4]
+    assert page.next_cursor == Cursor(5, 1004)
+    assert not page.reset
+
+
+def test_cursor_without_new_events():
+    page = get_events(make_events(3), since=Cursor(3, 1002))
+
+    assert page.events == []
+    assert page.next_cursor == Cursor(3, 1002)
+
+
+def test_reset_when_fewer_events_than_the_cursor():
+    page = get_events(make_events(2, start=5000), since=Cursor(3, 1002))
+
+    assert page.reset
+    assert seqs(page) == [0, 1]
+
+
+def test_reset_when_events_were_cleared_and_received_again():
+    # As many events as before, or more, but not the same ones
+    page = get_events(make_events(6, start=5000), since=Cursor(3, 1002))
+
+    assert page.reset
+    assert seqs(page) == [0, 1, 2, 3, 4, 5]
+    assert page.next_cursor == Cursor(6, 5005)
+
+
+def test_cursor_without_timestamp_is_not_reset_by_new_events():
+    page = get_events(make_events(6, start=5000), since=Cursor(3))
+
+    assert not page.reset
+    assert seqs(page) == [3, 4, 5]
+
+
+def test_limit_continues_from_next_cursor():
+    events = make_events(5)
+    first = get_events(events, limit=2)
+    second = get_events(events, since=first.next_cursor, limit=2)
+
+    assert seqs(first) == [0, 1]
+    assert first.next_cursor == Cursor(2, 1001)
+    assert seqs(second) == [2, 3]
+
+
+def test_tail():
+    assert seqs(get_events(make_events(5), tail=2)) == [3, 4]
+    assert seqs(get_events(make_events(5), tail=0)) == []
+
+
+def test_filter_and_pages():
+    events = make_events(10)
+    event_filter = EventFilter(include=["tick"])
+
+    assert seqs(get_events(events, event_filter=event_filter)) == [1, 3, 5, 7, 9]
+    page = get_events(events, event_filter=event_filter, limit=2, page=2)
+    assert seqs(page) == [5, 7]
+    assert page.next_cursor == Cursor(8, 1007)
+
+
+def test_device_and_stream_are_requested():
+    pysim = FakePysim(make_events(1))
+    service = NodeEventsService(pysim)
+    asyncio.run(service.get_events("node", device="n", stream="events"))
+
+    assert pysim.requests == [("/nodes/node/events/n", {"stream": "events"})]
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from i4a_ui.services.metrics.series import (
+    NS,
+    Column,
+    bucket_starts,
+    choose_resolution,
+    rate,
+    summarize,
+)
+from i4a_ui.services.metrics.service import DeviceMetrics
+
+EMPTY_STATS = {"min": [None], "mean": [None], "p95": [None], "max": [None]}
+
+
+def column(*samples):
+    result = Column()
+    for timestamp, value in samples:
+        result.append(int(timestamp * NS), value)
+    return result
+
+
+def buckets(start, end, width=1):
+    return bucket_starts(int(start * NS), int(end * NS), width)
+
+
+def test_column_joins_appends_on_read():
+    samples = column((1, 1.0), (2, 2.0))
+    samples.arrays()
+    samples.append(3 * NS, 3.0)
+
+    timestamps, values = samples.arrays()
+    assert len(samples) == 3
+    assert timestamps.tolist() == [NS, 2 * NS, 3 * NS]
+    assert values.tolist() == [1.0, 2.0, 3.0]
+
+
+def test_buckets_are_aligned_to_their_width():
+    assert bucket_starts(15 * NS, 35 * NS, 10).tolist() == [10 * NS, 20 * NS, 30 * NS]
+
+
+def test_choose_resolution():
+    assert choose_resolution("auto", 0, 100 * NS) == 1
+    assert choose_resolution("auto", 0, 1000 * NS) == 10
+    assert choose_resolution("1m", 0, NS) == 60
+    with pytest.raises(ValueError):
+        choose_resolution("1s", 0, 20000 * NS)
+
+
+def test_rate_is_per_second():
+    samples = column((0.1, 1), (0.5, 1), (10.2, 1), (25, 1), (99, 1))
+    assert rate(samples, buckets(0, 30, 10), 10) == [0.2, 0.1, 0.1]
+
+
+def test_summarize():
+    samples = column(*((0.5, v) for v in range(1, 21)), (2.5, 7.0))
+    result = summarize(samples, buckets(0, 3), 1)
+
+    assert result["count"] == [20, 0, 1]
+    assert result["min"] == [1.0, None, 7.0]
+    assert result["mean"] == [10.5, None, 7.0]
+    assert result["p95"] == [19.0, None, 7.0]
+    assert result["max"] == [20.0, None, 7.0]
+    assert "last" not in result
+
+
+def test_summarize_without_samples_in_range():
+    result = summarize(column((50, 1.0)), buckets(0, 1), 1)
+    assert result == {"count": [0], **EMPTY_STATS}
+
+
+def test_summarize_without_buckets():
+    result = summarize(column((0, 1.0)), np.empty(0, dtype=np.int64), 1)
+    assert result["count"] == []
+
+
+def test_last_carries_gauges_over_empty_buckets():
+    # Out of timestamp order, as events may arrive
+    samples = column((0.5, 1.0), (2.2, 3.0), (0.7, 2.0))
+    result = summarize(samples, buckets(0, 4), 1, last=True)
+
+    assert result["last"] == [2.0, 2.0, 3.0, 3.0]
+
+
+def test_last_before_the_first_sample():
+    result = summarize(column((1.5, 4.0)), buckets(0, 2), 1, last=True)
+    assert result["last"] == [None, 4.0]
+
+
+def route_event(timestamp, name, **data):
+    return {"timestamp": timestamp * NS, "data": {"event": name, **data}}
+
+
+def test_routes_gauge_follows_the_routing_table():
+    metrics = DeviceMetrics()
+    for event in (
+        route_event(0, "add_route", network=1, mask=255, iface="wlan"),
+        route_event(1, "add_route", network=2, mask=255, iface="wlan"),
+        route_event(2, "add_route", network=2, mask=255, iface="spi"),
+        route_event(3, "remove_routes_for_interface", iface="wlan"),
+        route_event(4, "remove_route", network=2, mask=255),
+        route_event(5, "add_route", network=3, mask=255, iface="spi"),
+        route_event(6, "reset_routing_table"),
+    ):
+        metrics.add(event)
+
+    _, routes = metrics.columns["routes"].arrays()
+    assert routes.tolist() == [1, 2, 3, 1, 0, 1, 0]
+    assert metrics.columns["events_per_sec"].arrays()[0].tolist() == [
+        t * NS for t in range(7)
+    ]
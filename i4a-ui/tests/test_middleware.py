@@ -0,0 +1,81 @@
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+
+from i4a_ui.middleware import JsonETagMiddleware, etag_matches
+
+STATUS = {"nodes": {f"node-{i}": {"status": "running"} for i in range(100)}}
+
+
+def client():
+    app = FastAPI()
+    app.add_middleware(JsonETagMiddleware)
+    app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+    @app.get("/status")
+    def status():
+        return STATUS
+
+    @app.get("/text")
+    def text():
+        return PlainTextResponse("text")
+
+    @app.post("/status")
+    def post_status():
+        return STATUS
+
+    return TestClient(app)
+
+
+def test_etag_matches():
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert etag_matches("*", '"b"')
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches(None, '"b"')
+
+
+def test_json_responses_have_an_etag():
+    response = client().get("/status")
+
+    assert response.status_code == 200
+    assert response.json() == STATUS
+    assert response.headers["ETag"].startswith('W/"')
+
+
+def test_matching_etag_is_not_modified():
+    http = client()
+    etag = http.get("/status").headers["ETag"]
+
+    response = http.get("/status", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    assert "Content-Type" not in response.headers
+
+    changed = http.get("/status", headers={"If-None-Match": 'W/"other"'})
+    assert changed.status_code == 200
+    assert changed.json() == STATUS
+
+
+def test_compressed_and_plain_responses_share_the_etag():
+    http = client()
+    compressed = http.get("/status", headers={"Accept-Encoding": "gzip"})
+    plain = http.get("/status", headers={"Accept-Encoding": "identity"})
+
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Content-Encoding" not in plain.headers
+    assert compressed.headers["ETag"] == plain.headers["ETag"]
+
+    response = http.get(
+        "/status",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": plain.headers["ETag"]},
+    )
+    assert response.status_code == 304
+
+
+def test_other_responses_are_untouched():
+    http = client()
+
+    assert "ETag" not in http.get("/text").headers
+    assert "ETag" not in http.post("/status").headers
@@ -0,0 +1,78 @@
+import gzip
+
+import pytest
+
+from i4a_ui.services.static import Asset, accepted_encodings
+
+CONTENT = b"body { color: black; }" * 100
+
+
+def asset():
+    return Asset(CONTENT, "text/css", "no-cache")
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, deflate;q=0.5, br ; Q=0 , *;q=0.1") == {
+        "gzip": 1.0,
+        "deflate": 0.5,
+        "br": 0.0,
+        "*": 0.1,
+    }
+    assert accepted_encodings("") == {}
+    assert accepted_encodings("gzip;q=bad") == {"gzip": 0.0}
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, encoding",
+    [
+        ("", "identity"),
+        ("gzip", "gzip"),
+        ("deflate, gzip;q=0.8", "gzip"),
+        ("gzip;q=0", "identity"),
+        ("gzip;q=0.0, identity", "identity"),
+        ("*", "gzip"),
+        ("*, gzip;q=0", "identity"),
+        ("x-gzip", "identity"),
+    ],
+)
+def test_choose_encoding(accept_encoding, encoding):
+    assert asset().choose_encoding(accept_encoding) == encoding
+
+
+def test_brotli_is_preferred():
+    pytest.importorskip("brotli")
+
+    assert asset().choose_encoding("gzip, br") == "br"
+    assert asset().choose_encoding("gzip, br;q=0.5") == "gzip"
+    assert asset().choose_encoding("gzip, br;q=0") == "gzip"
+
+
+def test_response_is_compressed():
+    response = asset().response(accept_encoding="gzip")
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(response.body) == CONTENT
+
+
+def test_each_encoding_has_its_etag():
+    static = asset()
+    plain = static.response(accept_encoding="gzip;q=0")
+    compressed = static.response(accept_encoding="gzip")
+
+    assert "Content-Encoding" not in plain.headers
+    assert plain.body == CONTENT
+    assert plain.headers["ETag"] != compressed.headers["ETag"]
+    assert compressed.headers["ETag"].endswith('-gzip"')
+
+
+def test_matching_etag_is_not_modified():
+    static = asset()
+    etag = static.response(accept_encoding="gzip").headers["ETag"]
+
+    response = static.response(if_none_match=etag, accept_encoding="gzip")
+    assert response.status_code == 304
+    assert response.body == b""
+
+    # The ETag of another encoding doesn't match
+    assert static.response(if_none_match=etag).status_code == 200
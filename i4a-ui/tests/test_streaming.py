@@ -0,0 +1,44 @@
+import asyncio
+
+from i4a_ui.services.events.service import Cursor, EventsPage
+from i4a_ui.services.events.streaming import EventBroadcaster
+
+
+class FlakyEventsService:
+    """
+    Serves one event per poll, failing the given polls.
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.polls = 0
+
+    async def get_events(self, node_id, device=None, stream=None, since=None, **_):
+        if since is None:
+            return EventsPage([], Cursor(0))
+
+        self.polls += 1
+        if self.polls in self.failures:
+            raise self.failures[self.polls]
+        return EventsPage([{"seq": since.seq}], Cursor(since.seq + 1))
+
+
+async def first_messages(service, count):
+    stream = EventBroadcaster(service, poll_interval=0.001).stream(
+        "node", "n", "events"
+    )
+    messages = stream.listen()
+    try:
+        return [await anext(messages) for _ in range(count)]
+    finally:
+        await messages.aclose()
+
+
+def test_polling_survives_unexpected_errors():
+    service = FlakyEventsService({1: KeyError("data"), 2: ValueError("bad event")})
+    messages = asyncio.run(asyncio.wait_for(first_messages(service, 2), 1))
+
+    assert messages == [
+        'id: 1\ndata: [{"seq": 0}]\n\n',
+        'id: 2\ndata: [{"seq": 1}]\n\n',
+    ]
@@ -11,6 +11,7 @@ from pysim_sdk import PysimClient
 from pysim_sdk.utils import log
 from .routing.core.forwarder import ForwarderCore
 from .routing.core.root_forwarder import RootForwarderCore
+from .utils.queues import DEFAULT_SPI_CAPACITY, SpiQueue
 
 
 SPI_HOST_MAP = {
@@ -54,7 +55,8 @@ def main():
     config = pysim.get_config()
 
     wlan_barriers, wlan_unlocks = setup_wlan_barriers(config.get("connect_order", []))
-    spi_queues = [mp.Queue() for _ in "newsc"]
+    spi_capacity = config.get("queues", {}).get("spi", DEFAULT_SPI_CAPACITY)
+    spi_queues = [SpiQueue(spi_capacity) for _ in "newsc"]
     spi_pairs = [
         (spi_queues[i], spi_queues[(i + 1) % len(spi_queues)])
         for i in range(len(spi_queues))
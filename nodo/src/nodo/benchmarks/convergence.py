@@ -0,0 +1,415 @@
+"""
+Routing convergence benchmark.
+
+Runs every network of `config/networks` (plus a few generated ones) on the
+headless simulator and measures, for each of them:
+
+ - time until every node is provisioned
+ - sibling and peer messages sent, by message type (count and bytes)
+ - critical sections entered by the devices
+ - the same figures after a scripted link loss, until the link is back
+   and the network converges again: how many nodes lost provisioning, when
+   the first one did and when all of them got it back, from the failure
+
+Times are virtual seconds, so results are reproducible for a given seed and
+can be compared against a saved baseline:
+
+    python -m nodo.benchmarks.convergence --output baseline.json
+    python -m nodo.benchmarks.convergence --baseline baseline.json
+
+`--link-profile` emulates bandwidth, delay and loss on the WLAN links (see
+`nodo.utils.link_emulation`).
+"""
+
+import json
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+from collections import defaultdict
+
+from nodo.topology import chain, geometric, grid, tree
+from nodo.sim.network import ROOT_NODE_ID, Simulation
+from nodo.utils.packets import ICMP_PEER_MESSAGE, SIBLINGS_UDP_PORT, Ipv4Packet
+
+NETWORKS_DIR = os.path.join(
+    os.path.dirname(__file__), "..", "..", "..", "..", "config", "networks"
+)
+
+SIBLING = "sibling"
+PEER = "peer"
+DATA = "data"
+
+DEFAULT_TIMEOUT = 600.0
+DEFAULT_OUTAGE = 30.0
+
+# Metrics that depend on the host running the benchmark, reported but never
+# considered regressions
+HOST_METRICS = ("wall_time_s",)
+# Metrics describing the run rather than what it cost: how soon a node lost
+# provisioning after the link failure is neither better nor worse later
+DESCRIPTIVE_METRICS = ("lost_after_s",)
+
+
+class MessageCounter:
+    """
+    Counts the packets sent by every device of a simulation, by message kind
+    and type. Relays of a sibling broadcast count as separate messages, as
+    each of them is a separate SPI transfer.
+    """
+
+    def __init__(self):
+        self.counts = defaultdict(lambda: {"count": 0, "bytes": 0})
+
+    def __call__(self, _interface, packet: bytes):
+        stats = self.counts[self.classify(packet)]
+        stats["count"] += 1
+        stats["bytes"] += len(packet)
+
+    @staticmethod
+    def classify(packet: bytes):
+        ip = Ipv4Packet(packet)
+        if ip.udp_dport() == SIBLINGS_UDP_PORT:
+            # Sibling payloads start with the orientation of the broadcaster
+            kind, payload = SIBLING, ip.udp_payload()[1:]
+        elif ip.icmp_type() == ICMP_PEER_MESSAGE:
+            kind, payload = PEER, ip.icmp_payload()
+        else:
+            return DATA, None
+
+        return kind, json.loads(payload.decode("utf-8")).get("id")
+
+    def snapshot(self):
+        return {key: dict(stats) for key, stats in self.counts.items()}
+
+    @staticmethod
+    def diff(after: dict, before: dict):
+        result = {}
+        for key, stats in after.items():
+            previous = before.get(key, {"count": 0, "bytes": 0})
+            count = stats["count"] - previous["count"]
+            if count:
+                result[key] = {
+                    "count": count,
+                    "bytes": stats["bytes"] - previous["bytes"],
+                }
+        return result
+
+    @staticmethod
+    def json(counts: dict):
+        result = {}
+        for (kind, message_type), stats in sorted(
+            counts.items(), key=lambda item: (item[0][0], str(item[0][1]))
+        ):
+            if message_type is None:
+                result[kind] = stats
+            else:
+                result.setdefault(kind, {})[message_type] = stats
+        return result
+
+
+def load_topologies(networks_dir=NETWORKS_DIR, generated=True):
+    topologies = {}
+    for filename in sorted(os.listdir(networks_dir)):
+        if filename.endswith(".json"):
+            with open(os.path.join(networks_dir, filename)) as f:
+                topologies[filename[: -len(".json")]] = json.load(f)
+
+    if generated:
+        topologies.update(
+            {
+                "chain-3": chain(3),
+                "chain-6": chain(6),
+                "grid-3x3": grid(3, 3),
+                "tree-2x2": tree(2, 2),
+                "geometric-16": geometric(16),
+            }
+        )
+
+    return topologies
+
+
+def default_failed_link(simulation: Simulation):
+    """
+    Returns the first station linked to the root, or the first station of
+    the network if none is.
+    """
+    stations = sorted(simulation.links)
+    for station in stations:
+        if simulation.links[station].ap.device.device.name.startswith(
+            f"{ROOT_NODE_ID}."
+        ):
+            return station
+    return stations[0] if stations else None
+
+
+class ProvisioningTracker:
+    """
+    Follows the provisioning of every node after a failure, event by event:
+    when each node first lost it, and when every node was provisioned again
+    after the last loss.
+    """
+
+    def __init__(self, simulation: Simulation):
+        self.simulation = simulation
+        self.lost_at = {}
+        self.regained_at = None
+
+    def update(self):
+        """
+        Returns whether every node is provisioned.
+        """
+        now = self.simulation.engine.now
+        unprovisioned = [
+            node.id
+            for node in self.simulation.nodes.values()
+            if not node.is_provisioned()
+        ]
+        for node_id in unprovisioned:
+            self.lost_at.setdefault(node_id, now)
+
+        if unprovisioned:
+            self.regained_at = None
+        elif self.lost_at and self.regained_at is None:
+            self.regained_at = now
+        return not unprovisioned
+
+
+def phase_result(
+    simulation, counter, messages_before, cs_before, elapsed, converged=None
+):
+    return {
+        "converged": elapsed is not None if converged is None else converged,
+        "time_s": round(elapsed, 6) if elapsed is not None else None,
+        "critical_sections": simulation.critical_sections() - cs_before,
+        "messages": MessageCounter.json(
+            MessageCounter.diff(counter.snapshot(), messages_before)
+        ),
+    }
+
+
+def run(
+    name: str,
+    topology: dict,
+    seed=0,
+    timeout=DEFAULT_TIMEOUT,
+    outage=DEFAULT_OUTAGE,
+    failed_link=None,
+    link_profile=None,
+):
+    wall_start = time.perf_counter()
+
+    simulation = Simulation(topology, seed=seed, link_profile=link_profile)
+    counter = MessageCounter()
+    simulation.add_tap(counter)
+
+    simulation.start()
+    elapsed = simulation.run_until_converged(timeout)
+    result = {
+        "topology": name,
+        "seed": seed,
+        "nodes": len(simulation.nodes),
+        "link_profile": link_profile,
+        "convergence": phase_result(simulation, counter, {}, 0, elapsed),
+    }
+
+    failed_link = failed_link or default_failed_link(simulation)
+    if failed_link is not None and failed_link not in simulation.links:
+        raise ValueError(f"No station {failed_link!r} in topology {name!r}")
+
+    if elapsed is not None and failed_link is not None:
+        messages_before = counter.snapshot()
+        cs_before = simulation.critical_sections()
+        failed_at = simulation.engine.now
+        restored_at = failed_at + outage
+
+        # Nodes may lose provisioning during the outage or once the link is
+        # back, so the network is followed until both are over
+        tracker = ProvisioningTracker(simulation)
+        simulation.fail_link(failed_link, outage)
+        simulation.run(
+            restored_at + timeout,
+            lambda: simulation.failed()
+            or (tracker.update() and simulation.engine.now > restored_at),
+        )
+
+        # Without disrupted nodes there's nothing to reconverge
+        lost = regained = None
+        if tracker.lost_at:
+            lost = min(tracker.lost_at.values()) - failed_at
+            if tracker.regained_at is not None:
+                regained = tracker.regained_at - failed_at
+
+        result["reconvergence"] = {
+            "link": failed_link,
+            "outage_s": outage,
+            "disrupted_nodes": len(tracker.lost_at),
+            "unprovisioned_nodes": sum(
+                not node.is_provisioned() for node in simulation.nodes.values()
+            ),
+            "lost_after_s": round(lost, 6) if lost is not None else None,
+            **phase_result(
+                simulation,
+                counter,
+                messages_before,
+                cs_before,
+                regained,
+                converged=not simulation.failed() and simulation.converged(),
+            ),
+        }
+
+    result["wall_time_s"] = round(time.perf_counter() - wall_start, 4)
+    return result
+
+
+def flatten(data, prefix=""):
+    """
+    Flattens nested results into `{"a.b.c": number}`.
+    """
+    if isinstance(data, dict):
+        flat = {}
+        for key, value in data.items():
+            flat.update(flatten(value, f"{prefix}{key}."))
+        return flat
+
+    if isinstance(data, (int, float)) and not isinstance(data, bool):
+        return {prefix[:-1]: data}
+    return {}
+
+
+def compare(results: list, baseline: list, max_regression: float):
+    """
+    Compares every numeric metric against the baseline run of the same
+    topology and seed. Every metric but the host and descriptive ones is a
+    cost (time, messages, bytes or critical sections), so any increase above
+    `max_regression` percent is reported as a regression.
+    """
+    baseline_runs = {(run["topology"], run["seed"]): run for run in baseline}
+    comparison = []
+
+    for result in results:
+        previous = baseline_runs.get((result["topology"], result["seed"]))
+        if previous is None:
+            comparison.append(
+                {"topology": result["topology"], "seed": result["seed"], "new": True}
+            )
+            continue
+
+        current, before = flatten(result), flatten(previous)
+        changes = {}
+        regressions = []
+        for key in sorted(set(current) | set(before)):
+            if key in ("seed", "nodes"):
+                continue
+
+            old, new = before.get(key, 0), current.get(key, 0)
+            if old == new:
+                continue
+
+            change_pct = round((new - old) * 100 / old, 2) if old else None
+            changes[key] = {"baseline": old, "current": new, "change_pct": change_pct}
+
+            if (
+                key.split(".")[-1] not in HOST_METRICS + DESCRIPTIVE_METRICS
+                and new > old
+                and (change_pct is None or change_pct > max_regression)
+            ):
+                regressions.append(key)
+
+        # Losing convergence is always a regression
+        for phase in ("convergence", "reconvergence"):
+            if previous.get(phase, {}).get("converged") and not result.get(
+                phase, {}
+            ).get("converged"):
+                regressions.append(f"{phase}.converged")
+
+        comparison.append(
+            {
+                "topology": result["topology"],
+                "seed": result["seed"],
+                "changes": changes,
+                "regressions": regressions,
+            }
+        )
+
+    return comparison
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "topologies",
+        nargs="*",
+        help="Network files to run (default: config/networks and generated ones)",
+    )
+    parser.add_argument("-s", "--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("-t", "--timeout", type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument(
+        "--outage",
+        type=float,
+        default=DEFAULT_OUTAGE,
+        help="Seconds the failed link stays down",
+    )
+    parser.add_argument(
+        "--fail-link",
+        help="Station to disconnect, as {node}.{orientation} (default: one linked "
+        "to the root)",
+    )
+    parser.add_argument(
+        "--link-profile",
+        type=json.loads,
+        help="Link emulation profile for every WLAN link without one, as JSON "
+        '(e.g. \'{"rate_kbps": 2000, "delay_ms": 5, "loss": 0.01}\')',
+    )
+    parser.add_argument("-o", "--output", help="Write results to this file")
+    parser.add_argument("-b", "--baseline", help="Compare against a saved run")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=5.0,
+        help="Percentage above the baseline reported as a regression",
+    )
+    args = parser.parse_args()
+
+    if args.topologies:
+        topologies = {}
+        for path in args.topologies:
+            with open(path) as f:
+                topologies[os.path.splitext(os.path.basename(path))[0]] = json.load(f)
+    else:
+        topologies = load_topologies()
+
+    results = [
+        run(
+            name,
+            topology,
+            seed,
+            args.timeout,
+            args.outage,
+            args.fail_link,
+            args.link_profile,
+        )
+        for name, topology in topologies.items()
+        for seed in args.seeds
+    ]
+
+    output = {"results": results}
+    if args.baseline:
+        with open(args.baseline) as f:
+            output["comparison"] = compare(
+                results, json.load(f)["results"], args.max_regression
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
+
+    if any(entry.get("regressions") for entry in output.get("comparison", [])):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
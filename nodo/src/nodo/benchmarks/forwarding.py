@@ -0,0 +1,246 @@
+"""
+Forwarding throughput benchmark for a single device.
+
+Builds a `Device` with in-memory SPI and WLAN interfaces and a routing table
+preloaded with `--routes` routes, then pushes synthetic `PacketReceived`
+events through `Device._on_packet_received` for each scenario:
+
+ - wlan-to-spi: packet from a peer towards another device of the node
+ - spi-to-wlan: packet from the node towards the peer of the device
+ - legacy: core without a global routing table, the device routing table
+   (deprecated) is used instead
+ - ttl-expiry: packets dropped because their TTL expired
+ - link-emulation: like spi-to-wlan, with the WLAN interface behind a link
+   emulation layer that never delays packets, to measure its overhead
+
+Filler routes are more specific than the ones matching the packets, so every
+lookup goes through the whole table.
+
+Reports packets per second, per-packet latency percentiles and, as traced by
+`tracemalloc`, the peak memory in use while forwarding each packet (bytes,
+not a count of allocations) and the memory blocks and bytes retained by the
+device afterwards.
+
+Usage: python -m nodo.benchmarks.forwarding [--packets N] [--routes N]
+"""
+
+import gc
+import json
+import time
+import tracemalloc
+
+from argparse import ArgumentParser
+
+from pysim_sdk.nic.events import InterfaceEvent
+from pysim_sdk.utils.ip_address import str2ip
+
+from nodo.device import Device
+from nodo.routing.core.forwarder import ForwarderCore
+from nodo.routing.device_core import DeviceCore
+from nodo.sim.interfaces import SimInterface
+from nodo.sync.core.forwarder import ForwarderCore as SyncForwarderCore
+from nodo.utils.link_emulation import EmulatedInterface, EmulatedLink, LinkProfile
+from nodo.utils.packets import IP_PROTO_UDP, build_ipv4
+from nodo.utils.queues import Event
+
+ORIENTATION = "n"
+
+NODE_NETWORK = "10.32.0.0"
+NODE_MASK = "255.224.0.0"
+# Reached through the WLAN link of the device
+PEER_NETWORK = "10.64.0.0"
+# Reached through another device of the node
+SIBLING_NETWORK = "10.96.0.0"
+NETWORK_PREFIX = 11
+
+SCENARIOS = ("wlan-to-spi", "spi-to-wlan", "legacy", "ttl-expiry", "link-emulation")
+
+# Exercises the token bucket and the loss model without delaying packets
+OVERHEAD_LINK_PROFILE = {
+    "rate_kbps": 100_000_000,
+    "burst_bytes": 1 << 30,
+    "loss": {"p": 0.0, "r": 1.0},
+}
+
+PERCENTILES = (50, 90, 99)
+
+
+class SinkInterface(SimInterface):
+    def __init__(self, name: str, ip_addr: str, next_hop_ip_addr=None):
+        super().__init__(name, ip_addr)
+        self.next_hop_ip_addr = next_hop_ip_addr
+
+
+class NullObserver:
+    def event(self, name, **kwargs):
+        pass
+
+    def request_critical_section(self):
+        pass
+
+    def enter_critical_section(self):
+        pass
+
+    def exit_critical_section(self):
+        pass
+
+
+def filler_routes(count: int):
+    """
+    `/24` routes that don't match any benchmark packet.
+    """
+    first = str2ip("10.128.0.0")
+    for i in range(count):
+        yield first + (i << 8), 24
+
+
+def make_device(scenario: str, routes: int):
+    spi_if = SinkInterface("spi", "127.0.0.1", "127.0.0.2")
+    wlan_if = SinkInterface("wlan", "10.64.0.2")
+    if scenario == "link-emulation":
+        link = EmulatedLink(LinkProfile.from_config(OVERHEAD_LINK_PROFILE))
+        wlan_if = EmulatedInterface(wlan_if, link)
+
+    if scenario == "legacy":
+        core = DeviceCore("legacy")
+    else:
+        core = ForwarderCore(ORIENTATION)
+
+    device = Device(
+        ORIENTATION, None, spi_if, wlan_if, core, SyncForwarderCore(ORIENTATION)
+    )
+    device.observer = NullObserver()
+
+    if scenario == "legacy":
+        for network, prefix_len in filler_routes(routes):
+            device.routing_table.add_route(network, prefix_len, spi_if)
+        device.routing_table.add_route(str2ip(PEER_NETWORK), NETWORK_PREFIX, wlan_if)
+        return device
+
+    core.on_start()
+    network = core.network
+    network.node_network = str2ip(NODE_NETWORK)
+    network.node_network_mask = str2ip(NODE_MASK)
+
+    table = network.node_routing_table
+    for i, (route, prefix_len) in enumerate(filler_routes(routes)):
+        table.add_route(route, prefix_len, "nesw"[i % 4])
+    table.add_route(str2ip(PEER_NETWORK), NETWORK_PREFIX, ORIENTATION)
+    table.add_route(str2ip(SIBLING_NETWORK), NETWORK_PREFIX, "e")
+    return device
+
+
+def make_event(device: Device, scenario: str, size: int):
+    if scenario == "wlan-to-spi":
+        interface, src, dst, ttl = device.wlan_if, "10.64.1.5", "10.96.1.5", 64
+    elif scenario == "ttl-expiry":
+        interface, src, dst, ttl = device.wlan_if, "10.64.1.5", "10.96.1.5", 1
+    else:
+        interface, src, dst, ttl = device.spi_if, "10.32.1.5", "10.64.1.5", 64
+
+    packet = build_ipv4(src, dst, IP_PROTO_UDP, bytes(max(size - 20, 0)), ttl=ttl)
+    return Event(InterfaceEvent.PacketReceived, interface, packet)
+
+
+def percentile(samples: list, p: float):
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def run(scenario: str, size: int, packets: int, routes: int):
+    device = make_device(scenario, routes)
+    event = make_event(device, scenario, size)
+    handle = device._on_packet_received
+
+    for _ in range(min(packets, 1000)):
+        handle(event)
+
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(packets):
+        handle(event)
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    clock = time.perf_counter_ns
+    for _ in range(packets):
+        before = clock()
+        handle(event)
+        latencies.append(clock() - before)
+    latencies.sort()
+
+    # Memory is measured on a separate pass, as tracing slows packets down.
+    # The peak of each packet is the memory it needed while being forwarded,
+    # what's left once all of them are done was kept by the device.
+    samples = min(packets, 10000)
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    peaks = 0
+    for _ in range(samples):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        handle(event)
+        peaks += tracemalloc.get_traced_memory()[1] - before
+    retained = tracemalloc.take_snapshot().compare_to(baseline, "filename")
+    tracemalloc.stop()
+
+    return {
+        "scenario": scenario,
+        "size": size,
+        "routes": routes,
+        "packets": packets,
+        "pps": round(packets / elapsed),
+        "latency_us": {
+            f"p{p}": round(percentile(latencies, p) / 1000, 2) for p in PERCENTILES
+        },
+        "memory": {
+            "peak_traced_bytes_per_packet": round(peaks / samples),
+            "retained_blocks_per_packet": round(
+                sum(stat.count_diff for stat in retained) / samples, 2
+            ),
+            "retained_bytes_per_packet": round(
+                sum(stat.size_diff for stat in retained) / samples, 2
+            ),
+        },
+        "sent": {
+            "spi": device.spi_if.packets_out,
+            "wlan": device.wlan_if.packets_out,
+        },
+    }
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--packets", type=int, default=20000)
+    parser.add_argument("--routes", type=int, default=64, help="Routing table size")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[64, 512, 1400], help="Packet sizes"
+    )
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = [
+        run(scenario, size, args.packets, args.routes)
+        for scenario in args.scenarios
+        for size in args.sizes
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for result in results:
+        latency = result["latency_us"]
+        print(
+            f"{result['scenario']:>12} {result['size']:>5} B: "
+            f"{result['pps']:>8} pps, p50 {latency['p50']} us, "
+            f"p99 {latency['p99']} us, "
+            f"{result['memory']['peak_traced_bytes_per_packet']} B peak/packet, "
+            f"{result['memory']['retained_blocks_per_packet']} blocks "
+            f"({result['memory']['retained_bytes_per_packet']} B) retained/packet"
+        )
+
+
+if __name__ == "__main__":
+    main()
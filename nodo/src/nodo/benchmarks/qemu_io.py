@@ -0,0 +1,159 @@
+"""
+Latency of the emulated I/O operations of the QEMU devices.
+
+Runs the body of the `spi_tx` command handler of `nodo.qemu_main` (summary,
+send and response) against in-memory stand-ins for the SPI interface, the
+QEMU connection and the pysim client, whose events take `--event-cost-us`
+like an HTTP request to pysim would. Modes:
+
+ - eager-scapy: every packet dissected by scapy and reported inline, as the
+   handlers used to
+ - header: every packet summarized from its headers on a background thread
+ - sampled: one of every 100 packets, at most 10 per second
+ - disabled: no summaries
+
+Usage: python -m nodo.benchmarks.qemu_io [--packets N] [--event-cost-us US]
+"""
+
+import json
+import time
+
+from argparse import ArgumentParser
+
+from nodo.utils.packet_summaries import PacketSummaries, scapy_summary
+from nodo.utils.packets import build_udp
+
+MODES = ("eager-scapy", "header", "sampled", "disabled")
+
+PERCENTILES = (50, 90, 99)
+
+
+class SlowPysim:
+    def __init__(self, event_cost_us: float):
+        self.event_cost = event_cost_us / 1e6
+        self.events = 0
+
+    def event(self, name, **kwargs):
+        time.sleep(self.event_cost)
+        self.events += 1
+
+
+class NullConnection:
+    def write_response(self, code, payload=b""):
+        pass
+
+
+class NullInterface:
+    def send_packet(self, packet: bytes):
+        pass
+
+
+def make_handler(mode: str, pysim):
+    spi_if = NullInterface()
+
+    if mode == "eager-scapy":
+
+        def spi_tx(conn, _, payload):
+            pysim.event(
+                "spi_send", payload_size=len(payload), data=scapy_summary(payload)
+            )
+            spi_if.send_packet(payload)
+            conn.write_response(0)
+
+        return spi_tx, None
+
+    config = {
+        "header": {"sample_every": 1},
+        "sampled": {"sample_every": 100, "max_per_second": 10},
+        "disabled": {},
+    }[mode]
+    summaries = PacketSummaries.from_config(pysim, config)
+
+    def spi_tx(conn, _, payload):
+        summaries.packet("spi_send", payload, payload_size=len(payload))
+        spi_if.send_packet(payload)
+        conn.write_response(0)
+
+    return spi_tx, summaries
+
+
+def percentile(samples: list, p: float):
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def run(mode: str, packets: int, size: int, event_cost_us: float, interval_us: float):
+    pysim = SlowPysim(event_cost_us)
+    handler, summaries = make_handler(mode, pysim)
+    if summaries is not None:
+        summaries.start()
+
+    conn = NullConnection()
+    payload = build_udp("10.32.0.2", "10.64.0.5", 5000, 40000, bytes(size - 28))
+    clock = time.perf_counter_ns
+
+    latencies = []
+    for _ in range(packets):
+        started = clock()
+        handler(conn, 0x01, payload)
+        latencies.append(clock() - started)
+
+        if interval_us:
+            time.sleep(interval_us / 1e6)
+    latencies.sort()
+
+    result = {
+        "mode": mode,
+        "packets": packets,
+        "latency_us": {
+            f"p{p}": round(percentile(latencies, p) / 1000, 2) for p in PERCENTILES
+        },
+        "mean_us": round(sum(latencies) / len(latencies) / 1000, 2),
+    }
+
+    if summaries is not None:
+        summaries.stop()
+        result["summarized"] = summaries.summarized
+        result["summaries_dropped"] = summaries.dropped
+    else:
+        result["summarized"] = pysim.events
+        result["summaries_dropped"] = 0
+    return result
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--packets", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=512, help="Packet size")
+    parser.add_argument(
+        "--event-cost-us",
+        type=float,
+        default=500,
+        help="Time taken by each pysim event",
+    )
+    parser.add_argument(
+        "--interval-us", type=float, default=0, help="Time between packets"
+    )
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = [
+        run(mode, args.packets, args.size, args.event_cost_us, args.interval_us)
+        for mode in args.modes
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for result in results:
+        latency = result["latency_us"]
+        print(
+            f"{result['mode']:>12}: p50 {latency['p50']} us, p99 {latency['p99']} us, "
+            f"mean {result['mean_us']} us, {result['summarized']} summarized, "
+            f"{result['summaries_dropped']} dropped"
+        )
+
+
+if __name__ == "__main__":
+    main()
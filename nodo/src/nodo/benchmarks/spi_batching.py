@@ -0,0 +1,179 @@
+"""
+Packets-per-second benchmark for the SPI ring of a node, with and without
+SPI transfer coalescing.
+
+A source device pushes bursts of packets that are relayed by the other four
+devices of the ring, connected by multiprocessing queues (the same transport
+used by `SpiInterface`), until the TTL of the packets expires at the last one.
+Relays behave like `Device`: they handle every event already waiting in their
+queue and flush coalesced packets once idle or when the deadline expires.
+
+Usage: python -m nodo.benchmarks.spi_batching [--packets N] [--size BYTES]
+"""
+
+import json
+import multiprocessing as mp
+import queue
+import struct
+import time
+
+from argparse import ArgumentParser
+
+from nodo.utils.spi_batching import BatchingSpiInterface, is_batch, unpack_batch
+
+RING_SIZE = 5
+
+# Most events handled by a relay before it flushes, as with a busy device
+MAX_EVENTS_PER_BATCH = 256
+
+
+class QueueInterface:
+    def __init__(self, out_queue):
+        self.out_queue = out_queue
+
+    def send_packet(self, packet: bytes):
+        self.out_queue.put(packet)
+
+
+def make_packet(size: int, ttl: int) -> bytes:
+    header = struct.pack(
+        "!BBHHHBBH4s4s",
+        0x45,
+        0,
+        size,
+        0,
+        0,
+        ttl,
+        17,
+        0,
+        bytes([10, 0, 0, 1]),
+        bytes([10, 0, 0, 2]),
+    )
+    return header + bytes(max(size - len(header), 0))
+
+
+def make_interface(out_queue, batching: bool, deadline_us: int):
+    interface = QueueInterface(out_queue)
+    if batching:
+        interface = BatchingSpiInterface(interface, flush_deadline_us=deadline_us)
+    return interface
+
+
+def flush(interface, due_only=False):
+    if not isinstance(interface, BatchingSpiInterface):
+        return
+
+    if due_only:
+        interface.flush_if_due()
+    else:
+        interface.flush()
+
+
+def relay(in_queue, out_queue, results, batching, deadline_us):
+    interface = make_interface(out_queue, batching, deadline_us)
+    received = 0
+    last_received = None
+
+    while True:
+        events = [in_queue.get()]
+        try:
+            while len(events) < MAX_EVENTS_PER_BATCH:
+                events.append(in_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        for event in events:
+            if event is None:
+                flush(interface)
+                out_queue.put(None)
+                results.put((received, last_received))
+                return
+
+            for packet in unpack_batch(event) if is_batch(event) else (event,):
+                ttl = packet[8] - 1
+                if ttl <= 0:
+                    received += 1
+                    last_received = time.perf_counter()
+                else:
+                    interface.send_packet(packet[:8] + bytes([ttl]) + packet[9:])
+
+            flush(interface, due_only=True)
+
+        flush(interface)
+
+
+def run(batching: bool, packets: int, size: int, burst: int, deadline_us: int):
+    queues = [mp.Queue() for _ in range(RING_SIZE)]
+    results = mp.Queue()
+
+    relays = [
+        mp.Process(
+            target=relay,
+            args=(queues[i - 1], queues[i], results, batching, deadline_us),
+        )
+        for i in range(1, RING_SIZE)
+    ]
+    for process in relays:
+        process.start()
+
+    source = make_interface(queues[0], batching, deadline_us)
+    packet = make_packet(size, ttl=RING_SIZE - 1)
+
+    start = time.perf_counter()
+    for i in range(packets):
+        source.send_packet(packet)
+        if i % burst == burst - 1:
+            flush(source)
+    flush(source)
+    queues[0].put(None)
+
+    received, end = 0, start
+    for _ in relays:
+        relay_received, relay_end = results.get()
+        if relay_received:
+            received += relay_received
+            end = max(end, relay_end)
+
+    for process in relays:
+        process.join()
+
+    elapsed = end - start
+    return {
+        "batching": batching,
+        "packets": packets,
+        "received": received,
+        "elapsed_s": round(elapsed, 4),
+        "pps": round(received / elapsed) if elapsed > 0 else None,
+    }
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--packets", type=int, default=20000)
+    parser.add_argument("--size", type=int, default=256, help="Packet size (bytes)")
+    parser.add_argument(
+        "--burst", type=int, default=32, help="Packets sent per source event"
+    )
+    parser.add_argument("--deadline-us", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = [
+        run(batching, args.packets, args.size, args.burst, args.deadline_us)
+        for batching in (False, True)
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for result in results:
+        mode = "batched" if result["batching"] else "unbatched"
+        print(
+            f"{mode:>10}: {result['received']}/{result['packets']} packets "
+            f"in {result['elapsed_s']:.3f} s -> {result['pps']} pps"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+# Packet capture
+
+When enabled, every packet sent or received by the interfaces of a device is
+appended to a pcap file per interface, under
+`{directory}/{node}.{orientation}/{interface}.pcap` (the shared volume by
+default), so captures can be opened with Wireshark or tcpdump:
+
+    "capture": {
+      "enabled": true,
+      "filter": "udp and not port 9000",
+      "max_bytes": 16777216,
+      "max_seconds": 0,
+      "max_files": 4,
+      "snaplen": 65535
+    }
+
+Files are rotated once they hold `max_bytes` bytes or are `max_seconds` old
+(0 disables either limit): `spi-n.pcap` becomes `spi-n.1.pcap`, and so on,
+keeping at most `max_files` files per interface. `filter` is a subset of
+the BPF filter language (see `nodo.utils.packet_filter`).
+
+Records carry nanosecond wall-clock timestamps. SPI interfaces and the
+theoretical WLAN interfaces carry raw IPv4 packets, QEMU WLAN interfaces
+carry Ethernet frames.
+"""
+
+import os
+import struct
+import threading
+import time
+
+from nodo.utils.interfaces import InterfaceProxy
+from nodo.utils.packet_filter import compile_filter
+from nodo.utils.spi_batching import is_batch, unpack_batch
+
+DEFAULT_CAPTURE_DIR = "/tmp/pysim/capture"
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_FILES = 4
+DEFAULT_SNAPLEN = 65535
+
+# Buffered records are written out at least this often
+FLUSH_INTERVAL_NS = 1_000_000_000
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+
+# Nanosecond-resolution pcap
+PCAP_MAGIC = 0xA1B23C4D
+PCAP_HEADER = struct.Struct("<IHHiIII")
+RECORD_HEADER = struct.Struct("<IIII")
+
+
+class PcapWriter:
+    """
+    Appends packets to a pcap file, rotating it by size and age. Safe to use
+    from several threads.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        linktype=LINKTYPE_RAW,
+        max_bytes=DEFAULT_MAX_BYTES,
+        max_seconds=0,
+        max_files=DEFAULT_MAX_FILES,
+        snaplen=DEFAULT_SNAPLEN,
+    ):
+        self.path = path
+        self.linktype = linktype
+        self.max_bytes = max_bytes
+        self.max_age_ns = int(max_seconds * 1e9)
+        self.max_files = max(max_files, 1)
+        self.snaplen = snaplen
+
+        self.lock = threading.Lock()
+        self.file = None
+        self.file_bytes = 0
+        self.opened_ns = 0
+        self.flushed_ns = 0
+
+        self.packets = 0
+        self.bytes = 0
+        self.rotations = 0
+
+    def _open(self, now_ns: int):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, "wb")
+        header = PCAP_HEADER.pack(PCAP_MAGIC, 2, 4, 0, 0, self.snaplen, self.linktype)
+        self.file.write(header)
+        self.file_bytes = len(header)
+        self.opened_ns = now_ns
+        self.flushed_ns = now_ns
+
+    def _rotated_path(self, index: int):
+        base, ext = os.path.splitext(self.path)
+        return f"{base}.{index}{ext}"
+
+    def _rotate(self, now_ns: int):
+        self.file.close()
+        self.file = None
+
+        if self.max_files == 1:
+            os.remove(self.path)
+        else:
+            for index in range(self.max_files - 2, 0, -1):
+                if os.path.exists(self._rotated_path(index)):
+                    os.replace(self._rotated_path(index), self._rotated_path(index + 1))
+            os.replace(self.path, self._rotated_path(1))
+
+        self.rotations += 1
+        self._open(now_ns)
+
+    def write(self, packet: bytes, now_ns=None):
+        now_ns = now_ns or time.time_ns()
+        data = packet[: self.snaplen]
+        record = RECORD_HEADER.pack(
+            now_ns // 1_000_000_000, now_ns % 1_000_000_000, len(data), len(packet)
+        )
+
+        with self.lock:
+            if self.file is None:
+                self._open(now_ns)
+            elif (self.max_bytes and self.file_bytes >= self.max_bytes) or (
+                self.max_age_ns and now_ns - self.opened_ns >= self.max_age_ns
+            ):
+                self._rotate(now_ns)
+
+            self.file.write(record)
+            self.file.write(data)
+            self.file_bytes += len(record) + len(data)
+            self.packets += 1
+            self.bytes += len(packet)
+
+            if now_ns - self.flushed_ns >= FLUSH_INTERVAL_NS:
+                self.file.flush()
+                self.flushed_ns = now_ns
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def status(self):
+        return {
+            "path": self.path,
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "rotations": self.rotations,
+        }
+
+
+class InterfaceCapture:
+    """
+    Capture of a single interface, both directions go to the same file.
+    """
+
+    def __init__(self, writer: PcapWriter, packet_filter=None):
+        self.writer = writer
+        self.filter = packet_filter
+        self.filtered = 0
+
+    def capture(self, payload: bytes):
+        # SPI batches are captured as the packets they carry
+        packets = unpack_batch(payload) if is_batch(payload) else (payload,)
+        for packet in packets:
+            if self.filter is not None and not self.filter(packet):
+                self.filtered += 1
+            else:
+                self.writer.write(packet)
+
+    def status(self):
+        return {**self.writer.status(), "filtered": self.filtered}
+
+
+class PacketCapture:
+    def __init__(
+        self,
+        name: str,
+        directory=DEFAULT_CAPTURE_DIR,
+        packet_filter="",
+        max_bytes=DEFAULT_MAX_BYTES,
+        max_seconds=0,
+        max_files=DEFAULT_MAX_FILES,
+        snaplen=DEFAULT_SNAPLEN,
+    ):
+        self.name = name
+        self.directory = directory
+        self.packet_filter = packet_filter
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.max_files = max_files
+        self.snaplen = snaplen
+        self.interfaces = {}
+
+        # Fail early on invalid filters
+        compile_filter(packet_filter)
+
+    @staticmethod
+    def from_config(name: str, config: dict):
+        return PacketCapture(
+            name,
+            directory=config.get("directory", DEFAULT_CAPTURE_DIR),
+            packet_filter=config.get("filter", ""),
+            max_bytes=config.get("max_bytes", DEFAULT_MAX_BYTES),
+            max_seconds=config.get("max_seconds", 0),
+            max_files=config.get("max_files", DEFAULT_MAX_FILES),
+            snaplen=config.get("snaplen", DEFAULT_SNAPLEN),
+        )
+
+    def for_interface(self, interface_name: str, linktype=LINKTYPE_RAW):
+        if interface_name not in self.interfaces:
+            writer = PcapWriter(
+                os.path.join(self.directory, self.name, f"{interface_name}.pcap"),
+                linktype,
+                self.max_bytes,
+                self.max_seconds,
+                self.max_files,
+                self.snaplen,
+            )
+            self.interfaces[interface_name] = InterfaceCapture(
+                writer,
+                compile_filter(self.packet_filter, linktype == LINKTYPE_ETHERNET),
+            )
+        return self.interfaces[interface_name]
+
+    def wrap_interface(self, interface, linktype=LINKTYPE_RAW):
+        """
+        Captures the packets sent through `interface`.
+        """
+        return CaptureInterface(interface, self.for_interface(str(interface), linktype))
+
+    def wrap_sink(self, sink, linktype=LINKTYPE_RAW):
+        """
+        Captures the packets received by the interfaces feeding `sink`, which
+        must all carry `linktype` packets. Their files are opened with the
+        first packet, sent or received.
+        """
+        return CaptureSink(sink, self, linktype)
+
+    def close(self):
+        for capture in self.interfaces.values():
+            capture.writer.close()
+
+
+class CaptureInterface(InterfaceProxy):
+    def __init__(self, interface, capture: InterfaceCapture):
+        super().__init__(interface)
+        self.capture = capture
+
+    def send_packet(self, packet: bytes):
+        self.capture.capture(packet)
+        return self.interface.send_packet(packet)
+
+    def status(self):
+        return {**self.interface.status(), "capture": self.capture.status()}
+
+
+class CaptureSink:
+    def __init__(self, sink, capture: PacketCapture, linktype=LINKTYPE_RAW):
+        self.sink = sink
+        self.capture = capture
+        self.linktype = linktype
+
+    def put(self, event):
+        if event is not None and event[1] == "packet-received":
+            interface, _, payload = event
+            self.capture.for_interface(str(interface), self.linktype).capture(payload)
+        return self.sink.put(event)
+
+    def __getattr__(self, name):
+        if name.startswith("__") or "sink" not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.sink, name)
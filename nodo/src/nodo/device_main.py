@@ -1,5 +1,7 @@
+import signal
+import threading
+
 from pysim_sdk.nic.internet_tunnel import InternetTunnel
-from pysim_sdk.nic.nic_queue import NicQueue
 from pysim_sdk.nic.spi import SpiInterface
 from pysim_sdk.nic.tun_tunnel import WlanTunnel
 from pysim_sdk.nic.wireless.ap import WirelessAp
@@ -7,9 +9,20 @@ from pysim_sdk.nic.wireless.station import WirelessStation
 from pysim_sdk.utils import log
 
 from nodo.device import Device
+from nodo.capture import PacketCapture
+from nodo.flight_recorder import FlightRecorder
 from nodo.pysim_client import PysimClient
 from nodo.routing.core.home import HomeCore
 from nodo.routing.core.root import RootCore
+from nodo.tracing import Tracer
+from nodo.traffic import ROOT_ENDPOINT_ADDRESS, TrafficEndpoint
+from nodo.utils.link_emulation import EmulatedLink, LinkProfile
+from nodo.utils.spi_batching import BatchingSpiInterface
+from nodo.utils.queues import (
+    DEFAULT_CONTROL_BURST,
+    DEFAULT_EVENTS_CAPACITY,
+    EventQueue,
+)
 from nodo.sync.core.forwarder import ForwarderCore as SyncForwarderCore
 from nodo.sync.core.center import CenterCore as SyncCenterCore
 
@@ -40,7 +53,13 @@ def forwarder_main(
 
 def home_main(spi_in, spi_out):
     return device_main(
-        spi_in, spi_out, "c", HomeCore(), SyncCenterCore(), wlan_ctor=WlanTunnel
+        spi_in,
+        spi_out,
+        "c",
+        HomeCore(),
+        SyncCenterCore(),
+        wlan_ctor=WlanTunnel,
+        traffic=True,
     )
 
 
@@ -53,6 +72,8 @@ def root_main(spi_in, spi_out):
         SyncCenterCore(),
         node_id="root",
         wlan_ctor=lambda sink: InternetTunnel(sink, "eth0"),
+        traffic=True,
+        traffic_address=ROOT_ENDPOINT_ADDRESS,
     )
 
 
@@ -66,6 +87,8 @@ def device_main(
     wlan_ctor=None,
     wlan_barriers=None,
     wlan_unlocks=None,
+    traffic=False,
+    traffic_address=None,
 ):
     with PysimClient(orientation, node_id=node_id) as pysim:
         log.configure(pysim)
@@ -74,33 +97,66 @@ def device_main(
         name = config["name"]
         links = config["links"]
 
-        events_queue = NicQueue()
+        queues_config = config.get("queues", {})
+        events_queue = EventQueue(
+            queues_config.get("events", DEFAULT_EVENTS_CAPACITY),
+            queues_config.get("control_burst", DEFAULT_CONTROL_BURST),
+        )
+        # Interfaces put their events in `sink`, which captures the packets
+        # they receive if enabled
+        capture = None
+        sink = events_queue
+        if (capture_config := config.get("capture", {})).get("enabled"):
+            capture = PacketCapture.from_config(f"{name}.{orientation}", capture_config)
+            sink = capture.wrap_sink(events_queue)
+
         spi_if = SpiInterface(
             f"spi-{orientation}",
-            events_queue,
+            sink,
             spi_in,
             spi_out,
             ip_addr=f"127.0.0.{SPI_HOST_MAP[orientation]}",
             next_hop_ip_addr=f"127.0.0.{(SPI_HOST_MAP[orientation] % 5) + 1}",
         )
+        if capture is not None:
+            spi_if = capture.wrap_interface(spi_if)
+        if (batching_config := config.get("spi_batching", {})).get("enabled"):
+            spi_if = BatchingSpiInterface.from_config(spi_if, batching_config)
 
         if wlan_ctor:
-            wlan_if = wlan_ctor(events_queue)
+            wlan_if = wlan_ctor(sink)
+            if traffic and (traffic_config := config.get("traffic", {})).get("enabled"):
+                wlan_if = TrafficEndpoint.from_config(
+                    wlan_if, name, events_queue, traffic_config, traffic_address
+                )
         else:
             if dst_ap_name := links.get(orientation):
-                wlan_if = WirelessStation(
-                    f"wlan-{orientation}",
-                    events_queue,
-                    dst_ap_name,
-                    wlan_barriers[orientation],
-                    wlan_unlocks[orientation],
-                    connect_delay=config["connect_delay"],
-                )
+
+                def station_ctor(sink):
+                    return WirelessStation(
+                        f"wlan-{orientation}",
+                        sink,
+                        dst_ap_name,
+                        wlan_barriers[orientation],
+                        wlan_unlocks[orientation],
+                        connect_delay=config["connect_delay"],
+                    )
+
+                # The station emulates both directions of its link
+                if profile := config.get("link_emulation", {}).get(orientation):
+                    link = EmulatedLink(LinkProfile.from_config(profile))
+                    wlan_if = link.wrap(station_ctor, sink)
+                else:
+                    wlan_if = station_ctor(sink)
             else:
                 wlan_if = WirelessAp(
-                    f"wlan-{orientation}", events_queue, f"{name}.{orientation}"
+                    f"wlan-{orientation}", sink, f"{name}.{orientation}"
                 )
 
+        traffic_endpoint = wlan_if if isinstance(wlan_if, TrafficEndpoint) else None
+        if capture is not None:
+            wlan_if = capture.wrap_interface(wlan_if)
+
         device = Device(
             orientation,
             events_queue,
@@ -108,13 +164,40 @@ def device_main(
             wlan_if,
             routing_core,
             sync_core,
+            spi_queue=spi_out,
+            recorder=FlightRecorder.from_config(
+                f"{name}.{orientation}", config.get("flight_recorder", {})
+            ),
+            tracer=Tracer.from_config(
+                f"{name}.{orientation}", config.get("tracing", {})
+            ),
         )
 
         pysim.watch(device)
 
+        if traffic_endpoint is not None:
+            traffic_endpoint.start(pysim)
+
+        # `kill -USR1` dumps the flight recorder without stopping the device.
+        # The handler may interrupt the main thread while it records an event,
+        # so the dump is written from another thread
+        signal.signal(
+            signal.SIGUSR1,
+            lambda *_: threading.Thread(
+                target=device.dump_flight_recorder, args=("SIGUSR1",), daemon=True
+            ).start(),
+        )
+
         try:
             device.main()
         except KeyboardInterrupt:
             log.info("Graceful quit requested")
+            device.dump_flight_recorder("SIGINT")
+        except Exception as e:
+            device.dump_flight_recorder("unhandled exception", e)
+            raise
+        finally:
+            if capture is not None:
+                capture.close()
 
         log.info(f"Device {name} finished")
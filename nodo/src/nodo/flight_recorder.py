@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+import traceback
+
+FLIGHT_RECORDER_DIR = "/tmp/pysim/flight-recorder"
+
+DEFAULT_CAPACITY = 4096
+
+# Longest representation of the arguments of an event written to a dump
+MAX_ARGS_REPR = 512
+# Longest string argument kept in an entry
+MAX_ARG_LENGTH = 64
+
+
+def summarize_args(args: dict):
+    """
+    Arguments of an event as kept in the buffer: numbers and short strings as
+    they are, and only the type and size of anything else, so entries don't
+    keep whole messages alive.
+    """
+    summary = {}
+    for key, value in args.items():
+        if isinstance(value, str):
+            if len(value) > MAX_ARG_LENGTH:
+                value = value[:MAX_ARG_LENGTH] + "..."
+        elif isinstance(value, (bytes, bytearray)):
+            value = f"<{len(value)} bytes>"
+        elif isinstance(value, (list, tuple, dict, set)):
+            value = f"<{type(value).__name__} of {len(value)}>"
+        elif value is not None and not isinstance(value, (bool, int, float)):
+            value = f"<{type(value).__name__}>"
+        summary[key] = value
+    return summary
+
+
+class FlightRecorder:
+    """
+    Fixed-size ring buffer with the most recent events of a device.
+
+    Each entry is a compact `(timestamp_ns, event_id, args)` tuple, where
+    `event_id` indexes the table of event names seen so far and `args` is a
+    summary of the arguments (see `summarize_args`). The buffer is
+    preallocated and old entries are overwritten once it's full, so recording
+    is cheap enough to be done for every event. Devices record from several
+    threads, so the buffer is only touched under a lock.
+
+    The recorder also decides which events are forwarded to pysim: one every
+    `sample_every` occurrences of each event name (the first one is always
+    forwarded). Names listed in `always_forward` bypass sampling.
+    """
+
+    def __init__(
+        self,
+        name,
+        capacity=DEFAULT_CAPACITY,
+        sample_every=1,
+        always_forward=(),
+        dump_dir=FLIGHT_RECORDER_DIR,
+    ):
+        if capacity <= 0:
+            raise ValueError(f"Invalid flight recorder capacity: {capacity}")
+        if sample_every <= 0:
+            raise ValueError(f"Invalid flight recorder sampling: {sample_every}")
+
+        self.name = name
+        self.capacity = capacity
+        self.sample_every = sample_every
+        self.always_forward = frozenset(always_forward)
+        self.dump_dir = dump_dir
+
+        self._lock = threading.Lock()
+        self._entries = [None] * capacity
+        self._next = 0
+        self._recorded = 0
+        self._forwarded = 0
+        self._dumps = 0
+
+        self._event_ids = {}
+        self._event_names = []
+        self._event_counts = []
+
+    @staticmethod
+    def from_config(name, config: dict):
+        return FlightRecorder(
+            name,
+            capacity=config.get("capacity", DEFAULT_CAPACITY),
+            sample_every=config.get("sample_every", 1),
+            always_forward=config.get("always_forward", ()),
+        )
+
+    def record(self, event_name, args=None) -> bool:
+        """
+        Records an event and returns whether it should be forwarded to pysim.
+        """
+        timestamp = time.time_ns()
+        summary = summarize_args(args) if args else None
+
+        with self._lock:
+            event_id = self._event_ids.get(event_name)
+            if event_id is None:
+                event_id = len(self._event_names)
+                self._event_ids[event_name] = event_id
+                self._event_names.append(event_name)
+                self._event_counts.append(0)
+
+            self._entries[self._next] = (timestamp, event_id, summary)
+            self._next = (self._next + 1) % self.capacity
+            self._recorded += 1
+
+            count = self._event_counts[event_id]
+            self._event_counts[event_id] = count + 1
+
+            if count % self.sample_every == 0 or event_name in self.always_forward:
+                self._forwarded += 1
+                return True
+
+            return False
+
+    def entries(self):
+        """
+        Returns the recorded entries, from oldest to newest, with event names
+        instead of event ids.
+        """
+        with self._lock:
+            if self._recorded < self.capacity:
+                ordered = self._entries[: self._next]
+            else:
+                ordered = self._entries[self._next :] + self._entries[: self._next]
+            event_names = list(self._event_names)
+
+        return [
+            (timestamp, event_names[event_id], args)
+            for timestamp, event_id, args in ordered
+        ]
+
+    def dump(self, reason: str, exc: BaseException = None) -> str:
+        """
+        Writes the contents of the buffer to a new file in `dump_dir` and
+        returns its path.
+        """
+        # Copied first, the buffer keeps recording while the dump is written
+        entries = self.entries()
+        with self._lock:
+            dumps = self._dumps
+            self._dumps += 1
+            recorded, forwarded = self._recorded, self._forwarded
+
+        os.makedirs(self.dump_dir, exist_ok=True)
+        path = os.path.join(self.dump_dir, f"{self.name}-{time.time_ns()}-{dumps}.log")
+
+        with open(path, "w") as f:
+            f.write(f"# flight recorder: {self.name}\n")
+            f.write(f"# reason: {reason}\n")
+            f.write(
+                f"# recorded={recorded} forwarded={forwarded} "
+                f"capacity={self.capacity}\n"
+            )
+            if exc is not None:
+                for line in traceback.format_exception(exc):
+                    for subline in line.rstrip("\n").split("\n"):
+                        f.write(f"# {subline}\n")
+
+            for timestamp, event_name, args in entries:
+                args_repr = repr(args) if args else ""
+                if len(args_repr) > MAX_ARGS_REPR:
+                    args_repr = args_repr[:MAX_ARGS_REPR] + "..."
+                f.write(f"{timestamp} {event_name} {args_repr}".rstrip() + "\n")
+
+        return path
+
+    def status(self):
+        return {
+            "capacity": self.capacity,
+            "recorded": self._recorded,
+            "forwarded": self._forwarded,
+            "sample_every": self.sample_every,
+            "dumps": self._dumps,
+        }
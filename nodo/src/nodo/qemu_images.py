@@ -0,0 +1,379 @@
+"""
+# Flash images of the QEMU devices
+
+Every QEMU device used to boot straight from `/build/qemu_flash.bin` and
+`/build/qemu_efuse.bin`, so the five devices of a node (and every node of
+the host) shared and wrote the same files. Instead, the images are prepared
+once per firmware in the shared volume and each device boots from its own
+qcow2 overlay of them, created with `qemu-img`:
+
+    {directory}/{firmware hash}/base-flash.bin   read-only copy of the build
+    {directory}/{firmware hash}/base-efuse.bin
+    {directory}/{firmware hash}/warm-{role}.bin  flash once the firmware booted
+    {directory}/{firmware hash}/devices/{node}.{orientation}/flash.qcow2
+    {directory}/{firmware hash}/devices/{node}.{orientation}/efuse.bin
+    {directory}/{firmware hash}/devices/{node}.{orientation}/qemu
+
+The overlay only stores the blocks the device writes, on any filesystem, and
+reads the rest from the base image. `QemuHandler` opens the flash as a raw
+drive, so QEMU is started through the `qemu` launcher of the device, which
+opens the flash drive as qcow2. The efuse image is a few bytes and is copied.
+Without `qemu-img` every device gets a full copy of the flash.
+
+The first device of each role (`config_bits`) that finishes booting saves
+a raw copy of its flash as the warm image of the role, and later devices of
+the same firmware and role boot from an overlay of it, skipping the
+first-boot initialization of the firmware (NVS formatting, calibration data,
+...). This is only a copy of the flash file, not a snapshot of the VM: the
+devices still boot the firmware from the start. The firmware has finished
+its initialization when it starts the WiFi, and it's blocked waiting for
+that command while the flash is copied; as other tasks may still write the
+flash, the copy is only kept if the flash didn't change meanwhile.
+
+A new build has a new hash, so stale images are never used. Each device
+holds a lock on its directory while it runs, and the directories of devices
+no longer running, and of firmwares no device runs, are deleted.
+
+Options (`qemu_images` in `config/config.json`):
+
+    "qemu_images": {"enabled": false, "warm_start": true, "directory": "...",
+                    "qemu_img": "qemu-img"}
+"""
+
+import fcntl
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from pysim_sdk.utils import log
+
+DEFAULT_IMAGES_DIR = "/tmp/pysim/qemu-images"
+DEFAULT_QEMU_IMG = "qemu-img"
+
+# `ioctl` request cloning a whole file (`FICLONE` in `linux/fs.h`)
+FICLONE = 0x40049409
+
+QCOW2 = "qcow2"
+REFLINK = "reflink"
+COPY = "copy"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+LAUNCHER = """#!{python}
+import sys
+
+from nodo.qemu_images import exec_qemu
+
+exec_qemu({qemu_path!r}, {flash!r}, sys.argv[1:])
+"""
+
+
+def firmware_hash(*paths) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def clone_file(src: str, dst: str) -> str:
+    """
+    Copies `src` into `dst` as a reflink if possible. The copy is written to
+    a temporary file and renamed, so `dst` never holds a partial image.
+    Returns how the file was copied.
+    """
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    try:
+        with open(src, "rb") as fsrc, open(tmp, "wb") as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                method = REFLINK
+            except OSError:
+                shutil.copyfileobj(fsrc, fdst, HASH_CHUNK_SIZE)
+                method = COPY
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return method
+
+
+def create_overlay(qemu_img: str, base: str, overlay: str):
+    """
+    Creates a qcow2 overlay of the raw image `base` in `overlay`, replacing
+    it if it exists.
+    """
+    tmp = f"{overlay}.{os.getpid()}.tmp"
+    try:
+        subprocess.run(
+            [qemu_img, "create", "-q", "-f", QCOW2, "-b", base, "-F", "raw", tmp],
+            check=True,
+        )
+        os.replace(tmp, overlay)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def drive_args(args: list, flash: str, fmt: str) -> list:
+    """
+    Returns the QEMU arguments with the format of the drive of `flash` set
+    to `fmt`.
+    """
+    args = list(args)
+    for i in range(1, len(args)):
+        if args[i - 1] != "-drive":
+            continue
+        options = args[i].split(",")
+        if f"file={flash}" in options:
+            options = [option for option in options if not option.startswith("format=")]
+            args[i] = ",".join(options + [f"format={fmt}"])
+    return args
+
+
+def exec_qemu(qemu_path: str, flash: str, args: list):
+    """
+    Replaces the launcher of a device with QEMU, opening its flash overlay.
+    """
+    os.execv(qemu_path, [qemu_path] + drive_args(args, flash, QCOW2))
+
+
+def try_lock(path: str):
+    """
+    Returns the lock file `path` locked, or None if it's already locked.
+    """
+    lock = open(path, "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return None
+    return lock
+
+
+def qemu_rss(parent_pid=None):
+    """
+    Returns the resident memory (bytes) of the QEMU processes started by
+    `parent_pid` (this process by default).
+    """
+    parent_pid = parent_pid or os.getpid()
+    rss = 0
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # `comm` may contain spaces, fields after it are fixed
+                comm, _, fields = f.read().rpartition(")")
+            if int(fields.split()[1]) != parent_pid or "qemu" not in comm:
+                continue
+            with open(f"/proc/{entry}/statm") as f:
+                rss += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            continue
+    return rss
+
+
+class FlashImages:
+    def __init__(
+        self,
+        device_name: str,
+        role: int,
+        flash_file: str,
+        efuse_file: str,
+        directory=DEFAULT_IMAGES_DIR,
+        warm_start=True,
+        qemu_img=DEFAULT_QEMU_IMG,
+    ):
+        self.device_name = device_name
+        self.role = role
+        self.flash_file = flash_file
+        self.efuse_file = efuse_file
+        self.directory = directory
+        self.warm_start = warm_start
+        self.qemu_img = qemu_img
+
+        self.firmware_dir = None
+        self.device_dir = None
+        self.device_lock = None
+        self.device_flash = None
+        self.device_efuse = None
+        self.warm = False
+        self.clone_method = None
+        self.started = None
+        self.boot_time = None
+
+    @staticmethod
+    def from_config(
+        device_name: str, role: int, flash_file: str, efuse_file: str, config: dict
+    ):
+        return FlashImages(
+            device_name,
+            role,
+            flash_file,
+            efuse_file,
+            directory=config.get("directory", DEFAULT_IMAGES_DIR),
+            warm_start=config.get("warm_start", True),
+            qemu_img=config.get("qemu_img", DEFAULT_QEMU_IMG),
+        )
+
+    @property
+    def warm_image(self):
+        return os.path.join(self.firmware_dir, f"warm-{self.role}.bin")
+
+    def _lock(self):
+        lock = open(os.path.join(self.directory, ".lock"), "w")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def _prune(self):
+        """
+        Deletes the directories of the devices that aren't running, and of
+        the firmwares no device runs. Must be called with the lock held.
+        """
+        for entry in os.listdir(self.directory):
+            firmware_dir = os.path.join(self.directory, entry)
+            if not os.path.isdir(firmware_dir):
+                continue
+
+            devices_dir = os.path.join(firmware_dir, "devices")
+            running = firmware_dir == self.firmware_dir
+            for device in os.listdir(devices_dir) if os.path.isdir(devices_dir) else []:
+                device_dir = os.path.join(devices_dir, device)
+                if device_dir == self.device_dir:
+                    continue
+                if (lock := try_lock(os.path.join(device_dir, ".lock"))) is None:
+                    running = True
+                    continue
+                with lock:
+                    shutil.rmtree(device_dir)
+
+            if not running:
+                shutil.rmtree(firmware_dir)
+
+    def _prepare_base(self):
+        """
+        Copies the build into the images directory, once per firmware. Must
+        be called with the lock held.
+        """
+        base_flash = os.path.join(self.firmware_dir, "base-flash.bin")
+        base_efuse = os.path.join(self.firmware_dir, "base-efuse.bin")
+        for src, dst in ((self.flash_file, base_flash), (self.efuse_file, base_efuse)):
+            if not os.path.exists(dst):
+                clone_file(src, dst)
+                os.chmod(dst, 0o444)
+        return base_flash, base_efuse
+
+    def prepare(self):
+        """
+        Returns the flash and efuse images the device must boot from. The
+        device keeps its directory locked until the process exits.
+        """
+        self.started = time.monotonic()
+        self.firmware_dir = os.path.join(
+            self.directory, firmware_hash(self.flash_file, self.efuse_file)
+        )
+        self.device_dir = os.path.join(self.firmware_dir, "devices", self.device_name)
+
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock():
+            os.makedirs(self.device_dir, exist_ok=True)
+            self.device_lock = open(os.path.join(self.device_dir, ".lock"), "a")
+            fcntl.flock(self.device_lock, fcntl.LOCK_EX)
+            self._prune()
+
+            base_flash, base_efuse = self._prepare_base()
+            self.warm = self.warm_start and os.path.exists(self.warm_image)
+            flash = self.warm_image if self.warm else base_flash
+
+        if shutil.which(self.qemu_img):
+            self.device_flash = os.path.join(self.device_dir, "flash.qcow2")
+            create_overlay(self.qemu_img, flash, self.device_flash)
+            self.clone_method = QCOW2
+        else:
+            log.warn(f"{self.qemu_img} not found, the flash image is copied")
+            self.device_flash = os.path.join(self.device_dir, "flash.bin")
+            self.clone_method = clone_file(flash, self.device_flash)
+            os.chmod(self.device_flash, 0o644)
+
+        self.device_efuse = os.path.join(self.device_dir, "efuse.bin")
+        clone_file(base_efuse, self.device_efuse)
+        os.chmod(self.device_efuse, 0o644)
+
+        return self.device_flash, self.device_efuse
+
+    def qemu_launcher(self, qemu_path: str) -> str:
+        """
+        Returns the program to start instead of `qemu_path`: the launcher
+        opening the flash overlay, or QEMU itself when the flash is a copy.
+        """
+        if self.clone_method != QCOW2:
+            return qemu_path
+
+        launcher = os.path.join(self.device_dir, "qemu")
+        with open(launcher, "w") as f:
+            f.write(
+                LAUNCHER.format(
+                    python=sys.executable, qemu_path=qemu_path, flash=self.device_flash
+                )
+            )
+        os.chmod(launcher, 0o755)
+        return launcher
+
+    def _save_warm_image(self):
+        snapshot = f"{self.warm_image}.{os.getpid()}.snapshot"
+        try:
+            if self.clone_method == QCOW2:
+                # QEMU holds a write lock on the overlay, `-U` reads it anyway
+                subprocess.run(
+                    [self.qemu_img, "convert", "-U", "-f", QCOW2, "-O", "raw"]
+                    + [self.device_flash, snapshot],
+                    check=True,
+                )
+                unchanged = (
+                    subprocess.run(
+                        [self.qemu_img, "compare", "-q", "-U", "-f", "raw", "-F"]
+                        + [QCOW2, snapshot, self.device_flash]
+                    ).returncode
+                    == 0
+                )
+            else:
+                clone_file(self.device_flash, snapshot)
+                unchanged = firmware_hash(snapshot) == firmware_hash(self.device_flash)
+
+            if unchanged:
+                os.chmod(snapshot, 0o444)
+                os.replace(snapshot, self.warm_image)
+            return unchanged
+        finally:
+            if os.path.exists(snapshot):
+                os.remove(snapshot)
+
+    def on_booted(self):
+        """
+        Records the boot time and, after a cold boot, saves a copy of the
+        flash as the warm image of the role if there is none yet. Must be
+        called while the firmware waits for the response to a command issued
+        once its initialization is done (`wifi_start`).
+        """
+        if self.boot_time is not None:
+            return
+
+        self.boot_time = time.monotonic() - self.started
+        if self.warm_start and not self.warm and not os.path.exists(self.warm_image):
+            with self._lock():
+                if not os.path.exists(self.warm_image) and not self._save_warm_image():
+                    log.warn("Flash changed while saving the warm image, skipped")
+
+    def status(self):
+        return {
+            "firmware": os.path.basename(self.firmware_dir or ""),
+            "warm_start": self.warm,
+            "clone": self.clone_method,
+            "boot_time_s": self.boot_time and round(self.boot_time, 3),
+            "qemu_rss_bytes": qemu_rss(),
+        }
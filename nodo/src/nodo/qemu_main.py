@@ -1,7 +1,5 @@
 import struct
-
-from scapy.layers.inet import IP
-from scapy.layers.l2 import Ether
+import time
 
 from pysim_sdk.qemu.handler import QemuHandler
 from pysim_sdk.nic.internet_tunnel import InternetTunnel
@@ -12,13 +10,22 @@ from pysim_sdk.nic.tap_tunnel import WlanL2Tunnel
 from pysim_sdk.utils import log
 from pysim_sdk.utils.ip_address import str2ip
 
+from nodo.capture import LINKTYPE_ETHERNET, PacketCapture
 from nodo.pysim_client import PysimClient
+from nodo.qemu_images import FlashImages
+from nodo.utils.event_batching import EventPublisher
+from nodo.utils.packet_summaries import PacketSummaries, header_summary
 
 WIFI_MODE_STA = 1
 WIFI_MODE_AP = 2
 WIFI_MODE_APSTA = 3
 
 
+QEMU_PATH = "/usr/bin/qemu-system-xtensa"
+FLASH_FILE = "/build/qemu_flash.bin"
+EFUSE_FILE = "/build/qemu_efuse.bin"
+
+
 SPI_HOST_MAP = {
     "n": 1,
     "e": 2,
@@ -98,22 +105,51 @@ def qemu_main(
     with PysimClient(orientation, node_id=node_id) as pysim:
         log.configure(pysim)
 
-        qemu = QemuHandler(
-            pysim=pysim,
-            qemu_path="/usr/bin/qemu-system-xtensa",
-            flash_file="/build/qemu_flash.bin",
-            efuse_file="/build/qemu_efuse.bin",
-        )
-
         config = pysim.get_config()
         name = config["name"]
         links = config["links"]
 
-        qemu_queue = QemuQueueWrapper(qemu, pysim)
+        qemu_path, flash_file, efuse_file = QEMU_PATH, FLASH_FILE, EFUSE_FILE
+        images = None
+        # Off by default: without `qemu-img` every device copies the flash
+        if (images_config := config.get("qemu_images", {})).get("enabled", False):
+            images = FlashImages.from_config(
+                f"{name}.{orientation}",
+                config_bits,
+                flash_file,
+                efuse_file,
+                images_config,
+            )
+            flash_file, efuse_file = images.prepare()
+            qemu_path = images.qemu_launcher(qemu_path)
+
+        qemu = QemuHandler(
+            pysim=pysim,
+            qemu_path=qemu_path,
+            flash_file=flash_file,
+            efuse_file=efuse_file,
+        )
+
+        capture_config = config.get("capture", {})
+        summaries = PacketSummaries.from_config(
+            pysim, config.get("packet_summaries", {})
+        )
+        io_latency = summaries.io_latency
+        publisher = EventPublisher.from_config(qemu, config.get("event_batching", {}))
+        qemu_queue = QemuQueueWrapper(publisher, summaries)
+
+        # Unlike the theoretical simulation, captures are on by default as
+        # they replace the per-packet events
+        capture = None
+        spi_sink = wlan_sink = qemu_queue
+        if capture_config.get("enabled", True):
+            capture = PacketCapture.from_config(f"{name}.{orientation}", capture_config)
+            spi_sink = capture.wrap_sink(qemu_queue)
+            wlan_sink = capture.wrap_sink(qemu_queue, LINKTYPE_ETHERNET)
 
         spi_if = SpiInterface(
             f"spi-{orientation}",
-            qemu_queue,
+            spi_sink,
             spi_in,
             spi_out,
             ip_addr=f"127.0.0.{SPI_HOST_MAP[orientation]}",
@@ -122,12 +158,12 @@ def qemu_main(
 
         wlan_mode = None
         if wlan_ctor:
-            wlan_if = wlan_ctor(qemu_queue)
+            wlan_if = wlan_ctor(wlan_sink)
         else:
             if dst_ap_name := links.get(orientation):
                 wlan_if = WirelessStation(
                     f"wlan-{orientation}",
-                    qemu_queue,
+                    wlan_sink,
                     dst_ap_name,
                     wlan_barriers[orientation],
                     wlan_unlocks[orientation],
@@ -139,7 +175,7 @@ def qemu_main(
             else:
                 wlan_if = WirelessAp(
                     f"wlan-{orientation}",
-                    qemu_queue,
+                    wlan_sink,
                     f"{name}.{orientation}",
                     enabled=False,
                 )
@@ -149,17 +185,30 @@ def qemu_main(
         qemu_queue.set_spi_if(spi_if)
         qemu_queue.set_wifi_mode(None)
 
+        if capture is not None:
+            spi_if = capture.wrap_interface(spi_if)
+            wlan_if = capture.wrap_interface(wlan_if, LINKTYPE_ETHERNET)
+
         @qemu.command(0x01)
         def spi_tx(conn, _, payload):
-            pysim.event("spi_send", payload_size=len(payload), data=str(IP(payload)))
+            started = time.perf_counter_ns()
+            summaries.packet("spi_send", payload, payload_size=len(payload))
             spi_if.send_packet(payload)
             conn.write_response(0)
+            io_latency.record("spi_send", started)
 
         @qemu.command(0x03)
         def read_config_bits(conn, _, __):
             pysim.event("config_read", result=config_bits)
             conn.write_response(config_bits)
 
+        @qemu.command(0x20)
+        def events_set_batching(conn, _, payload):
+            (max_batch,) = struct.unpack("<I", payload)
+            max_batch = publisher.set_max_batch(max_batch)
+            conn.write_response(max_batch)
+            pysim.event("events_set_batching", max_batch=max_batch)
+
         @qemu.command(0x05)
         def wifi_set_mode(conn, _, payload):
             nonlocal wlan_mode, wlan_mode_set
@@ -217,6 +266,12 @@ def qemu_main(
 
         @qemu.command(0x0B)
         def wifi_start(conn, _, __):
+            # The firmware starts the WiFi once it's initialized, and waits
+            # for the response: the flash can be saved as the warm image
+            if images is not None and images.boot_time is None:
+                images.on_booted()
+                pysim.event("qemu_booted", **images.status())
+
             wlan_if.enable()
             conn.write_response(0)
             pysim.event("wifi_start")
@@ -279,24 +334,37 @@ def qemu_main(
 
         @qemu.command(0x14)
         def wifi_sta_tx(conn, _, payload):
-            pysim.event("WLAN_ST_SEND", sz=len(payload), data=str(Ether(payload)))
+            started = time.perf_counter_ns()
+            summaries.packet("WLAN_ST_SEND", payload, ethernet=True, sz=len(payload))
             wlan_if.send_packet(payload)
             conn.write_response(0)
+            io_latency.record("WLAN_ST_SEND", started)
 
         @qemu.command(0x17)
         def wifi_ap_tx(conn, _, payload):
-            pysim.event("WLAN_AP_SEND", sz=len(payload), data=str(Ether(payload)))
+            started = time.perf_counter_ns()
+            summaries.packet("WLAN_AP_SEND", payload, ethernet=True, sz=len(payload))
             wlan_if.send_packet(payload)
             conn.write_response(0)
+            io_latency.record("WLAN_AP_SEND", started)
+
+        pysim.watch(View(spi_if, wlan_if, orientation, qemu_queue))
 
-        with spi_if, wlan_if:
-            qemu.run()
+        summaries.start()
+        try:
+            with spi_if, wlan_if:
+                qemu.run()
+        finally:
+            summaries.stop()
+            if capture is not None:
+                capture.close()
 
 
 class QemuQueueWrapper:
-    def __init__(self, handler: QemuHandler, pysim):
-        self.handler = handler
-        self.pysim = pysim
+    def __init__(self, publisher: EventPublisher, summaries: PacketSummaries):
+        self.publisher = publisher
+        self.pysim = summaries.pysim
+        self.summaries = summaries
         self.spi_if = None
         self.wifi_mode = None
 
@@ -306,35 +374,40 @@ class QemuQueueWrapper:
     def set_wifi_mode(self, mode):
         self.wifi_mode = mode
 
+    def status(self):
+        return self.publisher.status()
+
     def put(self, event):
         iface, event_name, payload = event
         if event_name == "packet-received":
+            started = time.perf_counter_ns()
             if iface == self.spi_if:
-                self.pysim.event(
-                    "spi_recv", payload_size=len(payload), data=str(IP(payload))
-                )
-                self.handler.publish_event(1, payload)
+                self.summaries.packet("spi_recv", payload, payload_size=len(payload))
+                self.publisher.publish(1, payload)
+                self.summaries.io_latency.record("spi_recv", started)
 
             elif self.wifi_mode == WIFI_MODE_AP:
-                self.handler.publish_event(6, payload)
-                self.pysim.event(
-                    "wifi_ap_recv", sz=len(payload), data=str(Ether(payload))
+                self.publisher.publish(6, payload)
+                self.summaries.packet(
+                    "wifi_ap_recv", payload, ethernet=True, sz=len(payload)
                 )
+                self.summaries.io_latency.record("wifi_ap_recv", started)
             elif self.wifi_mode == WIFI_MODE_STA:
-                self.handler.publish_event(7, payload)
-                self.pysim.event(
-                    "wifi_st_recv", sz=len(payload), data=str(Ether(payload))
+                self.publisher.publish(7, payload)
+                self.summaries.packet(
+                    "wifi_st_recv", payload, ethernet=True, sz=len(payload)
                 )
+                self.summaries.io_latency.record("wifi_st_recv", started)
             else:
                 log.error(
-                    f"Dropping packet {str(Ether(payload))} -- incorrect wlan mode ({self.wifi_mode})"
+                    f"Dropping packet {header_summary(payload, ethernet=True)} -- incorrect wlan mode ({self.wifi_mode})"
                 )
         elif event_name == "peer-connected":
             if self.wifi_mode == WIFI_MODE_AP:
-                self.handler.publish_event(2)
+                self.publisher.publish(2)
                 self.pysim.event("wifi_sta_arrived")
             elif self.wifi_mode == WIFI_MODE_STA:
-                self.handler.publish_event(4)
+                self.publisher.publish(4)
                 self.pysim.event("wifi_connected")
             else:
                 log.error(
@@ -342,10 +415,10 @@ class QemuQueueWrapper:
                 )
         elif event_name == "peer-lost":
             if self.wifi_mode == WIFI_MODE_AP:
-                self.handler.publish_event(3)
+                self.publisher.publish(3)
                 self.pysim.event("wifi_sta_gone")
             elif self.wifi_mode == WIFI_MODE_STA:
-                self.handler.publish_event(5)
+                self.publisher.publish(5)
                 self.pysim.event("wifi_ap_gone")
             else:
                 log.error(
@@ -35,6 +35,8 @@ class RootCore(DeviceCore):
         super().__init__("root")
         self.gtw_request_tms = None
         self.node_routing_table = RoutingTable("c")
+        # Replaced by the headless simulator to run on virtual time
+        self.clock = time.time
 
     def on_start(self):
         # We'll assume an Internet connection always active. This means
@@ -69,7 +71,7 @@ class RootCore(DeviceCore):
         # msg_id = message["id"]
         event_id = SiblingMessageType(message["id"])
         if event_id == SiblingMessageType.SEND_NEW_GTW_REQUEST:
-            self.gtw_request_tms = time.time()
+            self.gtw_request_tms = self.clock()
             log.info("[ROOT HOME] SEND_NEW_GTW_REQUEST received")
         elif event_id == SiblingMessageType.UPDATE_NODE_TABLE:
             self.node_routing_table = RoutingTable.from_json(message["table"])
@@ -78,7 +80,7 @@ class RootCore(DeviceCore):
 
     def on_tick(self):
         # time.time returns tms in seconds
-        if self.gtw_request_tms and time.time() - self.gtw_request_tms > 10:
+        if self.gtw_request_tms and self.clock() - self.gtw_request_tms > 10:
             log.info(f"[ROOT HOME] ENTRE: tms {self.gtw_request_tms}")
             self.gtw_request_tms = None
             sibling_message = create_message_from_args(
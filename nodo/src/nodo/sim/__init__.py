@@ -0,0 +1,8 @@
+"""
+# Headless discrete-event simulation
+
+Runs the routing algorithm for a whole network topology in a single process,
+without pysim, docker or real sleeps. See `Simulation`.
+"""
+
+from .network import Simulation
@@ -0,0 +1,74 @@
+import json
+import time
+
+from argparse import ArgumentParser
+
+from nodo.sim.network import (
+    DEFAULT_CONNECT_DELAY,
+    DEFAULT_JITTER,
+    DEFAULT_SPI_LATENCY,
+    DEFAULT_WLAN_LATENCY,
+    Simulation,
+)
+
+
+def main():
+    parser = ArgumentParser(
+        description="Runs a network topology on virtual time until it converges"
+    )
+    parser.add_argument(
+        "topology", help="Network file (e.g. config/networks/basic.json)"
+    )
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument(
+        "-t", "--timeout", type=float, default=600, help="Virtual seconds to run"
+    )
+    parser.add_argument("--connect-delay", type=float, default=DEFAULT_CONNECT_DELAY)
+    parser.add_argument("--spi-latency", type=float, default=DEFAULT_SPI_LATENCY)
+    parser.add_argument("--wlan-latency", type=float, default=DEFAULT_WLAN_LATENCY)
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER)
+    parser.add_argument(
+        "--link-profile",
+        type=json.loads,
+        help="Link emulation profile for every WLAN link without one, as JSON",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Print every device event"
+    )
+    args = parser.parse_args()
+
+    simulation = Simulation.from_file(
+        args.topology,
+        seed=args.seed,
+        connect_delay=args.connect_delay,
+        spi_latency=args.spi_latency,
+        wlan_latency=args.wlan_latency,
+        jitter=args.jitter,
+        link_profile=args.link_profile,
+        verbose=args.verbose,
+    )
+
+    wall_start = time.perf_counter()
+    simulation.start()
+    convergence_time = simulation.run_until_converged(args.timeout)
+    wall_time = time.perf_counter() - wall_start
+
+    print(
+        json.dumps(
+            {
+                "topology": args.topology,
+                "seed": args.seed,
+                "converged": convergence_time is not None,
+                "convergence_time_s": convergence_time,
+                "wall_time_s": round(wall_time, 4),
+                "events": simulation.engine.events_run,
+                "errors": simulation.errors(),
+                "nodes": simulation.status(),
+                "links": simulation.links_status(),
+            },
+            indent=2,
+        )
+    )
+
+
+main()
@@ -0,0 +1,75 @@
+import heapq
+import random
+
+
+class Engine:
+    """
+    Discrete-event engine with a virtual clock.
+
+    Callbacks are run in virtual time order; callbacks scheduled for the same
+    time run in scheduling order, so a run is fully determined by the seed of
+    `random`.
+    """
+
+    def __init__(self, seed=0):
+        self.now = 0.0
+        self.random = random.Random(seed)
+        self.events_run = 0
+        self._queue = []
+        self._seq = 0
+
+    def time(self):
+        return self.now
+
+    def schedule(self, delay: float, callback, *args):
+        self.schedule_at(self.now + delay, callback, *args)
+
+    def schedule_at(self, when: float, callback, *args):
+        heapq.heappush(self._queue, (when, self._seq, callback, args))
+        self._seq += 1
+
+    def every(self, period: float, callback, *args, start=None):
+        def run_periodic():
+            callback(*args)
+            self.schedule(period, run_periodic)
+
+        self.schedule(period if start is None else start, run_periodic)
+
+    def run(self, until: float, stop_when=None):
+        """
+        Runs callbacks until virtual time `until` or until `stop_when()` is
+        true. Returns whether `stop_when` was satisfied.
+        """
+        while self._queue and self._queue[0][0] <= until:
+            when, _, callback, args = heapq.heappop(self._queue)
+            self.now = when
+            callback(*args)
+            self.events_run += 1
+
+            if stop_when is not None and stop_when():
+                return True
+
+        self.now = max(self.now, until)
+        return False
+
+
+class Channel:
+    """
+    In-order point-to-point channel with a fixed latency plus a random jitter.
+    """
+
+    def __init__(self, engine: Engine, latency: float, jitter: float = 0.0):
+        self.engine = engine
+        self.latency = latency
+        self.jitter = jitter
+        self._last_delivery = 0.0
+
+    def send(self, callback, *args):
+        when = self.engine.now + self.latency
+        if self.jitter:
+            when += self.engine.random.uniform(0, self.jitter)
+
+        # Packets never overtake each other in the same channel
+        when = max(when, self._last_delivery)
+        self._last_delivery = when
+        self.engine.schedule_at(when, callback, *args)
@@ -0,0 +1,220 @@
+"""
+In-memory interfaces used by the simulated devices.
+
+They implement the same protocol as the `pysim_sdk` interfaces (`send_packet`,
+`status`, `enable_ap_mode`, ...) but deliver packets and link events straight
+to the destination device through the simulation engine.
+"""
+
+from pysim_sdk.nic.events import InterfaceEvent
+from pysim_sdk.utils.ip_address import ip2str
+
+from nodo.sim.engine import Channel, Engine
+from nodo.utils.link_emulation import LinkProfile, LinkShaper
+from nodo.utils.queues import Event
+
+
+class SimInterface:
+    def __init__(self, name: str, ip_addr=None, mask=0):
+        self.name = name
+        self.ip_addr = ip_addr
+        self.mask = mask
+        self.device = None
+        self.taps = []
+
+        self.packets_in = 0
+        self.packets_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.dropped = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return None
+
+    def __str__(self):
+        return self.name
+
+    def _on_sent(self, packet: bytes):
+        self.packets_out += 1
+        self.bytes_out += len(packet)
+        for tap in self.taps:
+            tap(self, packet)
+
+    def receive(self, packet: bytes):
+        self.packets_in += 1
+        self.bytes_in += len(packet)
+        self.device.handle_event(Event(InterfaceEvent.PacketReceived, self, packet))
+
+    def send_packet(self, packet: bytes):
+        self._on_sent(packet)
+
+    def enable_ap_mode(self, network: int, mask: int):
+        pass
+
+    def status(self):
+        return {
+            "name": self.name,
+            "ip": self.ip_addr,
+            "mask": ip2str(self.mask),
+            "packetsIn": self.packets_in,
+            "packetsOut": self.packets_out,
+            "bytesIn": self.bytes_in,
+            "bytesOut": self.bytes_out,
+            "dropped": self.dropped,
+        }
+
+
+class SimSpiInterface(SimInterface):
+    def __init__(self, name: str, ip_addr: str, next_hop_ip_addr: str):
+        super().__init__(name, ip_addr, 0xFFFFFF00)
+        self.next_hop_ip_addr = next_hop_ip_addr
+        self.next_hop = None
+        self.channel = None
+
+    def connect(self, next_hop, channel: Channel):
+        self.next_hop = next_hop
+        self.channel = channel
+
+    def send_packet(self, packet: bytes):
+        self._on_sent(packet)
+        self.channel.send(self.next_hop.receive, packet)
+
+
+class SimTunnel(SimInterface):
+    """
+    Host side of a home or root node: packets sent through it leave the
+    simulated mesh.
+    """
+
+    def enable_ap_mode(self, network: int, mask: int):
+        self.ip_addr = ip2str(network | 1)
+        self.mask = mask
+
+
+class SimWlanInterface(SimInterface):
+    def __init__(self, name: str, is_ap: bool, simulation=None):
+        super().__init__(name)
+        self.is_ap = is_ap
+        self.simulation = simulation
+        self.link = None
+        self.network = None
+
+    def enable_ap_mode(self, network: int, mask: int):
+        if not self.is_ap:
+            return
+
+        self.network = network
+        self.mask = mask
+        self.ip_addr = ip2str(network | 1)
+        self.simulation.on_ap_enabled(self)
+
+    def send_packet(self, packet: bytes):
+        if self.link is None or not self.link.connected:
+            self.dropped += 1
+            return
+
+        self._on_sent(packet)
+        self.link.send(self, packet)
+
+
+class SimLink:
+    """
+    WLAN link between a station and an AP.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        station,
+        ap,
+        latency: float,
+        jitter: float,
+        profile: LinkProfile = None,
+    ):
+        self.engine = engine
+        self.station = station
+        self.ap = ap
+        self.connected = False
+        self.failed = False
+        self.connecting = False
+        self.profile = profile
+        self.channels = {
+            station: Channel(engine, latency, jitter),
+            ap: Channel(engine, latency, jitter),
+        }
+        # With a profile, the shapers replace the fixed latency of the channels
+        self.shapers = profile and {
+            station: LinkShaper(profile, engine.random),
+            ap: LinkShaper(profile, engine.random),
+        }
+        station.link = self
+
+    def peer_of(self, interface):
+        return self.ap if interface is self.station else self.station
+
+    def send(self, interface, packet: bytes):
+        if self.shapers is None:
+            self.channels[interface].send(
+                self._deliver, self.peer_of(interface), packet
+            )
+            return
+
+        delivery = self.shapers[interface].transmit(self.engine.now, len(packet))
+        if delivery is not None:
+            self.engine.schedule_at(
+                delivery, self._deliver, self.peer_of(interface), packet
+            )
+
+    def _deliver(self, interface, packet: bytes):
+        # Packets in flight when the link goes down are lost
+        if self.connected:
+            interface.receive(packet)
+        else:
+            interface.dropped += 1
+
+    def connect(self):
+        self.connecting = False
+        if self.connected or self.failed or self.ap.network is None:
+            return
+
+        self.connected = True
+        self.ap.link = self
+
+        network, mask = self.ap.network, self.ap.mask
+        self.station.ip_addr = ip2str(network | 2)
+        self.station.mask = mask
+        for interface, ip, peer_ip in (
+            (self.ap, network | 1, network | 2),
+            (self.station, network | 2, network | 1),
+        ):
+            interface.device.handle_event(
+                Event(InterfaceEvent.PeerConnected, interface, (ip, mask, peer_ip))
+            )
+
+    def disconnect(self):
+        if not self.connected:
+            return
+
+        self.connected = False
+        network, mask = self.ap.network, self.ap.mask
+        for interface, ip, peer_ip in (
+            (self.ap, network | 1, network | 2),
+            (self.station, network | 2, network | 1),
+        ):
+            interface.device.handle_event(
+                Event(InterfaceEvent.PeerLost, interface, (ip, mask, peer_ip))
+            )
+        self.station.ip_addr = None
+
+    def status(self):
+        status = {"connected": self.connected}
+        if self.shapers is not None:
+            status["emulation"] = {
+                "profile": self.profile.json(),
+                "uplink": self.shapers[self.station].status(),
+                "downlink": self.shapers[self.ap].status(),
+            }
+        return status
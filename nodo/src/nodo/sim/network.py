@@ -0,0 +1,368 @@
+import json
+import time
+
+from collections import Counter
+
+from pysim_sdk.nic.events import InterfaceEvent
+
+from nodo.device import TICK_PERIOD_SECS, Device
+from nodo.routing.core.forwarder import ForwarderCore
+from nodo.routing.core.home import HomeCore
+from nodo.routing.core.root import RootCore
+from nodo.routing.core.root_forwarder import RootForwarderCore
+from nodo.sim.engine import Channel, Engine
+from nodo.sim.interfaces import SimLink, SimSpiInterface, SimTunnel, SimWlanInterface
+from nodo.sync.core.center import CenterCore as SyncCenterCore
+from nodo.sync.core.forwarder import ForwarderCore as SyncForwarderCore
+from nodo.topology import ROOT_NODE_ID, link_profiles, node_links, validate
+from nodo.utils.link_emulation import LinkProfile
+from nodo.utils.queues import Event
+from nodo.utils.routing.network import WITH_NETWORK
+
+# Same addressing as `nodo.device_main`, the SPI ring is n -> e -> w -> s -> c
+SPI_HOST_MAP = {
+    "n": 1,
+    "e": 2,
+    "w": 3,
+    "s": 4,
+    "c": 5,
+}
+
+DEFAULT_CONNECT_DELAY = 5.0
+DEFAULT_SPI_LATENCY = 50e-6
+DEFAULT_WLAN_LATENCY = 1e-3
+DEFAULT_JITTER = 0.1
+
+# Devices of a node don't start at the exact same time
+MAX_START_SKEW = 0.1
+
+
+class SimObserver:
+    """
+    Replaces the pysim client of a simulated device, counting its events.
+    """
+
+    def __init__(self, simulation, device_name: str):
+        self.simulation = simulation
+        self.device_name = device_name
+        self.events = Counter()
+        self.critical_sections = 0
+        self._in_critical_section = False
+
+    def event(self, name, **kwargs):
+        self.events[name] += 1
+        if self.simulation.verbose:
+            print(
+                f"[{self.simulation.engine.now:10.6f}] {self.device_name:<12} "
+                f"{'CS ' if self._in_critical_section else ''}{name} {kwargs}"
+            )
+
+    def request_critical_section(self):
+        self.events["request_critical_section"] += 1
+
+    def enter_critical_section(self):
+        self.critical_sections += 1
+        self._in_critical_section = True
+
+    def exit_critical_section(self):
+        self._in_critical_section = False
+
+
+class SimDevice:
+    """
+    Runs a device on the simulation. Like the events queue of a real device,
+    it holds the events received before the device has started.
+
+    An exception raised by the device is kept in `error` instead of stopping
+    the simulation, and, like the thread of a real device, it handles no
+    more events.
+    """
+
+    def __init__(self, device: Device):
+        self.device = device
+        self.started = False
+        self.backlog = []
+        self.error = None
+
+    def _call(self, method, *args):
+        if self.error is not None:
+            return
+        try:
+            method(*args)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+
+    def start(self):
+        self._call(self.device.start)
+        self.started = True
+
+        backlog, self.backlog = self.backlog, []
+        for event in backlog:
+            self._call(self.device.handle_event, event)
+
+    def handle_event(self, event):
+        if self.started:
+            self._call(self.device.handle_event, event)
+        else:
+            self.backlog.append(event)
+
+
+class SimNode:
+    def __init__(self, node_id: str, links: dict):
+        self.id = node_id
+        self.links = links
+        self.devices = {}
+        self.runners = {}
+        self.spi = {}
+        self.wlan = {}
+
+    @property
+    def is_root(self):
+        return self.id == ROOT_NODE_ID
+
+    def is_provisioned(self):
+        for orientation, device in self.devices.items():
+            if orientation == "c":
+                if not self.is_root and not device.core.is_provisioned:
+                    return False
+            elif (
+                device.core.network is None
+                or device.core.network.global_state != WITH_NETWORK
+            ):
+                return False
+        return True
+
+    def status(self):
+        return {
+            orientation: {
+                "dtr": device.core.network and device.core.network.dtr,
+                "is_local_root": device.core.network
+                and device.core.network.is_local_root,
+            }
+            for orientation, device in self.devices.items()
+            if orientation != "c"
+        }
+
+
+class Simulation:
+    """
+    Runs every node of a network topology (see `config/networks`) in a single
+    process, on virtual time.
+
+    SPI rings and WLAN links are replaced by in-memory channels with a fixed
+    latency plus a random jitter, and device ticks, WLAN connection delays
+    and the root gateway timeout run on the virtual clock, so a simulation is
+    fully reproducible from its seed.
+
+    WLAN links with a `link_emulation` profile in the topology, or every link
+    if `link_profile` is given, are shaped by `nodo.utils.link_emulation`
+    instead.
+    """
+
+    def __init__(
+        self,
+        topology: dict,
+        seed=0,
+        connect_delay=DEFAULT_CONNECT_DELAY,
+        spi_latency=DEFAULT_SPI_LATENCY,
+        wlan_latency=DEFAULT_WLAN_LATENCY,
+        jitter=DEFAULT_JITTER,
+        link_profile=None,
+        verbose=False,
+    ):
+        self.engine = Engine(seed)
+        self.connect_delay = connect_delay
+        self.spi_latency = spi_latency
+        self.wlan_latency = wlan_latency
+        self.jitter = jitter
+        self.verbose = verbose
+
+        self.nodes = {}
+        self.links = {}
+        self.aps = {}
+
+        errors = validate(topology)
+        if errors:
+            raise ValueError(f"Invalid topology: {'; '.join(errors)}")
+
+        for node_id, links in node_links(topology).items():
+            self.nodes[node_id] = self._build_node(node_id, links)
+
+        default_profile = link_profile and LinkProfile.from_config(link_profile)
+        profiles = link_profiles(topology)
+
+        for node in self.nodes.values():
+            for orientation, ap_name in node.links.items():
+                if ap_name not in self.aps:
+                    raise ValueError(f"Unknown AP {ap_name!r} in node {node.id!r}")
+                station_name = f"{node.id}.{orientation}"
+                self.links[station_name] = SimLink(
+                    self.engine,
+                    node.wlan[orientation],
+                    self.aps[ap_name],
+                    wlan_latency,
+                    wlan_latency * jitter,
+                    profiles.get(station_name, default_profile),
+                )
+
+    @staticmethod
+    def from_file(path: str, **kwargs):
+        with open(path) as f:
+            return Simulation(json.load(f), **kwargs)
+
+    def _build_node(self, node_id: str, links: dict):
+        node = SimNode(node_id, links)
+
+        for orientation in "news":
+            if node.is_root:
+                core = RootForwarderCore(orientation)
+            else:
+                core = ForwarderCore(orientation)
+
+            wlan_if = SimWlanInterface(
+                f"wlan-{orientation}", orientation not in links, self
+            )
+            if wlan_if.is_ap:
+                self.aps[f"{node_id}.{orientation}"] = wlan_if
+
+            self._add_device(
+                node, orientation, core, SyncForwarderCore(orientation), wlan_if
+            )
+
+        if node.is_root:
+            core = RootCore()
+            core.clock = self.engine.time
+        else:
+            core = HomeCore()
+        self._add_device(node, "c", core, SyncCenterCore(), SimTunnel("wlan-c"))
+
+        for orientation, spi_if in node.spi.items():
+            next_hop = (SPI_HOST_MAP[orientation] % 5) + 1
+            next_orientation = next(o for o, i in SPI_HOST_MAP.items() if i == next_hop)
+            spi_if.connect(
+                node.spi[next_orientation],
+                Channel(self.engine, self.spi_latency, self.spi_latency * self.jitter),
+            )
+
+        return node
+
+    def _add_device(self, node, orientation, core, sync_core, wlan_if):
+        host = SPI_HOST_MAP[orientation]
+        spi_if = SimSpiInterface(
+            f"spi-{orientation}",
+            ip_addr=f"127.0.0.{host}",
+            next_hop_ip_addr=f"127.0.0.{(host % 5) + 1}",
+        )
+
+        device = Device(orientation, None, spi_if, wlan_if, core, sync_core)
+        device.name = f"{node.id}.{orientation}"
+        device.observer = SimObserver(self, device.name)
+
+        runner = SimDevice(device)
+        spi_if.device = runner
+        wlan_if.device = runner
+
+        node.devices[orientation] = device
+        node.runners[orientation] = runner
+        node.spi[orientation] = spi_if
+        node.wlan[orientation] = wlan_if
+
+    def devices(self):
+        for node in self.nodes.values():
+            yield from node.devices.values()
+
+    def runners(self):
+        for node in self.nodes.values():
+            yield from node.runners.values()
+
+    def interfaces(self):
+        for node in self.nodes.values():
+            yield from node.spi.values()
+            yield from node.wlan.values()
+
+    def add_tap(self, tap):
+        """
+        Calls `tap(interface, packet)` for every packet sent by any device.
+        """
+        for interface in self.interfaces():
+            interface.taps.append(tap)
+
+    def critical_sections(self):
+        return sum(device.observer.critical_sections for device in self.devices())
+
+    def on_ap_enabled(self, ap):
+        for link in self.links.values():
+            if link.ap is ap:
+                self._schedule_connect(link)
+
+    def _schedule_connect(self, link):
+        if link.connected or link.connecting or link.failed:
+            return
+
+        link.connecting = True
+        delay = self.connect_delay * (1 + self.engine.random.uniform(0, self.jitter))
+        self.engine.schedule(delay, link.connect)
+
+    def fail_link(self, station_name: str, duration=None):
+        """
+        Brings down the WLAN link of station `{node}.{orientation}`. The link
+        is restored after `duration` seconds, or never if `None`.
+        """
+        link = self.links[station_name]
+        link.failed = True
+        link.disconnect()
+
+        if duration is not None:
+            self.engine.schedule(duration, self._restore_link, link)
+
+    def _restore_link(self, link):
+        link.failed = False
+        self._schedule_connect(link)
+
+    def converged(self):
+        return all(node.is_provisioned() for node in self.nodes.values())
+
+    def errors(self):
+        """
+        Device name -> exception that stopped it, for every crashed device.
+        """
+        return {
+            runner.device.name: runner.error
+            for runner in self.runners()
+            if runner.error is not None
+        }
+
+    def failed(self):
+        return any(runner.error is not None for runner in self.runners())
+
+    def start(self):
+        for runner in self.runners():
+            skew = self.engine.random.uniform(0, MAX_START_SKEW)
+            self.engine.schedule(skew, runner.start)
+            self.engine.every(
+                TICK_PERIOD_SECS,
+                runner.handle_event,
+                Event(InterfaceEvent.Tick),
+                start=skew + TICK_PERIOD_SECS,
+            )
+
+    def run(self, until: float, stop_when=None):
+        return self.engine.run(until, stop_when)
+
+    def run_until_converged(self, timeout: float):
+        """
+        Runs the simulation until every node is provisioned. Returns the
+        virtual time it took, or `None` if `timeout` was reached first or a
+        device crashed (see `errors`).
+        """
+        start = self.engine.now
+        self.engine.run(start + timeout, lambda: self.failed() or self.converged())
+        if not self.failed() and self.converged():
+            return self.engine.now - start
+        return None
+
+    def status(self):
+        return {node_id: node.status() for node_id, node in self.nodes.items()}
+
+    def links_status(self):
+        return {name: link.status() for name, link in self.links.items()}
@@ -0,0 +1,16 @@
+"""
+# Network topologies
+
+Validation of the network files in `config/networks` (see `config.md` there)
+and generators of synthetic topologies for scale testing.
+"""
+
+from .generators import chain, check_depth, geometric, grid, tree
+from .validation import (
+    MAX_DEPTH,
+    ROOT_NODE_ID,
+    link_profiles,
+    node_links,
+    summary,
+    validate,
+)
@@ -0,0 +1,162 @@
+import json
+import os
+import sys
+
+from argparse import ArgumentParser
+
+from nodo.topology.generators import MAX_DEGREE, chain, geometric, grid, tree
+from nodo.topology.validation import MAX_DEPTH, summary, validate
+
+
+def parse_args():
+    parser = ArgumentParser(
+        description="Generates and validates network topologies (config/networks)"
+    )
+    subparsers = parser.add_subparsers(dest="kind", required=True)
+
+    validate_parser = subparsers.add_parser("validate", help="Validate network files")
+    validate_parser.add_argument("files", nargs="+")
+
+    chain_parser = subparsers.add_parser("chain", help="Nodes one after the other")
+    chain_parser.add_argument("--length", type=int, required=True)
+
+    grid_parser = subparsers.add_parser("grid", help="Rows x cols grid")
+    grid_parser.add_argument("--rows", type=int, required=True)
+    grid_parser.add_argument("--cols", type=int, required=True)
+
+    tree_parser = subparsers.add_parser("tree", help="Full tree around the root")
+    tree_parser.add_argument("--depth", type=int, required=True)
+    tree_parser.add_argument("--branching", type=int, default=2)
+
+    geometric_parser = subparsers.add_parser("geometric", help="Random geometric graph")
+    geometric_parser.add_argument("--nodes", type=int, required=True)
+    geometric_parser.add_argument(
+        "--radius", type=float, default=1.5, help="Link range, in node spacings"
+    )
+
+    for subparser in (grid_parser, geometric_parser):
+        subparser.add_argument(
+            "--degree", type=int, default=MAX_DEGREE, help="Maximum links per node"
+        )
+        subparser.add_argument(
+            "--redundancy",
+            type=float,
+            default=1.0,
+            help="Probability of keeping each link not needed to reach the root",
+        )
+        subparser.add_argument("-s", "--seed", type=int, default=0)
+
+    for subparser in (chain_parser, grid_parser, tree_parser, geometric_parser):
+        subparser.add_argument(
+            "--max-diameter", type=int, help="Fail if the diameter (hops) is larger"
+        )
+        subparser.add_argument(
+            "--allow-deep",
+            action="store_true",
+            help=f"Allow nodes more than {MAX_DEPTH} hops away from the root, "
+            "which can't be provisioned",
+        )
+        subparser.add_argument(
+            "-o", "--output", help="Network file to write (default: stdout)"
+        )
+        subparser.add_argument(
+            "--activate",
+            metavar="CONFIG",
+            help="Also select the network in this pysim config (e.g. "
+            "config/config.json)",
+        )
+
+    return parser.parse_args()
+
+
+def generate(args):
+    max_depth = None if args.allow_deep else MAX_DEPTH
+    if args.kind == "chain":
+        return chain(args.length, max_depth)
+    if args.kind == "grid":
+        return grid(
+            args.rows, args.cols, args.degree, args.redundancy, args.seed, max_depth
+        )
+    if args.kind == "tree":
+        return tree(args.depth, args.branching, max_depth)
+    return geometric(
+        args.nodes,
+        args.radius,
+        args.degree,
+        args.redundancy,
+        max_diameter=args.max_diameter,
+        seed=args.seed,
+        max_depth=max_depth,
+    )
+
+
+def report(name, topology):
+    errors = validate(topology)
+    for error in errors:
+        print(f"{name}: {error}", file=sys.stderr)
+    if errors:
+        return None
+
+    info = summary(topology)
+    print(f"{name}: {json.dumps(info)}", file=sys.stderr)
+    if info["max_depth"] > MAX_DEPTH:
+        print(
+            f"{name}: warning: nodes {info['max_depth']} hops away from the root, "
+            f"only {MAX_DEPTH} hops can be provisioned",
+            file=sys.stderr,
+        )
+    return info
+
+
+def activate(config_path: str, network_file: str, home_nodes: int):
+    with open(config_path) as f:
+        config = json.load(f)
+
+    config["network"] = os.path.splitext(os.path.basename(network_file))[0]
+    with open(config_path, "w") as f:
+        json.dump(config, f, indent=2)
+        f.write("\n")
+
+    print(f"I4A_HOME_NODES_COUNT={home_nodes}")
+
+
+def main():
+    args = parse_args()
+
+    if args.kind == "validate":
+        valid = True
+        for path in args.files:
+            with open(path) as f:
+                valid = report(path, json.load(f)) is not None and valid
+        sys.exit(0 if valid else 1)
+
+    if args.activate and args.output is None:
+        sys.exit("error: --activate requires --output")
+
+    try:
+        topology = generate(args)
+    except ValueError as e:
+        sys.exit(f"error: {e}")
+
+    info = report(args.output or args.kind, topology)
+    if info is None:
+        sys.exit(1)
+
+    if args.max_diameter is not None and info["diameter"] > args.max_diameter:
+        sys.exit(
+            f"error: diameter {info['diameter']} is larger than {args.max_diameter}"
+        )
+
+    if args.output is None:
+        print(json.dumps(topology, indent=2))
+        return
+
+    with open(args.output, "w") as f:
+        json.dump(topology, f, indent=2)
+        f.write("\n")
+
+    if args.activate:
+        activate(args.activate, args.output, info["home_nodes"])
+
+
+main()
@@ -0,0 +1,327 @@
+"""
+Generators of synthetic network topologies.
+
+Every generator returns a topology in the format of `config/networks`: each
+node has a `name`, a `position` and the `links` of its station devices. A
+device takes part in a single link, either as the station or as the AP, so
+nodes have at most four links.
+
+Links are oriented towards the root: the device of the node further from the
+root acts as the station, so every node but the root has a station link.
+
+Nodes more than `MAX_DEPTH` hops away from the root can't be provisioned, so
+generators reject such topologies unless `max_depth` is raised (or `None`).
+"""
+
+import collections
+import math
+import random
+
+from nodo.topology.validation import MAX_DEPTH, ROOT_NODE_ID, hop_distances, summary
+
+# Distance between neighbouring nodes, in the units of `position`
+SPACING = 1.5
+
+MAX_DEGREE = 4
+
+# Unit vectors of each orientation, `y` grows southwards like in the UI
+DIRECTIONS = {
+    "n": (0, -1),
+    "e": (1, 0),
+    "s": (0, 1),
+    "w": (-1, 0),
+}
+
+
+class TopologyBuilder:
+    def __init__(self):
+        self.positions = {}
+        self.devices = {}
+        self.edges = []
+
+    def add_node(self, node_id: str, position):
+        self.positions[node_id] = [round(position[0], 2), round(position[1], 2)]
+        self.devices[node_id] = {}
+
+    def degree(self, node_id: str) -> int:
+        return len(self.devices[node_id])
+
+    def linked(self, a: str, b: str) -> bool:
+        return b in self.devices[a].values()
+
+    def _free_orientation(self, node_id: str, towards: str):
+        (x, y), (tx, ty) = self.positions[node_id], self.positions[towards]
+        used = self.devices[node_id]
+
+        # Prefer the device facing the other node
+        for orientation in sorted(
+            DIRECTIONS,
+            key=lambda o: -(DIRECTIONS[o][0] * (tx - x) + DIRECTIONS[o][1] * (ty - y)),
+        ):
+            if orientation not in used:
+                return orientation
+        return None
+
+    def link(self, a: str, b: str) -> bool:
+        if a == b or self.linked(a, b):
+            return False
+
+        orientation_a = self._free_orientation(a, b)
+        orientation_b = self._free_orientation(b, a)
+        if orientation_a is None or orientation_b is None:
+            return False
+
+        self.devices[a][orientation_a] = b
+        self.devices[b][orientation_b] = a
+        self.edges.append(((a, orientation_a), (b, orientation_b)))
+        return True
+
+    def build(self) -> dict:
+        neighbours = {node_id: set() for node_id in self.positions}
+        for (a, _), (b, _) in self.edges:
+            neighbours[a].add(b)
+            neighbours[b].add(a)
+
+        depths = hop_distances(neighbours, ROOT_NODE_ID)
+        order = {node_id: i for i, node_id in enumerate(self.positions)}
+
+        links = {node_id: {} for node_id in self.positions}
+        for a, b in self.edges:
+            station, ap = sorted(
+                (a, b), key=lambda device: (depths[device[0]], order[device[0]])
+            )[::-1]
+            links[station[0]][station[1]] = ".".join(ap)
+
+        # Root first, then nodes in creation order
+        topology = {}
+        for node_id in sorted(self.positions, key=lambda n: n != ROOT_NODE_ID):
+            topology[node_id] = {"name": node_id}
+            if links[node_id]:
+                topology[node_id]["links"] = links[node_id]
+            topology[node_id]["position"] = self.positions[node_id]
+        return topology
+
+
+def connect(builder, candidates: dict, degree=MAX_DEGREE, redundancy=1.0, rng=None):
+    """
+    Links the nodes of `builder` with a breadth-first spanning tree from the
+    root over the `candidates` neighbours of each node (closest first), then
+    adds each remaining candidate link with probability `redundancy`. No node
+    gets more than `degree` links.
+    """
+    if not 1 <= degree <= MAX_DEGREE:
+        raise ValueError(f"Degree must be between 1 and {MAX_DEGREE}")
+
+    reached = {ROOT_NODE_ID}
+    queue = collections.deque([ROOT_NODE_ID])
+    while queue:
+        node_id = queue.popleft()
+        for neighbour in candidates[node_id]:
+            if builder.degree(node_id) >= degree:
+                break
+            if neighbour not in reached and builder.link(node_id, neighbour):
+                reached.add(neighbour)
+                queue.append(neighbour)
+
+    if len(reached) != len(builder.positions):
+        raise ValueError(
+            f"{len(builder.positions) - len(reached)} nodes can't be connected to "
+            f"the root with at most {degree} links per node"
+        )
+
+    rng = rng or random.Random(0)
+    for node_id, neighbours in candidates.items():
+        for neighbour in neighbours:
+            if (
+                node_id < neighbour
+                and builder.degree(node_id) < degree
+                and builder.degree(neighbour) < degree
+                and rng.random() < redundancy
+            ):
+                builder.link(node_id, neighbour)
+
+
+def _neighbours_within(points: dict, max_distance: float) -> dict:
+    """
+    Returns the nodes closer than `max_distance` to each node, closest first.
+    Nodes are bucketed in cells of `max_distance` so only neighbouring cells
+    are compared.
+    """
+    cells = collections.defaultdict(list)
+    for name, (x, y) in points.items():
+        cells[int(x // max_distance), int(y // max_distance)].append(name)
+
+    neighbours = {}
+    for name, point in points.items():
+        cx, cy = int(point[0] // max_distance), int(point[1] // max_distance)
+        in_range = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for other in cells.get((cx + dx, cy + dy), ()):
+                    distance = math.dist(point, points[other])
+                    if other != name and distance <= max_distance:
+                        in_range.append((distance, other))
+        neighbours[name] = [other for _, other in sorted(in_range)]
+    return neighbours
+
+
+def check_depth(topology: dict, max_depth=MAX_DEPTH) -> dict:
+    """
+    Returns `topology`, or raises `ValueError` if a node is more than
+    `max_depth` hops away from the root.
+    """
+    depth = summary(topology)["max_depth"]
+    if max_depth is not None and depth > max_depth:
+        raise ValueError(
+            f"nodes {depth} hops away from the root, only {max_depth} hops can "
+            "be provisioned"
+        )
+    return topology
+
+
+def chain(length: int, max_depth=MAX_DEPTH) -> dict:
+    """
+    `length` nodes linked one after the other, starting at the root.
+    """
+    if max_depth is not None and length > max_depth:
+        raise ValueError(
+            f"a chain of {length} nodes is deeper than the {max_depth} hops "
+            "that can be provisioned"
+        )
+
+    builder = TopologyBuilder()
+    builder.add_node(ROOT_NODE_ID, (0, 0))
+
+    previous = ROOT_NODE_ID
+    for i in range(1, length + 1):
+        node_id = f"c{i}"
+        builder.add_node(node_id, (i * SPACING, 0))
+        builder.link(previous, node_id)
+        previous = node_id
+
+    return builder.build()
+
+
+def grid(
+    rows: int,
+    cols: int,
+    degree=MAX_DEGREE,
+    redundancy=1.0,
+    seed=0,
+    max_depth=MAX_DEPTH,
+) -> dict:
+    """
+    `rows` x `cols` nodes, each one linked to its north, east, south and west
+    neighbours. The root is the node closest to the centre.
+    """
+    root = (rows // 2, cols // 2)
+
+    def node_name(row, col):
+        return ROOT_NODE_ID if (row, col) == root else f"r{row}c{col}"
+
+    builder = TopologyBuilder()
+    candidates = {}
+    for row in range(rows):
+        for col in range(cols):
+            builder.add_node(node_name(row, col), (col * SPACING, row * SPACING))
+            candidates[node_name(row, col)] = [
+                node_name(row + dr, col + dc)
+                for dr, dc in ((-1, 0), (0, 1), (1, 0), (0, -1))
+                if 0 <= row + dr < rows and 0 <= col + dc < cols
+            ]
+
+    connect(builder, candidates, degree, redundancy, random.Random(seed))
+    return check_depth(builder.build(), max_depth)
+
+
+def tree(depth: int, branching: int, max_depth=MAX_DEPTH) -> dict:
+    """
+    Full tree of the given `depth`, where every node has `branching` children
+    (at most 3, as one device of each node links to its parent).
+    """
+    if not 1 <= branching <= MAX_DEGREE - 1:
+        raise ValueError(f"Branching must be between 1 and {MAX_DEGREE - 1}")
+    if max_depth is not None and depth > max_depth:
+        raise ValueError(
+            f"depth {depth} is deeper than the {max_depth} hops that can be "
+            "provisioned"
+        )
+
+    builder = TopologyBuilder()
+    builder.add_node(ROOT_NODE_ID, (0, 0))
+
+    # Children are laid out under their parent, leaves are spread evenly
+    leaves = branching**depth
+    width = leaves * SPACING
+
+    level = [(ROOT_NODE_ID, "", 0, width)]
+    for d in range(1, depth + 1):
+        next_level = []
+        for parent, path, left, parent_width in level:
+            child_width = parent_width / branching
+            for i in range(branching):
+                child_path = f"{path}{i + 1}"
+                node_id = f"t{child_path}"
+                x = left + child_width * (i + 0.5) - width / 2
+                builder.add_node(node_id, (x, d * SPACING * 2))
+                builder.link(parent, node_id)
+                next_level.append(
+                    (node_id, child_path, left + child_width * i, child_width)
+                )
+        level = next_level
+
+    return builder.build()
+
+
+def geometric(
+    nodes: int,
+    radius=1.5,
+    degree=MAX_DEGREE,
+    redundancy=1.0,
+    max_diameter=None,
+    seed=0,
+    attempts=100,
+    max_depth=MAX_DEPTH,
+) -> dict:
+    """
+    `nodes` nodes (root included) placed uniformly at random on a square with
+    one node every `SPACING` x `SPACING` on average. Nodes closer than
+    `radius` spacings can be linked. The root is the node closest to the
+    centre.
+
+    Placements that can't be connected, or whose diameter exceeds
+    `max_diameter` or depth `max_depth`, are discarded and drawn again up to
+    `attempts` times.
+    """
+    rng = random.Random(seed)
+    side = math.sqrt(nodes) * SPACING
+    max_distance = radius * SPACING
+
+    for _ in range(attempts):
+        points = [(rng.uniform(0, side), rng.uniform(0, side)) for _ in range(nodes)]
+        points.sort(key=lambda p: math.dist(p, (side / 2, side / 2)))
+        names = [ROOT_NODE_ID] + [f"g{i}" for i in range(1, nodes)]
+
+        builder = TopologyBuilder()
+        for name, point in zip(names, points):
+            builder.add_node(name, point)
+
+        candidates = _neighbours_within(dict(zip(names, points)), max_distance)
+
+        try:
+            connect(builder, candidates, degree, redundancy, rng)
+        except ValueError:
+            continue
+
+        topology = builder.build()
+        info = summary(topology)
+        if (max_diameter is None or info["diameter"] <= max_diameter) and (
+            max_depth is None or info["max_depth"] <= max_depth
+        ):
+            return topology
+
+    raise ValueError(
+        f"No connected placement of {nodes} nodes found after {attempts} attempts, "
+        "try a larger radius"
+        + ("" if max_depth is None else f" or fewer nodes (max depth {max_depth})")
+    )
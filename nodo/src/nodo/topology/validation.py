@@ -0,0 +1,157 @@
+import collections
+
+from pysim_sdk.utils.ip_address import str2ip
+
+from nodo.routing.core.root import ROOT_PROVISION_MASK
+from nodo.utils.link_emulation import LinkProfile
+
+ROOT_NODE_ID = "root"
+
+ORIENTATIONS = "nesw"
+
+# Every hop away from the root takes 3 more bits of the provisioning network
+# (see `get_node_subnets`), nodes deeper than this can't get a network
+SUBNET_BITS = 3
+MAX_DEPTH = (32 - str2ip(ROOT_PROVISION_MASK).bit_count()) // SUBNET_BITS - 1
+
+
+def node_links(topology: dict) -> dict:
+    """
+    Returns the station links of every node, `{node: {orientation: ap}}`,
+    including the root even if the file doesn't list it.
+    """
+    nodes = {ROOT_NODE_ID: {}}
+    for node_id, node in topology.items():
+        nodes[node_id] = dict(node.get("links", {}))
+    return nodes
+
+
+def adjacency(topology: dict) -> dict:
+    neighbours = {}
+    for node_id, links in node_links(topology).items():
+        neighbours.setdefault(node_id, set())
+        for ap in links.values():
+            ap_node = ap.split(".")[0]
+            neighbours[node_id].add(ap_node)
+            neighbours.setdefault(ap_node, set()).add(node_id)
+    return neighbours
+
+
+def hop_distances(neighbours: dict, source: str) -> dict:
+    distances = {source: 0}
+    queue = collections.deque([source])
+    while queue:
+        node_id = queue.popleft()
+        for neighbour in neighbours[node_id]:
+            if neighbour not in distances:
+                distances[neighbour] = distances[node_id] + 1
+                queue.append(neighbour)
+    return distances
+
+
+def link_profiles(topology: dict) -> dict:
+    """
+    Returns the link emulation profiles of a valid topology, keyed by the
+    station of each link (`{node}.{orientation}`).
+    """
+    return {
+        f"{node_id}.{orientation}": LinkProfile.from_config(profile)
+        for node_id, node in topology.items()
+        for orientation, profile in node.get("link_emulation", {}).items()
+    }
+
+
+def validate(topology: dict) -> list:
+    """
+    Checks a network topology against the rules of `config/networks/config.md`.
+    Returns a list of errors, empty if the topology is valid.
+    """
+    errors = []
+    nodes = node_links(topology)
+
+    if topology.get(ROOT_NODE_ID, {}).get("links"):
+        errors.append("root devices can only act as APs")
+
+    stations = {
+        f"{node_id}.{orientation}"
+        for node_id, links in nodes.items()
+        for orientation in links
+    }
+    ap_stations = collections.defaultdict(list)
+
+    for node_id, links in nodes.items():
+        if "." in node_id:
+            errors.append(f"{node_id}: node names can't contain '.'")
+
+        if node_id != ROOT_NODE_ID and not links:
+            errors.append(f"{node_id}: at least one device must be a station")
+
+        position = topology.get(node_id, {}).get("position")
+        if position is not None and (
+            not isinstance(position, list)
+            or len(position) != 2
+            or not all(isinstance(p, (int, float)) for p in position)
+        ):
+            errors.append(f"{node_id}: position must be [x, y]")
+
+        for orientation, ap in links.items():
+            station = f"{node_id}.{orientation}"
+            if orientation not in ORIENTATIONS:
+                errors.append(f"{station}: unknown orientation {orientation!r}")
+
+            ap_node, _, ap_orientation = ap.partition(".")
+            if ap_node not in nodes:
+                errors.append(f"{station}: unknown node {ap_node!r}")
+            elif ap_orientation not in ORIENTATIONS:
+                errors.append(f"{station}: unknown orientation in {ap!r}")
+            elif ap_node == node_id:
+                errors.append(f"{station}: can't link to its own node")
+            elif ap in stations:
+                errors.append(f"{station}: {ap} is a station, not an AP")
+            else:
+                ap_stations[ap].append(station)
+
+        for orientation, profile in (
+            topology.get(node_id, {}).get("link_emulation", {}).items()
+        ):
+            station = f"{node_id}.{orientation}"
+            if orientation not in links:
+                errors.append(f"{station}: link emulation set on a device without link")
+                continue
+            try:
+                LinkProfile.from_config(profile)
+            except ValueError as e:
+                errors.append(f"{station}: {e}")
+
+    for ap, linked in ap_stations.items():
+        if len(linked) > 1:
+            errors.append(f"{ap}: AP linked by more than one station {linked}")
+
+    if not errors:
+        distances = hop_distances(adjacency(topology), ROOT_NODE_ID)
+        unreachable = sorted(set(nodes) - set(distances))
+        if unreachable:
+            errors.append(f"nodes not connected to the root: {unreachable}")
+
+    return errors
+
+
+def summary(topology: dict) -> dict:
+    """
+    Size and shape of a valid topology. `max_depth` is the largest number of
+    hops between the root and a node, `diameter` the largest between any two
+    nodes.
+    """
+    neighbours = adjacency(topology)
+    depths = hop_distances(neighbours, ROOT_NODE_ID)
+
+    return {
+        "nodes": len(neighbours),
+        "home_nodes": len(neighbours) - 1,
+        "links": sum(len(links) for links in node_links(topology).values()),
+        "max_degree": max(len(n) for n in neighbours.values()),
+        "max_depth": max(depths.values()),
+        "diameter": max(
+            max(hop_distances(neighbours, node_id).values()) for node_id in neighbours
+        ),
+    }
@@ -0,0 +1,137 @@
+"""
+# Propagation tracing for control-plane messages
+
+When enabled, every sibling and peer message sent by a device carries an
+optional `trace` entry with:
+
+ - `origin`: device that created the message (`{node}.{orientation}`)
+ - `sent`: monotonic time (ns) at which the origin sent the message
+ - `hop_sent`: monotonic time (ns) at which the last hop sent the message
+ - `hops`: number of hops the message has gone through so far
+
+Sibling broadcasts are relayed around the SPI ring, so each relay increases
+the hop count and refreshes `hop_sent`. Messages a device sends while
+handling a traced one, or in the critical section that follows it (where
+the routing cores send most updates), continue its trace the same way, so a
+trace follows an update across the whole network rather than restarting at
+every device that passes it on. If several traced messages arrive before
+the critical section, the last one is continued.
+
+Receivers record the end-to-end (`now - sent`) and per-hop (`now - hop_sent`)
+latencies in histograms keyed by `{kind}/{message id}`. These are reported in
+the device status and can be merged across the whole network (see
+`LatencyHistogram`).
+
+Latencies are computed with `time.monotonic_ns()`, which is shared by every
+process and container running on the same host.
+"""
+
+import contextlib
+import time
+
+from nodo.utils.histogram import LatencyHistogram
+
+TRACE_KEY = "trace"
+
+SIBLING = "sibling"
+PEER = "peer"
+
+
+class MessageStats:
+    def __init__(self):
+        self.end_to_end = LatencyHistogram()
+        self.per_hop = LatencyHistogram()
+        self.max_hops = 0
+
+    def json(self):
+        return {
+            "end_to_end": self.end_to_end.json(),
+            "per_hop": self.per_hop.json(),
+            "max_hops": self.max_hops,
+        }
+
+
+class Tracer:
+    def __init__(self, origin: str, enabled=False):
+        self.origin = origin
+        self.enabled = enabled
+        self.messages = {}
+        # Trace continued by the messages being sent, and of the last message
+        # handled, continued in the next critical section
+        self.current = None
+        self.pending = None
+
+    @staticmethod
+    def from_config(origin: str, config: dict):
+        return Tracer(origin, enabled=config.get("enabled", False))
+
+    def stamp(self, message: dict) -> dict:
+        """
+        Returns `message` with a trace context attached: the one of the
+        message being handled one hop further, if any, or a new one. Returns
+        `message` itself if tracing is disabled.
+        """
+        if not self.enabled:
+            return message
+        if self.current is not None:
+            return self.relay(message, self.current)
+
+        now = time.monotonic_ns()
+        return {
+            **message,
+            TRACE_KEY: {"origin": self.origin, "sent": now, "hop_sent": now, "hops": 0},
+        }
+
+    @staticmethod
+    def relay(message: dict, trace: dict) -> dict:
+        """
+        Returns `message` with the trace context updated for one more hop.
+        """
+        return {
+            **message,
+            TRACE_KEY: {
+                **trace,
+                "hop_sent": time.monotonic_ns(),
+                "hops": trace["hops"] + 1,
+            },
+        }
+
+    @contextlib.contextmanager
+    def _continuing(self, trace):
+        previous, self.current = self.current, trace
+        try:
+            yield
+        finally:
+            self.current = previous
+
+    def handling(self, trace):
+        """
+        Messages stamped inside this context, or inside the next
+        `critical_section`, continue `trace`.
+        """
+        if trace is not None:
+            self.pending = trace
+        return self._continuing(trace)
+
+    def critical_section(self):
+        """
+        Messages stamped inside this context continue the trace of the last
+        message handled before it.
+        """
+        trace, self.pending = self.pending, None
+        return self._continuing(trace)
+
+    def on_received(self, kind: str, message: dict, trace: dict):
+        now = time.monotonic_ns()
+        key = f"{kind}/{message.get('id')}"
+
+        stats = self.messages.get(key)
+        if stats is None:
+            stats = self.messages[key] = MessageStats()
+
+        stats.end_to_end.add((now - trace["sent"]) / 1e6)
+        stats.per_hop.add((now - trace["hop_sent"]) / 1e6)
+        stats.max_hops = max(stats.max_hops, trace["hops"] + 1)
+
+    def status(self):
+        return {key: stats.json() for key, stats in self.messages.items()}
@@ -0,0 +1,454 @@
+"""
+# Traffic generator and latency probe
+
+When `traffic.enabled` is set in the pysim config, the center device of home
+nodes and of the root wraps its tunnel interface with a `TrafficEndpoint`.
+Endpoints generate UDP flows into the mesh, as if the packets came from a
+host behind the tunnel, and take the probe packets addressed to them out of
+the tunnel before they reach the host:
+
+```json
+"traffic": {
+    "enabled": true,
+    "report_interval": 5,
+    "flows": [
+        {"from": "re", "to": "root", "rate_pps": 100, "size": 512},
+        {"from": "rs", "to": "re", "rate_pps": 10, "echo": false, "start": 30}
+    ]
+}
+```
+
+Each flow sends `size` bytes packets at `rate_pps` from node `from` to node
+`to`, starting `start` seconds after the device and for `duration` seconds
+(forever by default). Probes carry a sequence number and the time they were
+sent, so receivers report throughput, loss (sequence gaps) and one-way
+latency per flow. Unless `echo` is false, receivers bounce every probe back
+to measure the round trip time and the loss of each flow at its sender.
+
+Home endpoints use an address of the network provisioned to their node,
+and publish it in a shared directory so other nodes can reach them. Latencies
+are computed with `time.monotonic_ns()`, which is shared by every container
+running on the same host.
+
+Reports are published every `report_interval` seconds as `traffic_report`
+events.
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+
+from pysim_sdk.utils import log
+from pysim_sdk.utils.ip_address import ip2str
+
+from nodo.utils.histogram import LatencyHistogram
+from nodo.utils.interfaces import InterfaceProxy
+from nodo.utils.packets import (
+    IP_PROTO_UDP,
+    IPV4_HEADER,
+    UDP_HEADER,
+    Ipv4Packet,
+    build_udp,
+)
+
+TRAFFIC_UDP_PORT = 40000
+
+# Host used as traffic endpoint in the network of each home node
+ENDPOINT_HOST_ID = 100
+# Outside of the mesh networks, so it's routed towards the root
+ROOT_ENDPOINT_ADDRESS = "192.168.1.100"
+
+DEFAULT_REGISTRY_DIR = "/tmp/pysim/traffic"
+DEFAULT_REPORT_INTERVAL = 5.0
+DEFAULT_RATE_PPS = 10
+DEFAULT_SIZE = 256
+
+# Echoes not received after this long are counted as lost
+ECHO_TIMEOUT_NS = 2_000_000_000
+
+PROBE_MAGIC = b"I4AT"
+PROBE = struct.Struct("!4sBHIQQ")
+PROBE_DATA = 0
+PROBE_PING = 1
+PROBE_PONG = 2
+
+MIN_SIZE = IPV4_HEADER.size + UDP_HEADER.size + PROBE.size
+
+FLOW_KEYS = ("from", "to", "rate_pps", "size", "echo", "start", "duration")
+
+
+def latency_summary(histogram: LatencyHistogram):
+    summary = histogram.json()
+    return {
+        key: summary[key]
+        for key in ("count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+    }
+
+
+class Flow:
+    """
+    Sending side of a flow.
+    """
+
+    def __init__(
+        self,
+        flow_id: int,
+        dst: str,
+        rate_pps=DEFAULT_RATE_PPS,
+        size=DEFAULT_SIZE,
+        echo=True,
+        start=0.0,
+        duration=None,
+    ):
+        self.id = flow_id
+        self.dst = dst
+        self.period = 1 / rate_pps
+        self.rate_pps = rate_pps
+        self.size = max(size, MIN_SIZE)
+        self.echo = echo
+        self.start = start
+        self.duration = duration
+
+        self.dst_address = None
+        self.next_send = None
+        self.seq = 0
+        self.sent = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.echoed = 0
+        self.lost = 0
+        self.outstanding = {}
+        self.rtt = LatencyHistogram()
+
+    @staticmethod
+    def from_config(flow_id: int, config: dict):
+        """
+        Builds a flow from its `traffic.flows` entry, raising `ValueError` if
+        it isn't valid.
+        """
+        if not isinstance(config, dict):
+            raise ValueError("traffic flow must be an object")
+
+        unknown = set(config) - set(FLOW_KEYS)
+        if unknown:
+            raise ValueError(f"unknown traffic flow keys {sorted(unknown)}")
+        if "from" not in config or "to" not in config:
+            raise ValueError("traffic flow needs from and to")
+
+        rate_pps = config.get("rate_pps", DEFAULT_RATE_PPS)
+        size = config.get("size", DEFAULT_SIZE)
+        start = config.get("start", 0.0)
+        duration = config.get("duration")
+        for name, value in (
+            ("rate_pps", rate_pps),
+            ("size", size),
+            ("start", start),
+            ("duration", duration),
+        ):
+            if name == "duration" and value is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"traffic flow {name} must be a number")
+        if rate_pps <= 0:
+            raise ValueError("traffic flow rate_pps must be positive")
+        if size <= 0:
+            raise ValueError("traffic flow size must be positive")
+        if start < 0:
+            raise ValueError("traffic flow start can't be negative")
+        if duration is not None and duration <= 0:
+            raise ValueError("traffic flow duration must be positive")
+
+        return Flow(
+            flow_id,
+            config["to"],
+            rate_pps=rate_pps,
+            size=size,
+            echo=config.get("echo", True),
+            start=start,
+            duration=duration,
+        )
+
+    def is_active(self, elapsed: float) -> bool:
+        if elapsed < self.start:
+            return False
+        return self.duration is None or elapsed < self.start + self.duration
+
+    def on_echo(self, seq: int, now_ns: int):
+        sent_ns = self.outstanding.pop(seq, None)
+        if sent_ns is not None:
+            self.echoed += 1
+            self.rtt.add((now_ns - sent_ns) / 1e6)
+
+    def expire(self, now_ns: int):
+        expired = [
+            seq
+            for seq, sent_ns in self.outstanding.items()
+            if now_ns - sent_ns > ECHO_TIMEOUT_NS
+        ]
+        for seq in expired:
+            del self.outstanding[seq]
+        self.lost += len(expired)
+
+    def json(self, name: str):
+        result = {
+            "flow": f"{name}->{self.dst}",
+            "dst": self.dst_address,
+            "rate_pps": self.rate_pps,
+            "size": self.size,
+            "sent": self.sent,
+            "bytes_sent": self.bytes_sent,
+            "dropped": self.dropped,
+        }
+        if self.echo:
+            answered = self.echoed + self.lost
+            result.update(
+                {
+                    "echoed": self.echoed,
+                    "lost": self.lost,
+                    "loss": round(self.lost / answered, 4) if answered else None,
+                    "rtt": latency_summary(self.rtt),
+                }
+            )
+        return result
+
+
+class FlowReceiver:
+    """
+    Receiving side of a flow, identified by its source address and id.
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.bytes = 0
+        self.max_seq = -1
+        self.first_ns = None
+        self.last_ns = None
+        self.one_way = LatencyHistogram()
+
+    def on_probe(self, seq: int, size: int, sent_ns: int, now_ns: int):
+        self.received += 1
+        self.bytes += size
+        self.max_seq = max(self.max_seq, seq)
+        self.first_ns = self.first_ns or now_ns
+        self.last_ns = now_ns
+        self.one_way.add((now_ns - sent_ns) / 1e6)
+
+    def json(self, src: str, flow_id: int):
+        elapsed_s = (self.last_ns - self.first_ns) / 1e9 if self.first_ns else 0
+        expected = self.max_seq + 1
+        return {
+            "src": src,
+            "flow": flow_id,
+            "received": self.received,
+            "bytes": self.bytes,
+            "lost": max(expected - self.received, 0),
+            "loss": round(1 - self.received / expected, 4) if expected else None,
+            "throughput_kbps": (
+                round(self.bytes * 8 / elapsed_s / 1000, 2) if elapsed_s else None
+            ),
+            "one_way": latency_summary(self.one_way),
+        }
+
+
+class TrafficEndpoint(InterfaceProxy):
+    """
+    Wraps the tunnel interface of a home or root center device.
+    """
+
+    def __init__(
+        self,
+        interface,
+        name: str,
+        sink,
+        flows=(),
+        address=None,
+        report_interval=DEFAULT_REPORT_INTERVAL,
+        registry_dir=DEFAULT_REGISTRY_DIR,
+    ):
+        super().__init__(interface)
+        self.node_name = name
+        self.sink = sink
+        self.flows = {flow.id: flow for flow in flows}
+        self.address = None
+        self.report_interval = report_interval
+        self.registry_dir = registry_dir
+        self.receivers = {}
+        self.lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        if address is not None:
+            self._set_address(address)
+
+    @staticmethod
+    def from_config(interface, name: str, sink, config: dict, address=None):
+        flows = [
+            Flow.from_config(i, flow)
+            for i, flow in enumerate(config.get("flows", []))
+            if flow["from"] == name
+        ]
+        return TrafficEndpoint(
+            interface,
+            name,
+            sink,
+            flows,
+            address=address,
+            report_interval=config.get("report_interval", DEFAULT_REPORT_INTERVAL),
+            registry_dir=config.get("registry_dir", DEFAULT_REGISTRY_DIR),
+        )
+
+    def enable_ap_mode(self, network: int, mask: int):
+        self.interface.enable_ap_mode(network, mask)
+        self._set_address(ip2str(network | ENDPOINT_HOST_ID))
+
+    def _set_address(self, address: str):
+        self.address = address
+
+        os.makedirs(self.registry_dir, exist_ok=True)
+        path = os.path.join(self.registry_dir, f"{self.node_name}.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({"address": address}, f)
+        os.replace(f"{path}.tmp", path)
+        log.info(f"[TRAFFIC] Endpoint {self.node_name} at {address}")
+
+    def _resolve(self, name: str):
+        try:
+            with open(os.path.join(self.registry_dir, f"{name}.json")) as f:
+                return json.load(f)["address"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def send_packet(self, packet: bytes):
+        probe = self._parse_probe(packet)
+        if probe is None:
+            return self.interface.send_packet(packet)
+
+        self._on_probe(*probe)
+
+    @staticmethod
+    def _parse_probe(packet: bytes):
+        if len(packet) < MIN_SIZE or packet[9] != IP_PROTO_UDP:
+            return None
+
+        ip = Ipv4Packet(packet)
+        if ip.udp_dport() != TRAFFIC_UDP_PORT:
+            return None
+
+        payload = ip.udp_payload()
+        if not payload.startswith(PROBE_MAGIC):
+            return None
+        return ip, PROBE.unpack_from(payload)
+
+    def _on_probe(self, ip, probe):
+        _, kind, flow_id, seq, sent_ns, _ = probe
+        now_ns = time.monotonic_ns()
+
+        with self.lock:
+            if kind == PROBE_PONG:
+                if flow := self.flows.get(flow_id):
+                    flow.on_echo(seq, now_ns)
+                return
+
+            receiver = self.receivers.get((ip.src, flow_id))
+            if receiver is None:
+                receiver = self.receivers[(ip.src, flow_id)] = FlowReceiver()
+            receiver.on_probe(seq, ip.total_len, sent_ns, now_ns)
+
+        if kind == PROBE_PING:
+            self._inject(
+                ip.src,
+                PROBE.pack(PROBE_MAGIC, PROBE_PONG, flow_id, seq, sent_ns, now_ns),
+                ip.total_len,
+            )
+
+    def _inject(self, dst: str, probe: bytes, size: int) -> bool:
+        padding = bytes(max(size - MIN_SIZE, 0))
+        packet = build_udp(
+            self.address, dst, TRAFFIC_UDP_PORT, TRAFFIC_UDP_PORT, probe + padding
+        )
+        # Same path as packets coming from the host behind the tunnel
+        return self.sink.put((self, "packet-received", packet)) is not False
+
+    def _send(self, flow: Flow):
+        now_ns = time.monotonic_ns()
+        kind = PROBE_PING if flow.echo else PROBE_DATA
+
+        with self.lock:
+            seq = flow.seq
+            flow.seq += 1
+            if flow.echo:
+                flow.outstanding[seq] = now_ns
+
+        probe = PROBE.pack(PROBE_MAGIC, kind, flow.id, seq, now_ns, 0)
+        sent = self._inject(flow.dst_address, probe, flow.size)
+
+        with self.lock:
+            if sent:
+                flow.sent += 1
+                flow.bytes_sent += flow.size
+            else:
+                flow.dropped += 1
+                flow.outstanding.pop(seq, None)
+
+    def start(self, pysim):
+        self._thread = threading.Thread(
+            target=self._run, args=(pysim,), name="traffic", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _resolve_flows(self):
+        for flow in self.flows.values():
+            flow.dst_address = self._resolve(flow.dst) or flow.dst_address
+
+    def _run(self, pysim):
+        started = time.monotonic()
+        next_report = started + self.report_interval
+        self._resolve_flows()
+
+        while not self._stopped.is_set():
+            now = time.monotonic()
+            next_wakeup = next_report
+
+            for flow in self.flows.values():
+                if (
+                    self.address is None
+                    or flow.dst_address is None
+                    or not flow.is_active(now - started)
+                ):
+                    flow.next_send = None
+                    continue
+
+                # Don't burst to catch up after a pause
+                if flow.next_send is None or now - flow.next_send > 1.0:
+                    flow.next_send = now
+                while flow.next_send <= now:
+                    self._send(flow)
+                    flow.next_send += flow.period
+                next_wakeup = min(next_wakeup, flow.next_send)
+
+            if now >= next_report:
+                next_report = now + self.report_interval
+                self._resolve_flows()
+                pysim.event("traffic_report", **self.status())
+
+            self._stopped.wait(max(next_wakeup - time.monotonic(), 0))
+
+    def status(self):
+        now_ns = time.monotonic_ns()
+        with self.lock:
+            for flow in self.flows.values():
+                flow.expire(now_ns)
+
+            return {
+                "address": self.address,
+                "flows": [flow.json(self.node_name) for flow in self.flows.values()],
+                "received": [
+                    receiver.json(src, flow_id)
+                    for (src, flow_id), receiver in self.receivers.items()
+                ],
+            }
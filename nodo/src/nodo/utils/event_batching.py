@@ -0,0 +1,166 @@
+"""
+Batching of the events published to the QEMU firmware.
+
+Every packet received by a QEMU device is published to the firmware as a
+separate event. Once the firmware opts in (command `0x20` with the maximum
+number of packets it accepts per batch, 0 to opt out), packets arriving
+within `window_us` of each other are published as a single event:
+
+    count (u16) | event (u8) | length (u16) | payload | event | length | ...
+
+(little endian, like every other QEMU command). A batch is published when
+it holds `max_batch` packets (at most 65535), when the next packet would
+take it over `max_bytes` bytes, or `window_us` after its first packet.
+Batches of a single packet are published as a plain event.
+Link events are never batched, and flush the pending batch first so the
+firmware sees events in order.
+"""
+
+import struct
+import threading
+import time
+
+BATCH_EVENT = 0x10
+
+DEFAULT_WINDOW_US = 200
+DEFAULT_MAX_BYTES = 8 * 1024
+
+BATCH_HEADER = struct.Struct("<H")
+ENTRY_HEADER = struct.Struct("<BH")
+# Largest count of the batch header
+MAX_BATCH = 0xFFFF
+
+
+def pack_events(events) -> bytes:
+    parts = [BATCH_HEADER.pack(len(events))]
+    for event_id, payload in events:
+        parts.append(ENTRY_HEADER.pack(event_id, len(payload)))
+        parts.append(payload)
+    return b"".join(parts)
+
+
+class EventPublisher:
+    """
+    Publishes events to the firmware through `handler.publish_event`,
+    batching packets while the firmware accepts it.
+    """
+
+    def __init__(
+        self,
+        handler,
+        window_us=DEFAULT_WINDOW_US,
+        max_bytes=DEFAULT_MAX_BYTES,
+        allowed=True,
+    ):
+        self.handler = handler
+        self.window_ns = window_us * 1000
+        self.max_bytes = max_bytes
+        self.allowed = allowed
+        self.max_batch = 0
+
+        self.cv = threading.Condition()
+        self.pending = []
+        self.pending_bytes = 0
+        self.oldest_ns = 0
+        self.thread = None
+
+        self.events = 0
+        self.publishes = 0
+        self.batches = 0
+        self.largest_batch = 0
+
+    @staticmethod
+    def from_config(handler, config: dict):
+        return EventPublisher(
+            handler,
+            window_us=config.get("window_us", DEFAULT_WINDOW_US),
+            max_bytes=config.get("max_bytes", DEFAULT_MAX_BYTES),
+            allowed=config.get("enabled", True),
+        )
+
+    def set_max_batch(self, max_batch: int):
+        """
+        Called when the firmware opts in (`max_batch` > 1) or out of batches.
+        """
+        with self.cv:
+            self.max_batch = min(max_batch, MAX_BATCH) if self.allowed else 0
+            if self.max_batch > 1 and self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._run, name="qemu-events", daemon=True
+                )
+                self.thread.start()
+            if self.max_batch <= 1:
+                self._flush()
+        return self.max_batch
+
+    def publish(self, event_id: int, payload: bytes = None):
+        with self.cv:
+            self.events += 1
+
+            if payload is None or self.max_batch <= 1:
+                self._flush()
+                self._publish(event_id, payload)
+                return
+
+            entry_bytes = ENTRY_HEADER.size + len(payload)
+            if self.pending and self.pending_bytes + entry_bytes > self.max_bytes:
+                self._flush()
+
+            if not self.pending:
+                self.oldest_ns = time.monotonic_ns()
+                self.pending_bytes = BATCH_HEADER.size
+                self.cv.notify()
+            self.pending.append((event_id, payload))
+            self.pending_bytes += entry_bytes
+
+            if (
+                len(self.pending) >= self.max_batch
+                or self.pending_bytes >= self.max_bytes
+            ):
+                self._flush()
+
+    def _publish(self, event_id, payload=None):
+        self.publishes += 1
+        if payload is None:
+            self.handler.publish_event(event_id)
+        else:
+            self.handler.publish_event(event_id, payload)
+
+    def _flush(self):
+        # Called with `self.cv` held
+        if not self.pending:
+            return
+
+        pending, self.pending = self.pending, []
+        self.pending_bytes = 0
+
+        if len(pending) == 1:
+            self._publish(*pending[0])
+            return
+
+        self._publish(BATCH_EVENT, pack_events(pending))
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(pending))
+
+    def _run(self):
+        with self.cv:
+            while True:
+                if not self.pending:
+                    self.cv.wait()
+                    continue
+
+                timeout = (self.oldest_ns + self.window_ns - time.monotonic_ns()) / 1e9
+                if timeout > 0:
+                    self.cv.wait(timeout)
+                    continue
+
+                self._flush()
+
+    def status(self):
+        return {
+            "batching": self.max_batch > 1,
+            "events": self.events,
+            "published": self.publishes,
+            "batches": self.batches,
+            "maxBatch": self.largest_batch,
+        }
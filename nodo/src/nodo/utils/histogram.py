@@ -0,0 +1,99 @@
+import bisect
+
+# Upper bounds (in milliseconds) of the latency histogram buckets. An extra
+# bucket after the last bound holds everything slower than that.
+LATENCY_BUCKETS_MS = (
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    25,
+    50,
+    100,
+    250,
+    500,
+    1000,
+    2500,
+    5000,
+    10000,
+    30000,
+)
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram.
+
+    Histograms with the same bounds can be merged by adding their bucket
+    counts, which allows aggregating the latencies measured by every device
+    of the network without shipping individual samples around.
+    """
+
+    def __init__(self, bounds_ms=LATENCY_BUCKETS_MS):
+        self.bounds_ms = tuple(bounds_ms)
+        self.counts = [0] * (len(self.bounds_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    @staticmethod
+    def from_json(data: dict):
+        histogram = LatencyHistogram(data["bounds_ms"])
+        histogram.counts = list(data["buckets"])
+        histogram.count = data["count"]
+        histogram.total_ms = data["total_ms"]
+        histogram.max_ms = data["max_ms"]
+        return histogram
+
+    def add(self, latency_ms: float):
+        self.counts[bisect.bisect_left(self.bounds_ms, latency_ms)] += 1
+        self.count += 1
+        self.total_ms += latency_ms
+        if latency_ms > self.max_ms:
+            self.max_ms = latency_ms
+
+    def merge(self, other):
+        if other.bounds_ms != self.bounds_ms:
+            raise ValueError("Cannot merge histograms with different buckets")
+
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, p: float):
+        """
+        Returns the upper bound of the bucket holding the `p` percentile. For
+        the last (unbounded) bucket, the maximum latency seen is returned.
+        """
+        if not self.count:
+            return None
+
+        target = self.count * p / 100
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                if i < len(self.bounds_ms):
+                    return min(self.bounds_ms[i], self.max_ms)
+                return self.max_ms
+
+        return self.max_ms
+
+    def json(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "bounds_ms": list(self.bounds_ms),
+            "buckets": list(self.counts),
+        }
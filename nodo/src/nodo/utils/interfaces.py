@@ -0,0 +1,28 @@
+class InterfaceProxy:
+    """
+    Base class for layers wrapping a network interface (SPI or WLAN).
+
+    Everything that isn't overridden by a subclass is delegated to the
+    wrapped interface, including its use as a context manager.
+    """
+
+    def __init__(self, interface):
+        self.interface = interface
+
+    def send_packet(self, packet: bytes):
+        return self.interface.send_packet(packet)
+
+    def __getattr__(self, name):
+        if name.startswith("__") or "interface" not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.interface, name)
+
+    def __enter__(self):
+        self.interface.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        return self.interface.__exit__(*args)
+
+    def __str__(self):
+        return str(self.interface)
@@ -0,0 +1,363 @@
+"""
+Emulation of radio links on top of the WLAN interfaces.
+
+A link profile describes one WLAN link, set per station in the network file
+(see `config/networks/config.md`):
+
+    "re": {
+      "links": {"w": "root.e"},
+      "link_emulation": {
+        "w": {
+          "rate_kbps": 2000,
+          "burst_bytes": 3000,
+          "queue_ms": 100,
+          "delay_ms": 5,
+          "jitter_ms": 2,
+          "loss": {"p": 0.01, "r": 0.3, "good": 0.0, "bad": 0.5}
+        }
+      }
+    }
+
+Each direction of the link gets its own `LinkShaper`: a token bucket of
+`rate_kbps` with `burst_bytes` of depth, whose backlog is tail-dropped once
+it holds more than `queue_ms` of traffic, followed by the loss model and a
+fixed `delay_ms` plus a random `jitter_ms`. Packets are delivered in order.
+`loss` is either the probability of losing each packet (Bernoulli) or the
+parameters of a Gilbert-Elliott channel: `p` and `r` are the probabilities
+of moving to the bad and back to the good state, `good` and `bad` the loss
+probability in each state.
+
+Shapers only compute delivery times, so the same profile runs on wall-clock
+time in the containers (`EmulatedInterface` and `EmulatedSink`) and on
+virtual time in the simulator.
+"""
+
+import copy
+import heapq
+import random
+import threading
+import time
+
+from nodo.utils.interfaces import InterfaceProxy
+
+DEFAULT_BURST_BYTES = 1500
+DEFAULT_QUEUE_MS = 100.0
+
+PROFILE_KEYS = ("rate_kbps", "burst_bytes", "queue_ms", "delay_ms", "jitter_ms")
+GILBERT_ELLIOTT_KEYS = ("p", "r", "good", "bad")
+
+
+def _probability(value, name: str) -> float:
+    if not isinstance(value, (int, float)) or not 0 <= value <= 1:
+        raise ValueError(f"{name} must be a probability between 0 and 1")
+    return float(value)
+
+
+class BernoulliLoss:
+    def __init__(self, probability: float):
+        self.probability = _probability(probability, "loss")
+
+    def lost(self, rng) -> bool:
+        return rng.random() < self.probability
+
+    def json(self):
+        return {"model": "bernoulli", "probability": self.probability}
+
+
+class GilbertElliottLoss:
+    """
+    Two-state Markov channel, losses come in bursts while in the bad state.
+    """
+
+    def __init__(self, p: float, r: float, good=0.0, bad=1.0):
+        self.p = _probability(p, "loss.p")
+        self.r = _probability(r, "loss.r")
+        self.good = _probability(good, "loss.good")
+        self.bad = _probability(bad, "loss.bad")
+        self.is_bad = False
+
+    def lost(self, rng) -> bool:
+        if self.is_bad:
+            self.is_bad = rng.random() >= self.r
+        else:
+            self.is_bad = rng.random() < self.p
+        return rng.random() < (self.bad if self.is_bad else self.good)
+
+    def json(self):
+        return {
+            "model": "gilbert-elliott",
+            "p": self.p,
+            "r": self.r,
+            "good": self.good,
+            "bad": self.bad,
+        }
+
+
+class LinkProfile:
+    def __init__(
+        self,
+        rate_kbps=None,
+        burst_bytes=DEFAULT_BURST_BYTES,
+        queue_ms=DEFAULT_QUEUE_MS,
+        delay_ms=0.0,
+        jitter_ms=0.0,
+        loss=None,
+    ):
+        for name, value in (
+            ("rate_kbps", rate_kbps),
+            ("burst_bytes", burst_bytes),
+            ("queue_ms", queue_ms),
+            ("delay_ms", delay_ms),
+            ("jitter_ms", jitter_ms),
+        ):
+            if value is not None and (not isinstance(value, (int, float)) or value < 0):
+                raise ValueError(f"{name} must be a non-negative number")
+        if rate_kbps == 0:
+            raise ValueError("rate_kbps must be positive")
+
+        self.rate_kbps = rate_kbps
+        self.burst_bytes = burst_bytes
+        self.queue_ms = queue_ms
+        self.delay_ms = delay_ms
+        self.jitter_ms = jitter_ms
+        self.loss = loss
+
+    @staticmethod
+    def from_config(config: dict):
+        """
+        Builds a profile from its network file entry, raising `ValueError` if
+        it isn't valid.
+        """
+        if not isinstance(config, dict):
+            raise ValueError("link profile must be an object")
+
+        unknown = set(config) - set(PROFILE_KEYS) - {"loss"}
+        if unknown:
+            raise ValueError(f"unknown link profile keys {sorted(unknown)}")
+
+        loss = config.get("loss")
+        if isinstance(loss, dict):
+            unknown = set(loss) - set(GILBERT_ELLIOTT_KEYS)
+            if unknown or "p" not in loss or "r" not in loss:
+                raise ValueError(
+                    "Gilbert-Elliott loss needs p and r, and optionally good and bad"
+                )
+            loss = GilbertElliottLoss(**loss)
+        elif loss:
+            loss = BernoulliLoss(loss)
+        else:
+            loss = None
+
+        return LinkProfile(
+            **{key: config[key] for key in PROFILE_KEYS if key in config}, loss=loss
+        )
+
+    def json(self):
+        return {
+            "rate_kbps": self.rate_kbps,
+            "burst_bytes": self.burst_bytes,
+            "queue_ms": self.queue_ms,
+            "delay_ms": self.delay_ms,
+            "jitter_ms": self.jitter_ms,
+            "loss": self.loss and self.loss.json(),
+        }
+
+
+class LinkShaper:
+    """
+    One direction of an emulated link. `transmit` returns when a packet sent
+    at `now` (in seconds) is delivered, or `None` if it's lost.
+    """
+
+    def __init__(self, profile: LinkProfile, rng=None):
+        self.rng = rng or random.Random()
+        self.delay = profile.delay_ms / 1000
+        self.jitter = profile.jitter_ms / 1000
+        # Every direction keeps the state of its own channel
+        self.loss = copy.copy(profile.loss)
+
+        # Token bucket in bytes, tokens go negative while packets are queued
+        self.rate = profile.rate_kbps and profile.rate_kbps * 1000 / 8
+        self.burst = profile.burst_bytes
+        self.max_backlog = self.rate and self.rate * profile.queue_ms / 1000
+        self.tokens = self.burst
+        self.last_refill = None
+        self.last_delivery = 0.0
+
+        self.packets = 0
+        self.bytes = 0
+        self.lost = 0
+        self.queue_dropped = 0
+
+    def transmit(self, now: float, size: int):
+        self.packets += 1
+        departure = now
+
+        if self.rate:
+            if self.last_refill is not None:
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.last_refill) * self.rate
+                )
+            self.last_refill = now
+
+            if self.tokens - size < -self.max_backlog:
+                self.queue_dropped += 1
+                return None
+
+            self.tokens -= size
+            if self.tokens < 0:
+                departure += -self.tokens / self.rate
+
+        # Lost packets still took their time on the air
+        if self.loss is not None and self.loss.lost(self.rng):
+            self.lost += 1
+            return None
+
+        delivery = departure + self.delay
+        if self.jitter:
+            delivery += self.rng.uniform(0, self.jitter)
+
+        # Packets never overtake each other on the same link
+        delivery = max(delivery, self.last_delivery)
+        self.last_delivery = delivery
+        self.bytes += size
+        return delivery
+
+    def status(self):
+        return {
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "lost": self.lost,
+            "queueDropped": self.queue_dropped,
+        }
+
+
+class DelayLine:
+    """
+    Runs callbacks at a given `time.monotonic()` instant on a background
+    thread. Callbacks due right away run on the calling thread, unless
+    earlier ones are still pending or running, to keep them in order.
+    """
+
+    def __init__(self, name="link-emulation"):
+        self.name = name
+        self.cv = threading.Condition()
+        self.pending = []
+        self.seq = 0
+        self.thread = None
+        # Whether the thread popped a callback and is still running it
+        self.running = False
+
+    def call_at(self, when: float, callback, *args):
+        with self.cv:
+            due = when <= time.monotonic() and not self.pending and not self.running
+            if not due:
+                heapq.heappush(self.pending, (when, self.seq, callback, args))
+                self.seq += 1
+                if self.thread is None:
+                    self.thread = threading.Thread(
+                        target=self._run, name=self.name, daemon=True
+                    )
+                    self.thread.start()
+                self.cv.notify()
+
+        if due:
+            callback(*args)
+
+    def _run(self):
+        while True:
+            with self.cv:
+                while not self.pending:
+                    self.cv.wait()
+
+                when, _, callback, args = self.pending[0]
+                timeout = when - time.monotonic()
+                if timeout > 0:
+                    self.cv.wait(timeout)
+                    continue
+                heapq.heappop(self.pending)
+                self.running = True
+
+            try:
+                callback(*args)
+            finally:
+                with self.cv:
+                    self.running = False
+
+
+class EmulatedLink:
+    """
+    Both directions of a link, emulated on the station side: packets sent by
+    the station go through `uplink` and packets it receives through
+    `downlink`.
+    """
+
+    def __init__(self, profile: LinkProfile, rng=None):
+        rng = rng or random.Random()
+        self.profile = profile
+        self.uplink = LinkShaper(profile, rng)
+        self.downlink = LinkShaper(profile, rng)
+        self.delay_line = DelayLine()
+
+    def wrap(self, interface_ctor, sink):
+        """
+        Returns the interface built by `interface_ctor(sink)` with its sent
+        and received packets shaped.
+        """
+        return EmulatedInterface(interface_ctor(EmulatedSink(sink, self)), self)
+
+    def status(self):
+        return {
+            "profile": self.profile.json(),
+            "uplink": self.uplink.status(),
+            "downlink": self.downlink.status(),
+        }
+
+
+class EmulatedSink:
+    """
+    Events sink that shapes the packets received by an interface before
+    passing them on. Link events are passed on right away.
+    """
+
+    def __init__(self, sink, link: EmulatedLink):
+        self.sink = sink
+        self.link = link
+
+    def put(self, event):
+        if event is None or event[1] != "packet-received":
+            return self.sink.put(event)
+
+        delivery = self.link.downlink.transmit(time.monotonic(), len(event[2]))
+        if delivery is not None:
+            self.link.delay_line.call_at(delivery, self.sink.put, event)
+        return True
+
+    def __getattr__(self, name):
+        if name.startswith("__") or "sink" not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.sink, name)
+
+
+class EmulatedInterface(InterfaceProxy):
+    """
+    Interface whose sent packets are shaped. Delayed packets are sent from
+    the delay line thread, so sends to the interface are serialised.
+    """
+
+    def __init__(self, interface, link: EmulatedLink):
+        super().__init__(interface)
+        self.link = link
+        self.send_lock = threading.Lock()
+
+    def _send(self, packet: bytes):
+        with self.send_lock:
+            self.interface.send_packet(packet)
+
+    def send_packet(self, packet: bytes):
+        delivery = self.link.uplink.transmit(time.monotonic(), len(packet))
+        if delivery is not None:
+            self.link.delay_line.call_at(delivery, self._send, packet)
+
+    def status(self):
+        return {**self.interface.status(), "emulation": self.link.status()}
@@ -0,0 +1,241 @@
+"""
+Subset of the BPF (tcpdump) filter language, compiled to a Python predicate
+over raw packets.
+
+Supported primitives, combined with `and`/`&&`, `or`/`||`, `not`/`!` and
+parentheses:
+
+ - `ip`, `icmp`, `udp`, `tcp`, optionally followed by a port primitive
+   (`udp dst port 53`)
+ - `[src|dst] host ADDRESS`
+ - `[src|dst] net ADDRESS/PREFIX`
+ - `[src|dst] port PORT` (UDP and TCP)
+ - `less LENGTH`, `greater LENGTH`, `len {<,<=,>,>=,=,!=} LENGTH`
+
+As in tcpdump, `and` binds tighter than `or`. Ethernet frames are matched on
+their IPv4 payload; frames carrying anything else only match `len`, `less`,
+`greater` and negations.
+"""
+
+import operator
+import re
+
+from pysim_sdk.utils.ip_address import str2ip
+
+from nodo.utils.packets import IP_PROTO_ICMP, IP_PROTO_UDP
+
+IP_PROTO_TCP = 6
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERNET_HEADER_LEN = 14
+
+PROTOCOLS = {"icmp": IP_PROTO_ICMP, "udp": IP_PROTO_UDP, "tcp": IP_PROTO_TCP}
+
+COMPARISONS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "=": operator.eq,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+TOKEN = re.compile(r"\s*(&&|\|\||<=|>=|==|!=|[()!<>=]|[^\s()!<>=&|]+)")
+
+
+def ipv4_of(packet: bytes, ethernet=False):
+    """
+    Returns the IPv4 packet in `packet` (a raw IPv4 packet or an Ethernet
+    frame), or `None` if there is none.
+    """
+    if ethernet:
+        if (
+            len(packet) < ETHERNET_HEADER_LEN + 20
+            or int.from_bytes(packet[12:14], "big") != ETHERTYPE_IPV4
+        ):
+            return None
+        packet = packet[ETHERNET_HEADER_LEN:]
+    elif len(packet) < 20:
+        return None
+
+    if packet[0] >> 4 != 4:
+        return None
+    return packet
+
+
+def _addresses(direction):
+    if direction == "src":
+        return (slice(12, 16),)
+    if direction == "dst":
+        return (slice(16, 20),)
+    return (slice(12, 16), slice(16, 20))
+
+
+def _ports(direction):
+    if direction == "src":
+        return (0,)
+    if direction == "dst":
+        return (2,)
+    return (0, 2)
+
+
+class FilterParser:
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.tokens = self._tokenize(expression)
+        self.position = 0
+
+    @staticmethod
+    def _tokenize(expression: str):
+        tokens = []
+        position = 0
+        expression = expression.strip()
+        while position < len(expression):
+            match = TOKEN.match(expression, position)
+            if match is None:
+                raise ValueError(f"Invalid filter {expression!r}")
+            tokens.append(match.group(1).lower())
+            position = match.end()
+        return tokens
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _next(self, what="an expression"):
+        token = self._peek()
+        if token is None:
+            raise ValueError(f"Invalid filter {self.expression!r}: expected {what}")
+        self.position += 1
+        return token
+
+    def parse(self):
+        predicate = self._or()
+        if self._peek() is not None:
+            raise ValueError(
+                f"Invalid filter {self.expression!r}: unexpected {self._peek()!r}"
+            )
+        return predicate
+
+    def _or(self):
+        terms = [self._and()]
+        while self._peek() in ("or", "||"):
+            self.position += 1
+            terms.append(self._and())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda ip, length: any(term(ip, length) for term in terms)
+
+    def _and(self):
+        terms = [self._not()]
+        while self._peek() in ("and", "&&"):
+            self.position += 1
+            terms.append(self._not())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda ip, length: all(term(ip, length) for term in terms)
+
+    def _not(self):
+        if self._peek() in ("not", "!"):
+            self.position += 1
+            term = self._not()
+            return lambda ip, length: not term(ip, length)
+
+        if self._peek() == "(":
+            self.position += 1
+            term = self._or()
+            if self._next("')'") != ")":
+                raise ValueError(f"Invalid filter {self.expression!r}: expected ')'")
+            return term
+
+        return self._primitive()
+
+    def _number(self, what: str) -> int:
+        token = self._next(what)
+        if not token.isdigit():
+            raise ValueError(
+                f"Invalid filter {self.expression!r}: bad {what} {token!r}"
+            )
+        return int(token)
+
+    def _primitive(self):
+        token = self._next()
+
+        if token == "ip":
+            return lambda ip, length: ip is not None
+
+        if token in PROTOCOLS:
+            protocol = PROTOCOLS[token]
+            is_protocol = lambda ip, length: ip is not None and ip[9] == protocol
+            # `udp port 53`, `tcp dst port 80`
+            if self._peek() not in ("port", "src", "dst"):
+                return is_protocol
+            ports = self._primitive()
+            return lambda ip, length: is_protocol(ip, length) and ports(ip, length)
+
+        if token in ("less", "greater"):
+            limit = self._number("length")
+            if token == "less":
+                return lambda ip, length: length <= limit
+            return lambda ip, length: length >= limit
+
+        if token == "len":
+            comparison = COMPARISONS.get(self._next("a comparison"))
+            if comparison is None:
+                raise ValueError(
+                    f"Invalid filter {self.expression!r}: expected a comparison"
+                )
+            limit = self._number("length")
+            return lambda ip, length: comparison(length, limit)
+
+        direction = None
+        if token in ("src", "dst"):
+            direction, token = token, self._next("host, net or port")
+
+        if token == "host":
+            address = str2ip(self._next("an address")).to_bytes(4, "big")
+            fields = _addresses(direction)
+            return lambda ip, length: ip is not None and any(
+                ip[field] == address for field in fields
+            )
+
+        if token == "net":
+            network, _, prefix_len = self._next("a network").partition("/")
+            prefix_len = int(prefix_len or 32)
+            mask = (0xFFFFFFFF << (32 - prefix_len)) & 0xFFFFFFFF
+            network = str2ip(network) & mask
+            fields = _addresses(direction)
+            return lambda ip, length: ip is not None and any(
+                int.from_bytes(ip[field], "big") & mask == network for field in fields
+            )
+
+        if token == "port":
+            port = self._number("port")
+            offsets = _ports(direction)
+
+            def match_port(ip, length):
+                if ip is None or ip[9] not in (IP_PROTO_UDP, IP_PROTO_TCP):
+                    return False
+                header_len = (ip[0] & 0x0F) * 4
+                return any(
+                    int.from_bytes(ip[header_len + o : header_len + o + 2], "big")
+                    == port
+                    for o in offsets
+                )
+
+            return match_port
+
+        raise ValueError(f"Invalid filter {self.expression!r}: unknown {token!r}")
+
+
+def compile_filter(expression: str, ethernet=False):
+    """
+    Returns a function telling whether a packet matches `expression`, or
+    `None` if the expression is empty. Raises `ValueError` if the expression
+    isn't valid.
+    """
+    if not expression or not expression.strip():
+        return None
+
+    predicate = FilterParser(expression).parse()
+    return lambda packet: predicate(ipv4_of(packet, ethernet), len(packet))
@@ -0,0 +1,270 @@
+"""
+Sampled packet summaries and I/O latency of the QEMU devices.
+
+Answering a QEMU command must be fast, as the emulated firmware waits for the
+response. Handlers only decide whether a packet is sampled and queue it; a
+background thread formats the summary and sends the pysim event:
+
+    "packet_summaries": {
+      "sample_every": 100,
+      "max_per_second": 10,
+      "format": "header"
+    }
+
+A packet is summarized if it's one of every `sample_every` packets of its
+event and fewer than `max_per_second` packets of that event were summarized
+in the current second (0 disables either condition; both 0, the default,
+disables summaries). `format` is either `header`, a one-line summary of the
+Ethernet and IPv4 headers, or `scapy` for the full scapy dissection, which
+is much slower.
+
+The same thread periodically reports the latency of the emulated I/O
+operations as `qemu_io_latency` events.
+"""
+
+import queue
+import threading
+import time
+
+from pysim_sdk.utils import log
+
+from nodo.utils.histogram import LatencyHistogram
+from nodo.utils.packet_filter import ETHERNET_HEADER_LEN, ipv4_of
+from nodo.utils.packets import IP_PROTO_ICMP, IP_PROTO_UDP
+
+DEFAULT_QUEUE_SIZE = 1024
+DEFAULT_REPORT_INTERVAL = 10.0
+
+HEADER = "header"
+SCAPY = "scapy"
+
+# Emulated I/O takes microseconds, finer than the default buckets
+IO_LATENCY_BUCKETS_MS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    25,
+    50,
+    100,
+)
+
+PROTOCOL_NAMES = {IP_PROTO_ICMP: "icmp", IP_PROTO_UDP: "udp", 6: "tcp"}
+
+
+def _mac(address: bytes) -> str:
+    return address.hex(":")
+
+
+def header_summary(packet: bytes, ethernet=False) -> str:
+    """
+    One-line summary of the headers of a raw IPv4 packet or an Ethernet
+    frame, e.g. `10.0.0.1 > 10.32.0.5 udp 5000 > 40000 ttl 64 len 78`.
+    """
+    parts = []
+    if ethernet:
+        if len(packet) < ETHERNET_HEADER_LEN:
+            return f"truncated frame len {len(packet)}"
+        parts.append(f"{_mac(packet[6:12])} > {_mac(packet[0:6])}")
+
+    ip = ipv4_of(packet, ethernet)
+    if ip is None:
+        if ethernet:
+            parts.append(f"ethertype 0x{packet[12:14].hex()}")
+        else:
+            parts.append("not ipv4")
+        parts.append(f"len {len(packet)}")
+        return " ".join(parts)
+
+    parts.append(f"{'.'.join(map(str, ip[12:16]))} > {'.'.join(map(str, ip[16:20]))}")
+
+    protocol = ip[9]
+    parts.append(PROTOCOL_NAMES.get(protocol, f"proto {protocol}"))
+    header_len = (ip[0] & 0x0F) * 4
+    if protocol == IP_PROTO_UDP and len(ip) >= header_len + 4:
+        sport = int.from_bytes(ip[header_len : header_len + 2], "big")
+        dport = int.from_bytes(ip[header_len + 2 : header_len + 4], "big")
+        parts.append(f"{sport} > {dport}")
+    elif protocol == IP_PROTO_ICMP and len(ip) > header_len:
+        parts.append(f"type {ip[header_len]}")
+
+    parts.append(f"ttl {ip[8]} len {len(packet)}")
+    return " ".join(parts)
+
+
+def scapy_summary(packet: bytes, ethernet=False) -> str:
+    from scapy.layers.inet import IP
+    from scapy.layers.l2 import Ether
+
+    return str(Ether(packet) if ethernet else IP(packet))
+
+
+FORMATS = {HEADER: header_summary, SCAPY: scapy_summary}
+
+
+class Sampler:
+    """
+    Decides which packets of each event are summarized.
+    """
+
+    def __init__(self, sample_every=0, max_per_second=0):
+        self.sample_every = sample_every
+        self.max_per_second = max_per_second
+        self.counts = {}
+        self.windows = {}
+
+    @property
+    def enabled(self):
+        return bool(self.sample_every or self.max_per_second)
+
+    def sample(self, name: str) -> bool:
+        if self.sample_every:
+            count = self.counts.get(name, 0)
+            self.counts[name] = count + 1
+            if count % self.sample_every:
+                return False
+
+        if self.max_per_second:
+            second = int(time.monotonic())
+            window, count = self.windows.get(name, (second, 0))
+            if window != second:
+                window, count = second, 0
+            if count >= self.max_per_second:
+                return False
+            self.windows[name] = (window, count + 1)
+
+        return True
+
+
+class IoLatency:
+    """
+    Latency histograms of the emulated I/O operations, by operation.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.operations = {}
+
+    def record(self, operation: str, started_ns: int):
+        latency_ms = (time.perf_counter_ns() - started_ns) / 1e6
+        with self.lock:
+            histogram = self.operations.get(operation)
+            if histogram is None:
+                histogram = LatencyHistogram(IO_LATENCY_BUCKETS_MS)
+                self.operations[operation] = histogram
+            histogram.add(latency_ms)
+
+    def json(self):
+        with self.lock:
+            return {
+                operation: histogram.json()
+                for operation, histogram in self.operations.items()
+            }
+
+
+class PacketSummaries:
+    def __init__(
+        self,
+        pysim,
+        sample_every=0,
+        max_per_second=0,
+        summary_format=HEADER,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        report_interval=DEFAULT_REPORT_INTERVAL,
+    ):
+        if summary_format not in FORMATS:
+            raise ValueError(f"Unknown packet summary format {summary_format!r}")
+
+        self.pysim = pysim
+        self.sampler = Sampler(sample_every, max_per_second)
+        self.formatter = FORMATS[summary_format]
+        self.queue = queue.Queue(queue_size)
+        self.report_interval = report_interval
+        self.io_latency = IoLatency()
+
+        self.summarized = 0
+        self.dropped = 0
+        self.thread = None
+
+    @staticmethod
+    def from_config(pysim, config: dict):
+        return PacketSummaries(
+            pysim,
+            sample_every=config.get("sample_every", 0),
+            max_per_second=config.get("max_per_second", 0),
+            summary_format=config.get("format", HEADER),
+            queue_size=config.get("queue_size", DEFAULT_QUEUE_SIZE),
+            report_interval=config.get("report_interval", DEFAULT_REPORT_INTERVAL),
+        )
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self._run, name="packet-summaries", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self, timeout=1.0):
+        """
+        Stops the background thread once the queued summaries are sent, or
+        after `timeout` seconds.
+        """
+        if self.thread is None:
+            return
+
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
+        self.thread = None
+
+    def packet(self, name: str, payload: bytes, ethernet=False, **kwargs):
+        """
+        Queues the summary of `payload` as a `name` event, if sampled. Never
+        blocks: summaries are dropped while the queue is full.
+        """
+        if not self.sampler.enabled or not self.sampler.sample(name):
+            return
+
+        try:
+            self.queue.put_nowait((name, payload, ethernet, kwargs))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        next_report = time.monotonic() + self.report_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(next_report - time.monotonic(), 0))
+            except queue.Empty:
+                item = False
+
+            if item is None:
+                return
+
+            try:
+                if item is not False:
+                    name, payload, ethernet, kwargs = item
+                    data = self.formatter(payload, ethernet)
+                    self.pysim.event(name, **kwargs, data=data)
+                    self.summarized += 1
+
+                if time.monotonic() >= next_report:
+                    next_report = time.monotonic() + self.report_interval
+                    self.pysim.event("qemu_io_latency", **self.status())
+            except Exception as e:
+                log.error(f"Packet summary failed: {e}")
+
+    def status(self):
+        return {
+            "summarized": self.summarized,
+            "dropped": self.dropped,
+            "io_latency": self.io_latency.json(),
+        }
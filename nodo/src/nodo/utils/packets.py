@@ -0,0 +1,145 @@
+"""
+Minimal IPv4/UDP/ICMP parsing and building for raw packets.
+
+Devices only need a handful of header fields to decide what to do with a
+packet, so these helpers read and write them directly instead of dissecting
+every packet with scapy.
+"""
+
+import socket
+import struct
+import sys
+
+from array import array
+
+IP_PROTO_ICMP = 1
+IP_PROTO_UDP = 17
+
+ICMP_PEER_MESSAGE = 2
+
+# Sibling messages are UDP datagrams between the devices of a node
+SIBLINGS_UDP_PORT = 39999
+
+IPV4_HEADER = struct.Struct("!BBHHHBBH4s4s")
+UDP_HEADER = struct.Struct("!HHHH")
+ICMP_HEADER = struct.Struct("!BBHI")
+
+DEFAULT_TTL = 64
+
+
+def checksum(data: bytes) -> int:
+    """
+    Internet checksum (RFC 1071) of `data`.
+    """
+    if len(data) % 2:
+        data += b"\x00"
+
+    words = array("H", data)
+    if sys.byteorder == "little":
+        words.byteswap()
+
+    total = sum(words)
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+class Ipv4Packet:
+    """
+    Read-only view over the IPv4 header of a raw packet.
+    """
+
+    __slots__ = ("data", "header_len", "total_len", "ttl", "protocol", "src", "dst")
+
+    def __init__(self, data: bytes):
+        if len(data) < IPV4_HEADER.size:
+            raise ValueError(f"Packet too short for an IPv4 header: {len(data)} bytes")
+
+        self.data = data
+        self.header_len = (data[0] & 0x0F) * 4
+        if not IPV4_HEADER.size <= self.header_len <= len(data):
+            raise ValueError(f"Invalid IPv4 header length: {self.header_len} bytes")
+        self.total_len = int.from_bytes(data[2:4], "big") or len(data)
+        self.ttl = data[8]
+        self.protocol = data[9]
+        self.src = socket.inet_ntoa(data[12:16])
+        self.dst = socket.inet_ntoa(data[16:20])
+
+    def checksum_ok(self) -> bool:
+        return checksum(self.data[: self.header_len]) == 0
+
+    def payload(self) -> bytes:
+        return self.data[self.header_len : self.total_len]
+
+    def udp_dport(self):
+        if self.protocol != IP_PROTO_UDP:
+            return None
+        return int.from_bytes(
+            self.data[self.header_len + 2 : self.header_len + 4], "big"
+        )
+
+    def udp_payload(self) -> bytes:
+        return self.data[self.header_len + UDP_HEADER.size : self.total_len]
+
+    def icmp_type(self):
+        if self.protocol != IP_PROTO_ICMP or len(self.data) <= self.header_len:
+            return None
+        return self.data[self.header_len]
+
+    def icmp_payload(self) -> bytes:
+        return self.data[self.header_len + ICMP_HEADER.size : self.total_len]
+
+    def with_ttl(self, ttl: int) -> bytes:
+        """
+        Returns the raw packet with a new TTL and its header checksum updated.
+        """
+        header = bytearray(self.data[: self.header_len])
+        header[8] = ttl
+        header[10:12] = b"\x00\x00"
+        header[10:12] = checksum(header).to_bytes(2, "big")
+        return bytes(header) + self.data[self.header_len :]
+
+    def __str__(self):
+        return (
+            f"IP {self.src} > {self.dst} proto={self.protocol} "
+            f"ttl={self.ttl} len={self.total_len}"
+        )
+
+
+def build_ipv4(src: str, dst: str, protocol: int, payload: bytes, ttl=DEFAULT_TTL):
+    header = bytearray(
+        IPV4_HEADER.pack(
+            0x45,
+            0,
+            IPV4_HEADER.size + len(payload),
+            1,
+            0,
+            ttl,
+            protocol,
+            0,
+            socket.inet_aton(src),
+            socket.inet_aton(dst),
+        )
+    )
+    header[10:12] = checksum(header).to_bytes(2, "big")
+    return bytes(header) + payload
+
+
+def build_udp(src: str, dst: str, sport: int, dport: int, payload: bytes):
+    length = UDP_HEADER.size + len(payload)
+    pseudo_header = (
+        socket.inet_aton(src)
+        + socket.inet_aton(dst)
+        + struct.pack("!BBH", 0, IP_PROTO_UDP, length)
+    )
+    udp_checksum = checksum(
+        pseudo_header + UDP_HEADER.pack(sport, dport, length, 0) + payload
+    )
+    segment = UDP_HEADER.pack(sport, dport, length, udp_checksum or 0xFFFF) + payload
+    return build_ipv4(src, dst, IP_PROTO_UDP, segment)
+
+
+def build_icmp(src: str, dst: str, icmp_type: int, code: int, payload: bytes):
+    icmp_checksum = checksum(ICMP_HEADER.pack(icmp_type, code, 0, 0) + payload)
+    message = ICMP_HEADER.pack(icmp_type, code, icmp_checksum, 0) + payload
+    return build_ipv4(src, dst, IP_PROTO_ICMP, message)
@@ -0,0 +1,279 @@
+"""
+Bounded queues for device events and SPI links.
+
+Both queues tell control traffic (sibling messages, peer messages and link
+events) apart from forwarded data packets. When a queue is full, data packets
+are tail-dropped while control traffic is always admitted: dropping a token
+grant or a routing message would stall the whole node, and the amount of
+control traffic in flight is bounded by the protocol itself.
+
+The events queue also serves control traffic ahead of forwarded data, so
+token grants and routing messages don't wait behind bulk traffic. To avoid
+starving data, at most `control_burst` control events are served in a row
+while data is waiting.
+"""
+
+import collections
+import multiprocessing as mp
+import threading
+import time
+
+from pysim_sdk.nic.events import InterfaceEvent
+
+from nodo.utils.histogram import LatencyHistogram
+from nodo.utils.packets import (
+    ICMP_PEER_MESSAGE,
+    IP_PROTO_ICMP,
+    IP_PROTO_UDP,
+    SIBLINGS_UDP_PORT,
+)
+from nodo.utils.spi_batching import is_batch, unpack_batch
+
+DEFAULT_EVENTS_CAPACITY = 4096
+DEFAULT_SPI_CAPACITY = 4096
+DEFAULT_CONTROL_BURST = 16
+
+CONTROL = "control"
+DATA = "data"
+
+EVENT_TYPES = {
+    "packet-received": InterfaceEvent.PacketReceived,
+    "peer-connected": InterfaceEvent.PeerConnected,
+    "peer-lost": InterfaceEvent.PeerLost,
+}
+
+
+def is_control_packet(packet) -> bool:
+    """
+    Returns whether a raw IPv4 packet carries a sibling or a peer message.
+    Anything that doesn't look like a raw packet is considered control, and
+    so are batches holding at least one control packet.
+    """
+    if not isinstance(packet, (bytes, bytearray)) or len(packet) < 20:
+        return True
+
+    if is_batch(packet):
+        return any(is_control_packet(p) for p in unpack_batch(packet))
+
+    header_len = (packet[0] & 0x0F) * 4
+    protocol = packet[9]
+
+    if protocol == IP_PROTO_UDP and len(packet) >= header_len + 4:
+        dport = int.from_bytes(packet[header_len + 2 : header_len + 4], "big")
+        return dport == SIBLINGS_UDP_PORT
+
+    if protocol == IP_PROTO_ICMP and len(packet) > header_len:
+        return packet[header_len] == ICMP_PEER_MESSAGE
+
+    return False
+
+
+class QueueStats:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.total = 0
+        self.high_water_mark = 0
+        self.dropped = 0
+
+    def on_put(self, depth):
+        self.total += 1
+        if depth > self.high_water_mark:
+            self.high_water_mark = depth
+
+    def json(self):
+        return {
+            "capacity": self.capacity,
+            "highWaterMark": self.high_water_mark,
+            "dropped": self.dropped,
+        }
+
+
+class Event:
+    __slots__ = ("type", "interface", "payload", "enqueued_ns", "seq")
+
+    def __init__(self, event_type, interface=None, payload=None):
+        self.type = event_type
+        self.interface = interface
+        self.payload = payload
+        self.enqueued_ns = 0
+        self.seq = 0
+
+    def __repr__(self):
+        return f"Event({self.type}, {self.interface}, {self.payload!r})"
+
+
+class EventQueue:
+    """
+    Events queue for a device, used as the sink of its interfaces.
+
+    Interfaces put `(interface, event_name, payload)` tuples and the device
+    consumes them through `events_stream`, which also generates a `Tick`
+    event every `max_block_time` seconds. Putting `None` ends the stream
+    once the events put before it have been served, and refuses later ones.
+    """
+
+    def __init__(
+        self, capacity=DEFAULT_EVENTS_CAPACITY, control_burst=DEFAULT_CONTROL_BURST
+    ):
+        self.control = collections.deque()
+        self.data = collections.deque()
+        self.cv = threading.Condition()
+        self.stats = QueueStats(capacity)
+        self.control_burst = control_burst
+        self.control_streak = 0
+        self.processed = 0
+        # Order in which events were put, and position of the `None` put
+        self.seq = 0
+        self.stop_seq = None
+        self.queue_delay = {CONTROL: LatencyHistogram(), DATA: LatencyHistogram()}
+
+    def put(self, event):
+        if event is None:
+            with self.cv:
+                if self.stop_seq is None:
+                    self.stop_seq = self.seq
+                self.cv.notify()
+            return True
+
+        interface, event_name, payload = event
+        if event_name == "packet-received" and is_batch(payload):
+            for packet in unpack_batch(payload):
+                self.put((interface, event_name, packet))
+            return True
+
+        item = Event(EVENT_TYPES[event_name], interface, payload)
+        item.enqueued_ns = time.monotonic_ns()
+        is_control = item.type != InterfaceEvent.PacketReceived or (
+            is_control_packet(payload)
+        )
+
+        with self.cv:
+            if self.stop_seq is not None:
+                # The stream ends with the events put before the `None`
+                return False
+
+            depth = len(self.control) + len(self.data)
+            capacity = self.stats.capacity
+            if capacity and depth >= capacity and not is_control:
+                self.stats.dropped += 1
+                return False
+
+            item.seq = self.seq
+            self.seq += 1
+            if is_control:
+                self.control.append(item)
+            else:
+                self.data.append(item)
+            self.stats.on_put(depth + 1)
+            self.cv.notify()
+            return True
+
+    def _pop(self):
+        if not self.data:
+            # Only control events served while data waits count as a burst
+            self.control_streak = 0
+            return self.control.popleft(), CONTROL
+
+        if self.control and self.control_streak < self.control_burst:
+            self.control_streak += 1
+            return self.control.popleft(), CONTROL
+
+        self.control_streak = 0
+        return self.data.popleft(), DATA
+
+    def _stopped(self):
+        # Both deques are in put order, so their heads are their oldest events
+        return self.stop_seq is not None and all(
+            not queue or queue[0].seq >= self.stop_seq
+            for queue in (self.control, self.data)
+        )
+
+    def events_stream(self, max_block_time=1.0):
+        next_tick = time.monotonic() + max_block_time
+
+        while True:
+            with self.cv:
+                while not self.control and not self.data and not self._stopped():
+                    timeout = next_tick - time.monotonic()
+                    if timeout <= 0 or not self.cv.wait(timeout):
+                        break
+
+                if self._stopped():
+                    return
+
+                if self.control or self.data:
+                    item, traffic_class = self._pop()
+                else:
+                    item, traffic_class = None, None
+
+            if item is not None:
+                self.processed += 1
+                self.queue_delay[traffic_class].add(
+                    (time.monotonic_ns() - item.enqueued_ns) / 1e6
+                )
+                yield item
+
+            if time.monotonic() >= next_tick:
+                next_tick = time.monotonic() + max_block_time
+                yield Event(InterfaceEvent.Tick)
+
+    def pending(self):
+        return len(self.control) + len(self.data)
+
+    def status(self):
+        return {
+            "totalEvents": self.processed,
+            "pendingEvents": self.pending(),
+            "pendingControl": len(self.control),
+            "pendingData": len(self.data),
+            **self.stats.json(),
+            "queueDelay": {
+                traffic_class: histogram.json()
+                for traffic_class, histogram in self.queue_delay.items()
+            },
+        }
+
+
+class SpiQueue:
+    """
+    Bounded SPI link between two sibling devices.
+
+    The sending device tail-drops data packets once `capacity` packets are
+    waiting to be read by the next device in the ring. Statistics are kept by
+    the sending process.
+    """
+
+    def __init__(self, capacity=DEFAULT_SPI_CAPACITY):
+        self.queue = mp.Queue()
+        self.stats = QueueStats(capacity)
+
+    def put(self, item, block=True, timeout=None):
+        depth = self.queue.qsize()
+        capacity = self.stats.capacity
+        if capacity and depth >= capacity and not is_control_packet(item):
+            self.stats.dropped += 1
+            return
+
+        self.queue.put(item, block, timeout)
+        self.stats.on_put(depth + 1)
+
+    def put_nowait(self, item):
+        return self.put(item, block=False)
+
+    def get(self, block=True, timeout=None):
+        return self.queue.get(block, timeout)
+
+    def get_nowait(self):
+        return self.queue.get_nowait()
+
+    def __getattr__(self, name):
+        if name.startswith("__") or "queue" not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.queue, name)
+
+    def status(self):
+        return {
+            "totalPackets": self.stats.total,
+            "pendingPackets": self.queue.qsize(),
+            **self.stats.json(),
+        }
@@ -0,0 +1,125 @@
+"""
+Coalescing of SPI transfers.
+
+Packets sent through the SPI interface while a device handles a batch of
+events are gathered and shipped as a single framed transfer:
+
+    magic (4 bytes) | count (u16) | length (u16) | packet | length | packet ...
+
+The magic starts with a zero byte, so a frame can never be mistaken for an
+IPv4 packet. The receiving events queue unpacks frames back into individual
+`PacketReceived` events.
+"""
+
+import struct
+import time
+
+from nodo.utils.interfaces import InterfaceProxy
+
+BATCH_MAGIC = b"\x00SPB"
+
+DEFAULT_FLUSH_DEADLINE_US = 200
+DEFAULT_MAX_BATCH_BYTES = 32 * 1024
+
+
+def is_batch(payload) -> bool:
+    return payload[:4] == BATCH_MAGIC
+
+
+def pack_batch(packets) -> bytes:
+    parts = [BATCH_MAGIC, struct.pack("!H", len(packets))]
+    for packet in packets:
+        parts.append(struct.pack("!H", len(packet)))
+        parts.append(packet)
+    return b"".join(parts)
+
+
+def unpack_batch(frame: bytes):
+    (count,) = struct.unpack_from("!H", frame, 4)
+    packets = []
+    offset = 6
+    for _ in range(count):
+        (length,) = struct.unpack_from("!H", frame, offset)
+        offset += 2
+        packets.append(frame[offset : offset + length])
+        offset += length
+    return packets
+
+
+class BatchingSpiInterface(InterfaceProxy):
+    """
+    SPI interface that buffers outgoing packets until `flush` is called,
+    `max_batch_bytes` are buffered or the oldest buffered packet is older
+    than `flush_deadline_us`.
+    """
+
+    def __init__(
+        self,
+        interface,
+        flush_deadline_us=DEFAULT_FLUSH_DEADLINE_US,
+        max_batch_bytes=DEFAULT_MAX_BATCH_BYTES,
+    ):
+        super().__init__(interface)
+        self.flush_deadline_ns = flush_deadline_us * 1000
+        self.max_batch_bytes = max_batch_bytes
+
+        self.pending = []
+        self.pending_bytes = 0
+        self.oldest_ns = 0
+
+        self.packets = 0
+        self.transfers = 0
+        self.max_batch = 0
+
+    @staticmethod
+    def from_config(interface, config: dict):
+        return BatchingSpiInterface(
+            interface,
+            flush_deadline_us=config.get(
+                "flush_deadline_us", DEFAULT_FLUSH_DEADLINE_US
+            ),
+            max_batch_bytes=config.get("max_batch_bytes", DEFAULT_MAX_BATCH_BYTES),
+        )
+
+    def send_packet(self, packet: bytes):
+        if not self.pending:
+            self.oldest_ns = time.monotonic_ns()
+
+        self.pending.append(packet)
+        self.pending_bytes += len(packet) + 2
+        self.packets += 1
+
+        if self.pending_bytes >= self.max_batch_bytes:
+            self.flush()
+
+    def flush_if_due(self):
+        if (
+            self.pending
+            and time.monotonic_ns() - self.oldest_ns >= self.flush_deadline_ns
+        ):
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        if len(self.pending) == 1:
+            self.interface.send_packet(self.pending[0])
+        else:
+            self.interface.send_packet(pack_batch(self.pending))
+
+        self.transfers += 1
+        self.max_batch = max(self.max_batch, len(self.pending))
+        self.pending = []
+        self.pending_bytes = 0
+
+    def status(self):
+        return {
+            **self.interface.status(),
+            "batching": {
+                "packets": self.packets,
+                "transfers": self.transfers,
+                "maxBatch": self.max_batch,
+                "pending": len(self.pending),
+            },
+        }
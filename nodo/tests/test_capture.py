@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+pytest.importorskip("pysim_sdk")
+
+from nodo.capture import (  # noqa: E402
+    LINKTYPE_ETHERNET,
+    PCAP_HEADER,
+    PCAP_MAGIC,
+    RECORD_HEADER,
+    PcapWriter,
+)
+
+SECOND = 1_000_000_000
+START = 1_700_000_000 * SECOND
+
+
+def read_pcap(path):
+    with open(path, "rb") as f:
+        data = f.read()
+
+    header = PCAP_HEADER.unpack_from(data)
+    offset = PCAP_HEADER.size
+    records = []
+    while offset < len(data):
+        seconds, ns, length, original = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        records.append(
+            (seconds * SECOND + ns, data[offset : offset + length], original)
+        )
+        offset += length
+    return header, records
+
+
+def names(directory):
+    return sorted(os.listdir(directory))
+
+
+def test_header_and_records(tmp_path):
+    path = str(tmp_path / "capture" / "spi-n.pcap")
+    writer = PcapWriter(path, linktype=LINKTYPE_ETHERNET, snaplen=4)
+    writer.write(b"abcdef", now_ns=START + 5)
+    writer.write(b"xy", now_ns=START + SECOND)
+    writer.close()
+
+    header, records = read_pcap(path)
+    assert header == (PCAP_MAGIC, 2, 4, 0, 0, 4, LINKTYPE_ETHERNET)
+    # Packets are truncated to the snaplen, keeping their original length
+    assert records == [(START + 5, b"abcd", 6), (START + SECOND, b"xy", 2)]
+    assert (writer.packets, writer.bytes) == (2, 8)
+
+
+def test_rotation_by_size(tmp_path):
+    path = str(tmp_path / "spi-n.pcap")
+    record_bytes = RECORD_HEADER.size + 10
+    writer = PcapWriter(path, max_bytes=PCAP_HEADER.size + 2 * record_bytes)
+    for i in range(5):
+        writer.write(bytes([i]) * 10, now_ns=START + i)
+    writer.close()
+
+    assert names(tmp_path) == ["spi-n.1.pcap", "spi-n.2.pcap", "spi-n.pcap"]
+    assert writer.rotations == 2
+    assert [r[1][0] for r in read_pcap(str(tmp_path / "spi-n.2.pcap"))[1]] == [0, 1]
+    assert [r[1][0] for r in read_pcap(str(tmp_path / "spi-n.1.pcap"))[1]] == [2, 3]
+    assert [r[1][0] for r in read_pcap(path)[1]] == [4]
+
+
+def test_rotation_by_age(tmp_path):
+    path = str(tmp_path / "spi-n.pcap")
+    writer = PcapWriter(path, max_bytes=0, max_seconds=10)
+    for seconds in (0, 9, 10, 15, 25):
+        writer.write(b"packet", now_ns=START + seconds * SECOND)
+    writer.close()
+
+    assert writer.rotations == 2
+    assert len(read_pcap(str(tmp_path / "spi-n.2.pcap"))[1]) == 2
+    assert len(read_pcap(str(tmp_path / "spi-n.1.pcap"))[1]) == 2
+    assert len(read_pcap(path)[1]) == 1
+
+
+def test_max_files_prunes_the_oldest(tmp_path):
+    path = str(tmp_path / "spi-n.pcap")
+    writer = PcapWriter(path, max_bytes=1, max_files=3)
+    for i in range(6):
+        writer.write(bytes([i]), now_ns=START + i)
+    writer.close()
+
+    assert names(tmp_path) == ["spi-n.1.pcap", "spi-n.2.pcap", "spi-n.pcap"]
+    assert read_pcap(str(tmp_path / "spi-n.2.pcap"))[1][0][1] == b"\x03"
+    assert read_pcap(path)[1][0][1] == b"\x05"
+
+
+def test_single_file_is_replaced(tmp_path):
+    path = str(tmp_path / "spi-n.pcap")
+    writer = PcapWriter(path, max_bytes=1, max_files=1)
+    writer.write(b"old", now_ns=START)
+    writer.write(b"new", now_ns=START + 1)
+    writer.close()
+
+    assert names(tmp_path) == ["spi-n.pcap"]
+    assert [record[1] for record in read_pcap(path)[1]] == [b"new"]
@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("pysim_sdk")
+
+from nodo.benchmarks.convergence import compare  # noqa: E402
+
+
+def run(**reconvergence):
+    return {
+        "topology": "basic",
+        "seed": 0,
+        "convergence": {"converged": True, "time_s": 5.0},
+        "reconvergence": {
+            "converged": True,
+            "disrupted_nodes": 2,
+            "lost_after_s": 1.0,
+            **reconvergence,
+        },
+    }
+
+
+def regressions(result, baseline):
+    (comparison,) = compare([result], [baseline], max_regression=5)
+    return comparison["regressions"]
+
+
+def test_costs_increasing_are_regressions():
+    assert regressions(run(disrupted_nodes=3), run()) == [
+        "reconvergence.disrupted_nodes"
+    ]
+    assert regressions(run(disrupted_nodes=1), run()) == []
+
+
+def test_losing_provisioning_later_is_not_a_regression():
+    result = run(lost_after_s=3.0)
+    (comparison,) = compare([result], [run()], max_regression=5)
+
+    assert comparison["regressions"] == []
+    assert comparison["changes"]["reconvergence.lost_after_s"]["current"] == 3.0
+
+
+def test_losing_convergence_is_a_regression():
+    assert regressions(run(converged=False), run()) == ["reconvergence.converged"]
@@ -0,0 +1,147 @@
+import struct
+import time
+
+import pytest
+
+from nodo.utils.event_batching import (
+    BATCH_EVENT,
+    BATCH_HEADER,
+    ENTRY_HEADER,
+    MAX_BATCH,
+    EventPublisher,
+    pack_events,
+)
+
+PACKET = 0x01
+LINK = 0x02
+
+
+class FakeHandler:
+    def __init__(self):
+        self.published = []
+
+    def publish_event(self, event_id, payload=None):
+        self.published.append((event_id, payload))
+
+
+def unpack_events(payload):
+    (count,) = BATCH_HEADER.unpack_from(payload)
+    offset = BATCH_HEADER.size
+    events = []
+    for _ in range(count):
+        event_id, length = ENTRY_HEADER.unpack_from(payload, offset)
+        offset += ENTRY_HEADER.size
+        events.append((event_id, payload[offset : offset + length]))
+        offset += length
+    assert offset == len(payload)
+    return events
+
+
+def publisher(max_batch=8, **kwargs):
+    # A window long enough for the tests to run before it expires
+    kwargs.setdefault("window_us", 10_000_000)
+    handler = FakeHandler()
+    events = EventPublisher(handler, **kwargs)
+    events.set_max_batch(max_batch)
+    return events, handler.published
+
+
+@pytest.mark.parametrize(
+    "events",
+    [[], [(PACKET, b"")], [(PACKET, b"a"), (0x03, b"bc" * 300), (PACKET, b"\x00")]],
+)
+def test_pack_events_round_trip(events):
+    assert unpack_events(pack_events(events)) == events
+
+
+def test_pack_events_is_little_endian():
+    assert pack_events([(PACKET, b"xy")]) == struct.pack("<HBH", 1, PACKET, 2) + b"xy"
+
+
+def test_events_are_published_directly_without_opt_in():
+    events, published = publisher(max_batch=0)
+    events.publish(PACKET, b"a")
+    events.publish(PACKET, b"b")
+
+    assert published == [(PACKET, b"a"), (PACKET, b"b")]
+
+
+def test_opt_in_is_ignored_when_disabled():
+    events, published = publisher(allowed=False)
+    events.publish(PACKET, b"a")
+
+    assert events.max_batch == 0
+    assert published == [(PACKET, b"a")]
+
+
+def test_max_batch_flushes():
+    events, published = publisher(max_batch=3)
+    for payload in (b"a", b"b", b"c", b"d"):
+        events.publish(PACKET, payload)
+
+    assert len(published) == 1
+    event_id, payload = published[0]
+    assert event_id == BATCH_EVENT
+    assert unpack_events(payload) == [(PACKET, b"a"), (PACKET, b"b"), (PACKET, b"c")]
+    assert events.pending == [(PACKET, b"d")]
+
+
+def test_max_batch_is_capped():
+    events, _ = publisher(max_batch=MAX_BATCH + 1)
+    assert events.max_batch == MAX_BATCH
+
+
+def test_max_bytes_flushes_before_going_over():
+    # Header (2) and two entries of 3 + 5 bytes fit, a third one doesn't
+    size = BATCH_HEADER.size + 2 * (ENTRY_HEADER.size + 5)
+    events, published = publisher(max_bytes=size + 1)
+    for payload in (b"aaaaa", b"bbbbb", b"ccccc"):
+        events.publish(PACKET, payload)
+
+    assert len(published) == 1
+    assert unpack_events(published[0][1]) == [(PACKET, b"aaaaa"), (PACKET, b"bbbbb")]
+    assert events.pending == [(PACKET, b"ccccc")]
+
+
+def test_max_bytes_flushes_when_reached():
+    events, published = publisher(max_bytes=BATCH_HEADER.size + ENTRY_HEADER.size + 5)
+    events.publish(PACKET, b"aaaaa")
+
+    # A batch of a single packet is a plain event
+    assert published == [(PACKET, b"aaaaa")]
+    assert events.batches == 0
+
+
+def test_link_events_flush_the_batch_first():
+    events, published = publisher()
+    events.publish(PACKET, b"a")
+    events.publish(PACKET, b"b")
+    events.publish(LINK)
+
+    assert [event_id for event_id, _ in published] == [BATCH_EVENT, LINK]
+    assert published[1] == (LINK, None)
+    assert unpack_events(published[0][1]) == [(PACKET, b"a"), (PACKET, b"b")]
+
+
+def test_opting_out_flushes_the_batch():
+    events, published = publisher()
+    events.publish(PACKET, b"a")
+    events.set_max_batch(0)
+    events.publish(PACKET, b"b")
+
+    assert published == [(PACKET, b"a"), (PACKET, b"b")]
+
+
+def test_window_flushes():
+    events, published = publisher(window_us=1000)
+    events.publish(PACKET, b"a")
+    events.publish(PACKET, b"b")
+
+    deadline = time.monotonic() + 1
+    while not published and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+    assert len(published) == 1
+    assert unpack_events(published[0][1]) == [(PACKET, b"a"), (PACKET, b"b")]
+    assert events.status()["batches"] == 1
+    assert events.status()["maxBatch"] == 2
@@ -0,0 +1,202 @@
+import random
+import threading
+import time
+
+import pytest
+
+from nodo.utils.link_emulation import (
+    BernoulliLoss,
+    DelayLine,
+    EmulatedLink,
+    GilbertElliottLoss,
+    LinkProfile,
+    LinkShaper,
+)
+
+
+class FixedRandom:
+    """
+    `random.Random` stand-in returning the given values in turn.
+    """
+
+    def __init__(self, *values):
+        self.values = list(values)
+
+    def random(self):
+        return self.values.pop(0)
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+
+
+class FakeInterface:
+    def __init__(self, sink):
+        self.sink = sink
+        self.sent = []
+
+    def send_packet(self, packet):
+        self.sent.append(packet)
+
+    def status(self):
+        return {}
+
+
+class ListSink:
+    def __init__(self):
+        self.events = []
+
+    def put(self, event):
+        self.events.append(event)
+        return True
+
+
+def test_profile_from_config():
+    profile = LinkProfile.from_config(
+        {"rate_kbps": 64, "delay_ms": 20, "loss": {"p": 0.1, "r": 0.5}}
+    )
+
+    assert profile.json() == {
+        "rate_kbps": 64,
+        "burst_bytes": 1500,
+        "queue_ms": 100.0,
+        "delay_ms": 20,
+        "jitter_ms": 0.0,
+        "loss": {
+            "model": "gilbert-elliott",
+            "p": 0.1,
+            "r": 0.5,
+            "good": 0.0,
+            "bad": 1.0,
+        },
+    }
+    assert isinstance(LinkProfile.from_config({"loss": 0.2}).loss, BernoulliLoss)
+    assert LinkProfile.from_config({"loss": 0}).loss is None
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        [],
+        {"bandwidth": 10},
+        {"rate_kbps": 0},
+        {"delay_ms": -1},
+        {"jitter_ms": "1"},
+        {"loss": 1.5},
+        {"loss": {"p": 0.1}},
+        {"loss": {"p": 0.1, "r": 0.5, "burst": 2}},
+    ],
+)
+def test_invalid_profiles(config):
+    with pytest.raises(ValueError):
+        LinkProfile.from_config(config)
+
+
+def test_delay_without_rate_limit():
+    shaper = LinkShaper(LinkProfile(delay_ms=10))
+    assert shaper.transmit(1.0, 1000) == pytest.approx(1.01)
+
+
+def test_token_bucket_queues_and_drops():
+    # 8 kbps is 1000 bytes/s, with room for 100 ms of queued bytes
+    shaper = LinkShaper(LinkProfile(rate_kbps=8, burst_bytes=100, queue_ms=100))
+
+    assert shaper.transmit(0.0, 100) == 0.0
+    assert shaper.transmit(0.0, 50) == pytest.approx(0.05)
+    assert shaper.transmit(0.0, 60) is None
+    # Tokens refill at the link rate
+    assert shaper.transmit(0.1, 100) == pytest.approx(0.15)
+    assert shaper.status()["queueDropped"] == 1
+
+
+def test_packets_never_overtake_each_other():
+    shaper = LinkShaper(LinkProfile(delay_ms=10, jitter_ms=50), FixedRandom(0.9, 0.0))
+
+    first = shaper.transmit(0.0, 10)
+    assert shaper.transmit(0.001, 10) == first
+
+
+def test_gilbert_elliott_losses_come_in_bursts():
+    loss = GilbertElliottLoss(p=0.5, r=0.5, good=0.0, bad=1.0)
+    # Each packet draws the state transition, then whether it's lost
+    rng = FixedRandom(0.9, 0.0, 0.1, 0.9, 0.9, 0.9, 0.1, 0.0)
+
+    assert [loss.lost(rng) for _ in range(4)] == [False, True, True, False]
+
+
+def test_directions_keep_their_own_channel():
+    link = EmulatedLink(LinkProfile(loss=GilbertElliottLoss(p=1.0, r=0.0)))
+    link.uplink.transmit(0.0, 10)
+
+    assert link.uplink.loss.is_bad
+    assert not link.downlink.loss.is_bad
+
+
+def test_delay_line_keeps_order():
+    delay_line = DelayLine()
+    done = threading.Event()
+    calls = []
+
+    when = time.monotonic() + 0.05
+    for name in ("first", "second", "third"):
+        delay_line.call_at(when, calls.append, name)
+    delay_line.call_at(when, done.set)
+
+    assert done.wait(1)
+    assert calls == ["first", "second", "third"]
+
+
+def test_delay_line_queues_due_callbacks_while_others_are_pending():
+    delay_line = DelayLine()
+    done = threading.Event()
+    calls = []
+
+    now = time.monotonic()
+    delay_line.call_at(now + 0.05, calls.append, "delayed")
+    delay_line.call_at(now, calls.append, "due")
+    assert calls == []
+
+    delay_line.call_at(now + 0.05, done.set)
+    assert done.wait(1)
+    assert sorted(calls) == ["delayed", "due"]
+
+
+def test_due_callbacks_wait_for_the_running_one():
+    delay_line = DelayLine()
+    running, release, done = threading.Event(), threading.Event(), threading.Event()
+    calls = []
+
+    def first():
+        running.set()
+        release.wait(1)
+        calls.append("first")
+
+    delay_line.call_at(time.monotonic() + 0.01, first)
+    assert running.wait(1)
+    # The first callback was popped but hasn't returned yet
+    delay_line.call_at(time.monotonic(), calls.append, "second")
+    delay_line.call_at(time.monotonic(), done.set)
+    assert calls == []
+
+    release.set()
+    assert done.wait(1)
+    assert calls == ["first", "second"]
+
+
+def test_delay_line_runs_due_callbacks_on_the_caller():
+    calls = []
+    DelayLine().call_at(time.monotonic(), calls.append, "now")
+    assert calls == ["now"]
+
+
+def test_emulated_link_shapes_both_directions():
+    link = EmulatedLink(LinkProfile(loss=BernoulliLoss(1.0)), random.Random(0))
+    sink = ListSink()
+    interface = link.wrap(FakeInterface, sink)
+
+    interface.send_packet(b"packet")
+    interface.interface.sink.put(("wlan-n", "packet-received", b"packet"))
+    interface.interface.sink.put(("wlan-n", "peer-lost", None))
+
+    assert interface.interface.sent == []
+    assert sink.events == [("wlan-n", "peer-lost", None)]
+    assert link.status()["uplink"]["lost"] == link.status()["downlink"]["lost"] == 1
@@ -0,0 +1,73 @@
+import pytest
+
+pytest.importorskip("pysim_sdk")
+
+from nodo.utils.packet_filter import compile_filter  # noqa: E402
+from nodo.utils.packets import ICMP_PEER_MESSAGE, build_icmp, build_udp  # noqa: E402
+
+UDP = build_udp("10.0.1.2", "10.0.2.1", 5000, 53, b"query")
+ICMP = build_icmp("10.0.1.2", "192.168.0.1", ICMP_PEER_MESSAGE, 0, b"{}")
+ETHERNET_HEADER = bytes(12) + b"\x08\x00"
+
+
+def matches(expression, packet, ethernet=False):
+    return compile_filter(expression, ethernet)(packet)
+
+
+def test_empty_filter_is_none():
+    assert compile_filter("") is None
+    assert compile_filter("   ") is None
+
+
+@pytest.mark.parametrize(
+    "expression, udp, icmp",
+    [
+        ("ip", True, True),
+        ("udp", True, False),
+        ("icmp", False, True),
+        ("tcp", False, False),
+        ("port 53", True, False),
+        ("src port 53", False, False),
+        ("udp dst port 53", True, False),
+        ("host 10.0.2.1", True, False),
+        ("src host 10.0.1.2", True, True),
+        ("dst host 10.0.1.2", False, False),
+        ("net 192.168.0.0/16", False, True),
+        ("dst net 10.0.0.0/8", True, False),
+        ("not udp", False, True),
+        ("! udp", False, True),
+        ("udp or icmp", True, True),
+        ("udp && icmp", False, False),
+        ("icmp or udp and port 80", False, True),
+        ("(icmp or udp) and port 53", True, False),
+        ("less 31", False, True),
+        ("greater 31", True, False),
+        ("len < 31", False, True),
+        ("len = 30", False, True),
+        ("UDP AND NOT PORT 9000", True, False),
+    ],
+)
+def test_primitives(expression, udp, icmp):
+    assert (matches(expression, UDP), matches(expression, ICMP)) == (udp, icmp)
+
+
+def test_ethernet_frames_match_their_ipv4_payload():
+    frame = ETHERNET_HEADER + UDP
+    assert matches("udp port 53", frame, ethernet=True)
+    assert not matches("udp port 53", frame)
+
+
+def test_non_ipv4_frames_only_match_lengths():
+    frame = bytes(12) + b"\x08\x06" + bytes(28)
+    assert not matches("ip", frame, ethernet=True)
+    assert matches("not ip", frame, ethernet=True)
+    assert matches("len = 42", frame, ethernet=True)
+
+
+@pytest.mark.parametrize(
+    "expression",
+    ["udp and", "port", "port http", "(udp", "udp)", "len ~ 3", "foo", "udp & icmp"],
+)
+def test_invalid_filters(expression):
+    with pytest.raises(ValueError):
+        compile_filter(expression)
@@ -0,0 +1,99 @@
+import pytest
+
+from scapy.layers.inet import ICMP, IP, UDP
+
+from nodo.utils.packets import (
+    ICMP_PEER_MESSAGE,
+    IP_PROTO_ICMP,
+    IP_PROTO_UDP,
+    Ipv4Packet,
+    build_icmp,
+    build_ipv4,
+    build_udp,
+    checksum,
+)
+
+SRC = "10.0.1.2"
+DST = "10.0.2.1"
+
+
+@pytest.mark.parametrize("payload", [b"", b"x", b"peer message", bytes(range(256))])
+def test_build_udp_matches_scapy(payload):
+    expected = bytes(IP(src=SRC, dst=DST) / UDP(sport=1234, dport=39999) / payload)
+    assert build_udp(SRC, DST, 1234, 39999, payload) == expected
+
+
+@pytest.mark.parametrize("payload", [b"", b"x", b'{"id": "UPDATE_NODE_TABLE"}'])
+def test_build_icmp_matches_scapy(payload):
+    expected = bytes(IP(src=SRC, dst=DST) / ICMP(type=ICMP_PEER_MESSAGE) / payload)
+    assert build_icmp(SRC, DST, ICMP_PEER_MESSAGE, 0, payload) == expected
+
+
+def test_build_ipv4_matches_scapy():
+    expected = bytes(IP(src=SRC, dst=DST, proto=253, ttl=3) / b"data")
+    assert build_ipv4(SRC, DST, 253, b"data", ttl=3) == expected
+
+
+def test_ipv4_packet_reads_scapy_headers():
+    raw = bytes(IP(src=SRC, dst=DST, ttl=7) / UDP(sport=1, dport=2) / b"hello")
+    packet = Ipv4Packet(raw)
+
+    assert (packet.src, packet.dst, packet.ttl) == (SRC, DST, 7)
+    assert packet.protocol == IP_PROTO_UDP
+    assert packet.total_len == len(raw)
+    assert packet.checksum_ok()
+    assert packet.udp_dport() == 2
+    assert packet.udp_payload() == b"hello"
+    assert packet.icmp_type() is None
+
+
+def test_ipv4_packet_reads_icmp():
+    packet = Ipv4Packet(build_icmp(SRC, DST, ICMP_PEER_MESSAGE, 0, b"msg"))
+
+    assert packet.protocol == IP_PROTO_ICMP
+    assert packet.icmp_type() == ICMP_PEER_MESSAGE
+    assert packet.icmp_payload() == b"msg"
+    assert packet.udp_dport() is None
+
+
+def test_ipv4_packet_ignores_trailing_bytes():
+    raw = bytes(IP(src=SRC, dst=DST) / UDP(sport=1, dport=2) / b"hello")
+    assert Ipv4Packet(raw + b"\x00" * 6).udp_payload() == b"hello"
+
+
+def test_with_ttl_matches_scapy():
+    raw = bytes(IP(src=SRC, dst=DST, ttl=9) / UDP(sport=1, dport=2) / b"hello")
+    expected = bytes(IP(src=SRC, dst=DST, ttl=8) / UDP(sport=1, dport=2) / b"hello")
+
+    forwarded = Ipv4Packet(raw).with_ttl(8)
+    assert forwarded == expected
+    assert Ipv4Packet(forwarded).checksum_ok()
+
+
+def test_ip_options_are_skipped():
+    raw = bytes(IP(src=SRC, dst=DST, options=b"\x01" * 4) / UDP(dport=2) / b"hi")
+    packet = Ipv4Packet(raw)
+
+    assert packet.header_len == 24
+    assert packet.udp_dport() == 2
+    assert packet.udp_payload() == b"hi"
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        b"",
+        b"\x45" * 19,
+        # Header length below the minimum
+        b"\x44" + bytes(IP(src=SRC, dst=DST))[1:],
+        # Header length past the end of the packet
+        b"\x4f" + bytes(IP(src=SRC, dst=DST))[1:],
+    ],
+)
+def test_runt_packets_are_rejected(raw):
+    with pytest.raises(ValueError):
+        Ipv4Packet(raw)
+
+
+def test_checksum_of_odd_length():
+    assert checksum(b"\x01") == checksum(b"\x01\x00") == 0xFEFF
@@ -0,0 +1,101 @@
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("pysim_sdk")
+
+from nodo.qemu_images import (  # noqa: E402
+    COPY,
+    QCOW2,
+    FlashImages,
+    drive_args,
+    try_lock,
+)
+
+FLASH = b"\xff" * 4096
+
+
+@pytest.fixture
+def build(tmp_path):
+    flash = tmp_path / "qemu_flash.bin"
+    efuse = tmp_path / "qemu_efuse.bin"
+    flash.write_bytes(FLASH)
+    efuse.write_bytes(b"\x00" * 124)
+    return str(flash), str(efuse)
+
+
+def images(build, directory, name="node.n", qemu_img="missing-qemu-img"):
+    return FlashImages(name, 0b000, *build, directory=str(directory), qemu_img=qemu_img)
+
+
+def test_drive_args_set_the_format_of_the_flash():
+    args = [
+        "-drive",
+        "file=/d/flash.qcow2,if=mtd,format=raw",
+        "-drive",
+        "file=/d/efuse.bin,if=none,format=raw,id=efuse",
+        "-nographic",
+    ]
+
+    assert drive_args(args, "/d/flash.qcow2", QCOW2) == [
+        "-drive",
+        "file=/d/flash.qcow2,if=mtd,format=qcow2",
+        "-drive",
+        "file=/d/efuse.bin,if=none,format=raw,id=efuse",
+        "-nographic",
+    ]
+
+
+def test_flash_is_copied_without_qemu_img(build, tmp_path):
+    device = images(build, tmp_path / "images")
+    flash, efuse = device.prepare()
+
+    assert device.clone_method == COPY
+    assert open(flash, "rb").read() == FLASH
+    assert os.path.dirname(flash) == os.path.dirname(efuse) == device.device_dir
+    assert device.qemu_launcher("/usr/bin/qemu") == "/usr/bin/qemu"
+
+
+def test_stale_directories_are_pruned(build, tmp_path):
+    directory = tmp_path / "images"
+    stale = directory / "0123456789abcdef" / "devices" / "gone.n"
+    stale.mkdir(parents=True)
+
+    running = images(build, directory, "node.n")
+    running.prepare()
+    stopped = images(build, directory, "node.s")
+    stopped.prepare()
+    stopped.device_lock.close()
+
+    images(build, directory, "node.e").prepare()
+
+    assert not stale.parent.parent.exists()
+    assert os.path.exists(running.device_dir)
+    assert not os.path.exists(stopped.device_dir)
+
+
+def test_running_devices_keep_their_firmware(build, tmp_path):
+    directory = tmp_path / "images"
+    old = directory / "0123456789abcdef" / "devices" / "old.n"
+    old.mkdir(parents=True)
+    lock = try_lock(str(old / ".lock"))
+
+    images(build, directory).prepare()
+
+    assert old.exists()
+    lock.close()
+
+
+@pytest.mark.skipif(shutil.which("qemu-img") is None, reason="needs qemu-img")
+def test_devices_boot_from_an_overlay(build, tmp_path):
+    device = images(build, tmp_path / "images", qemu_img="qemu-img")
+    flash, _ = device.prepare()
+
+    assert device.clone_method == QCOW2
+    assert open(flash, "rb").read(4) == b"QFI\xfb"
+    assert os.path.getsize(flash) < len(FLASH)
+
+    launcher = device.qemu_launcher("/usr/bin/qemu")
+    assert os.access(launcher, os.X_OK)
+    assert repr(flash) in open(launcher).read()
@@ -0,0 +1,77 @@
+import pytest
+
+pytest.importorskip("pysim_sdk")
+
+from nodo.utils.packets import SIBLINGS_UDP_PORT, build_udp  # noqa: E402
+from nodo.utils.queues import EventQueue, is_control_packet  # noqa: E402
+
+CONTROL = build_udp(
+    "127.0.0.1", "127.0.0.2", SIBLINGS_UDP_PORT, SIBLINGS_UDP_PORT, b"{}"
+)
+DATA = build_udp("10.0.1.2", "10.0.2.1", 5000, 5000, b"data")
+
+
+def put(queue, *packets):
+    for packet in packets:
+        queue.put(("spi-n", "packet-received", packet))
+
+
+def classes(events):
+    return ["C" if event.payload == CONTROL else "D" for event in events]
+
+
+def drain(queue):
+    queue.put(None)
+    return classes(queue.events_stream(max_block_time=60))
+
+
+def test_packets_are_classified():
+    assert is_control_packet(CONTROL)
+    assert not is_control_packet(DATA)
+    assert is_control_packet(b"not a packet")
+
+
+def test_control_is_served_first_in_bursts():
+    queue = EventQueue(control_burst=2)
+    put(queue, DATA, DATA, CONTROL, CONTROL, CONTROL, CONTROL, CONTROL)
+
+    assert drain(queue) == ["C", "C", "D", "C", "C", "D", "C"]
+
+
+def test_burst_only_counts_while_data_waits():
+    queue = EventQueue(control_burst=2)
+    stream = queue.events_stream(max_block_time=60)
+
+    put(queue, CONTROL, CONTROL, CONTROL)
+    assert classes(next(stream) for _ in range(3)) == ["C", "C", "C"]
+
+    put(queue, DATA, CONTROL, CONTROL, CONTROL)
+    queue.put(None)
+    assert classes(stream) == ["C", "C", "D", "C"]
+
+
+def test_full_queue_drops_data_only():
+    queue = EventQueue(capacity=2)
+    put(queue, DATA, DATA, DATA, CONTROL)
+
+    assert queue.stats.dropped == 1
+    assert drain(queue) == ["C", "D", "D"]
+
+
+def test_stop_serves_events_put_before_it():
+    queue = EventQueue(control_burst=1)
+    put(queue, DATA, DATA, CONTROL)
+    queue.put(None)
+
+    assert not queue.put(("spi-n", "packet-received", CONTROL))
+    assert classes(queue.events_stream(max_block_time=60)) == ["C", "D", "D"]
+
+
+def test_link_events_are_control():
+    queue = EventQueue(control_burst=1)
+    put(queue, DATA, DATA)
+    queue.put(("wlan-n", "peer-connected", None))
+    queue.put(None)
+
+    events = list(queue.events_stream(max_block_time=60))
+    assert [event.payload for event in events] == [None, DATA, DATA]
@@ -0,0 +1,41 @@
+import os
+
+from collections import Counter
+
+import pytest
+
+pytest.importorskip("pysim_sdk")
+
+from nodo.sim.network import Simulation  # noqa: E402
+
+BASIC = os.path.join(
+    os.path.dirname(__file__), "..", "..", "config", "networks", "basic.json"
+)
+
+
+def run(seed):
+    simulation = Simulation.from_file(BASIC, seed=seed)
+    packets = Counter()
+    simulation.add_tap(lambda interface, packet: packets.update([str(interface)]))
+
+    simulation.start()
+    elapsed = simulation.run_until_converged(600)
+    return {
+        "convergence_time": elapsed,
+        "events_run": simulation.engine.events_run,
+        "packets": packets,
+        "device_events": {
+            device.name: device.observer.events for device in simulation.devices()
+        },
+    }
+
+
+def test_simulation_is_reproducible_from_its_seed():
+    first = run(seed=0)
+
+    assert first["convergence_time"] is not None
+    assert first == run(seed=0)
+
+
+def test_seed_changes_the_run():
+    assert run(seed=0)["convergence_time"] != run(seed=1)["convergence_time"]
@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from nodo.utils.spi_batching import (
+    BATCH_MAGIC,
+    BatchingSpiInterface,
+    is_batch,
+    pack_batch,
+    unpack_batch,
+)
+
+PACKET = b"\x45" + b"p" * 9
+
+
+class FakeSpi:
+    def __init__(self):
+        self.sent = []
+
+    def send_packet(self, packet):
+        self.sent.append(packet)
+
+    def status(self):
+        return {"name": "spi-n"}
+
+
+def interface(**kwargs):
+    # A deadline long enough for the tests to run before it expires
+    kwargs.setdefault("flush_deadline_us", 10_000_000)
+    spi = FakeSpi()
+    return BatchingSpiInterface(spi, **kwargs), spi.sent
+
+
+@pytest.mark.parametrize(
+    "packets", [[], [b""], [PACKET], [PACKET, b"", b"x" * 1500, PACKET]]
+)
+def test_pack_batch_round_trip(packets):
+    frame = pack_batch(packets)
+
+    assert is_batch(frame)
+    assert unpack_batch(frame) == packets
+
+
+def test_empty_frame():
+    assert pack_batch([]) == BATCH_MAGIC + b"\x00\x00"
+
+
+def test_packets_are_not_batches():
+    assert not is_batch(PACKET)
+    assert not is_batch(b"")
+
+
+def test_flush_packs_the_pending_packets():
+    spi, sent = interface()
+    spi.send_packet(PACKET)
+    spi.send_packet(b"second")
+    assert sent == []
+
+    spi.flush()
+    assert len(sent) == 1
+    assert unpack_batch(sent[0]) == [PACKET, b"second"]
+    assert spi.status()["batching"] == {
+        "packets": 2,
+        "transfers": 1,
+        "maxBatch": 2,
+        "pending": 0,
+    }
+
+
+def test_single_packet_is_sent_unframed():
+    spi, sent = interface()
+    spi.send_packet(PACKET)
+    spi.flush()
+
+    assert sent == [PACKET]
+
+
+def test_flush_without_packets_sends_nothing():
+    spi, sent = interface()
+    spi.flush()
+    spi.flush_if_due()
+
+    assert sent == []
+    assert spi.transfers == 0
+
+
+@pytest.mark.parametrize("max_batch_bytes, flushed", [(24, True), (25, False)])
+def test_max_batch_bytes_boundary(max_batch_bytes, flushed):
+    # Each packet takes its length plus a 2 byte header
+    spi, sent = interface(max_batch_bytes=max_batch_bytes)
+    spi.send_packet(PACKET)
+    spi.send_packet(PACKET)
+
+    assert sent == ([pack_batch([PACKET, PACKET])] if flushed else [])
+
+
+def test_flush_if_due_waits_for_the_deadline():
+    spi, sent = interface(flush_deadline_us=50_000)
+    spi.send_packet(PACKET)
+    spi.flush_if_due()
+    assert sent == []
+
+    time.sleep(0.05)
+    spi.flush_if_due()
+    assert sent == [PACKET]
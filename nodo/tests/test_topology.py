@@ -0,0 +1,118 @@
+import pytest
+
+pytest.importorskip("pysim_sdk")
+
+from nodo.topology import (  # noqa: E402
+    MAX_DEPTH,
+    chain,
+    geometric,
+    grid,
+    link_profiles,
+    node_links,
+    summary,
+    tree,
+    validate,
+)
+
+BASIC = {
+    "re": {"links": {"w": "root.e"}},
+    "rs": {"links": {"n": "root.s", "e": "re.s"}},
+}
+
+
+def test_node_links_include_the_root():
+    assert node_links(BASIC) == {
+        "root": {},
+        "re": {"w": "root.e"},
+        "rs": {"n": "root.s", "e": "re.s"},
+    }
+
+
+def test_valid_topology():
+    assert validate(BASIC) == []
+    assert summary(BASIC) == {
+        "nodes": 3,
+        "home_nodes": 2,
+        "links": 3,
+        "max_degree": 2,
+        "max_depth": 1,
+        "diameter": 1,
+    }
+
+
+@pytest.mark.parametrize(
+    "topology, error",
+    [
+        (
+            {"root": {"links": {"n": "a.s"}}, "a": {}},
+            "root devices can only act as APs",
+        ),
+        ({"a.b": {"links": {"n": "root.s"}}}, "a.b: node names can't contain '.'"),
+        ({"a": {}}, "a: at least one device must be a station"),
+        ({"a": {"links": {"x": "root.s"}}}, "a.x: unknown orientation 'x'"),
+        ({"a": {"links": {"n": "b.s"}}}, "a.n: unknown node 'b'"),
+        ({"a": {"links": {"n": "root.up"}}}, "a.n: unknown orientation in 'root.up'"),
+        (
+            {"a": {"links": {"n": "root.s", "e": "a.w"}}},
+            "a.e: can't link to its own node",
+        ),
+        (
+            {"a": {"links": {"n": "root.s"}}, "b": {"links": {"n": "a.n"}}},
+            "b.n: a.n is a station, not an AP",
+        ),
+        (
+            {"a": {"links": {"n": "root.s"}}, "b": {"links": {"n": "root.s"}}},
+            "root.s: AP linked by more than one station ['a.n', 'b.n']",
+        ),
+        (
+            {"a": {"links": {"n": "root.s"}, "position": [1]}},
+            "a: position must be [x, y]",
+        ),
+        (
+            {"a": {"links": {"n": "root.s"}, "link_emulation": {"e": {}}}},
+            "a.e: link emulation set on a device without link",
+        ),
+        (
+            {"a": {"links": {"n": "root.s"}, "link_emulation": {"n": {"loss": 2}}}},
+            "a.n: loss must be a probability between 0 and 1",
+        ),
+        (
+            {"a": {"links": {"n": "b.s"}}, "b": {"links": {"n": "a.s"}}},
+            "nodes not connected to the root: ['a', 'b']",
+        ),
+    ],
+)
+def test_invalid_topologies(topology, error):
+    assert error in validate(topology)
+
+
+def test_link_profiles_by_station():
+    topology = {
+        "a": {"links": {"n": "root.s"}, "link_emulation": {"n": {"delay_ms": 5}}}
+    }
+    profiles = link_profiles(topology)
+
+    assert list(profiles) == ["a.n"]
+    assert profiles["a.n"].delay_ms == 5
+
+
+@pytest.mark.parametrize(
+    "topology",
+    [chain(4), grid(3, 4), tree(2, 3), geometric(20, seed=1)],
+    ids=["chain", "grid", "tree", "geometric"],
+)
+def test_generated_topologies_are_valid(topology):
+    assert validate(topology) == []
+    assert summary(topology)["max_depth"] <= MAX_DEPTH
+
+
+def test_generators_reject_nodes_that_cant_be_provisioned():
+    assert summary(chain(MAX_DEPTH))["max_depth"] == MAX_DEPTH
+    with pytest.raises(ValueError):
+        chain(MAX_DEPTH + 1)
+    with pytest.raises(ValueError):
+        tree(MAX_DEPTH + 1, 1)
+    with pytest.raises(ValueError):
+        grid(1, 2 * MAX_DEPTH + 3)
+
+    assert summary(chain(MAX_DEPTH + 1, max_depth=None))["max_depth"] == MAX_DEPTH + 1
@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("pysim_sdk")
+
+from nodo.traffic import DEFAULT_RATE_PPS, Flow  # noqa: E402
+
+
+def test_flow_from_config():
+    flow = Flow.from_config(0, {"from": "re", "to": "root", "duration": 10})
+
+    assert (flow.dst, flow.rate_pps, flow.period) == (
+        "root",
+        DEFAULT_RATE_PPS,
+        1 / DEFAULT_RATE_PPS,
+    )
+    assert flow.is_active(9.9)
+    assert not flow.is_active(10)
+
+
+@pytest.mark.parametrize(
+    "config, error",
+    [
+        ([], "must be an object"),
+        ({"from": "re"}, "needs from and to"),
+        ({"from": "re", "to": "root", "rate": 1}, "unknown traffic flow keys"),
+        ({"from": "re", "to": "root", "rate_pps": 0}, "rate_pps must be positive"),
+        ({"from": "re", "to": "root", "rate_pps": -5}, "rate_pps must be positive"),
+        ({"from": "re", "to": "root", "rate_pps": None}, "rate_pps must be a number"),
+        ({"from": "re", "to": "root", "size": "big"}, "size must be a number"),
+        ({"from": "re", "to": "root", "size": 0}, "size must be positive"),
+        ({"from": "re", "to": "root", "start": -1}, "start can't be negative"),
+        ({"from": "re", "to": "root", "duration": 0}, "duration must be positive"),
+        ({"from": "re", "to": "root", "duration": True}, "duration must be a number"),
+    ],
+)
+def test_invalid_flows_are_rejected(config, error):
+    with pytest.raises(ValueError, match=error):
+        Flow.from_config(0, config)